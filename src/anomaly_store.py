@@ -0,0 +1,191 @@
+# anomaly_store.py
+# Structured anomaly events: a fixed-size ring buffer in memory for the UI, plus an
+# optional JSON-lines log on disk with an in-memory (timestamp, segment, offset) index
+# per app, so history queries by app and time range never scan the whole log.
+#
+# The log is split into segments: `path` is written until it reaches SEGMENT_BYTES, then
+# renamed to `path.<n>` and a new one is started; only the newest MAX_SEGMENTS are kept,
+# and index entries of a deleted segment are dropped with it. Disk use, the index and the
+# startup read are therefore bounded by MAX_SEGMENTS x SEGMENT_BYTES.
+#
+# Timestamps are clamped to be non-decreasing on insert (time.time() can step back), so
+# every index list stays sorted for bisect.
+import glob
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+
+SEGMENT_BYTES = 4 * 1024 * 1024   # log segment size before rotation
+MAX_SEGMENTS = 8                  # segments kept on disk, including the one being written
+
+# remotes: [[ip, host or None], ...] known when the event was recorded (older logs have none)
+AnomalyEvent = namedtuple('AnomalyEvent', ['seq', 'ts', 'app', 'pid', 'up_kbps', 'down_kbps', 'score', 'reason', 'remotes'],
+                          defaults=[()])
+
+class _Index:
+    """ Parallel lists in append order: ts (non-decreasing), segment number, byte offset. """
+    __slots__ = ('times', 'segments', 'offsets')
+
+    def __init__(self):
+        self.times = []
+        self.segments = []
+        self.offsets = []
+
+    def add(self, ts, segment, offset):
+        self.times.append(ts)
+        self.segments.append(segment)
+        self.offsets.append(offset)
+
+    def drop_through(self, segment):
+        """ Forget entries in segments <= segment (always a prefix). """
+        n = bisect_right(self.segments, segment)
+        if n:
+            del self.times[:n], self.segments[:n], self.offsets[:n]
+
+    def __len__(self):
+        return len(self.times)
+
+class AnomalyStore:
+    def __init__(self, capacity=1000, path=None, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS):
+        self.events = deque(maxlen=capacity)
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_segments)
+        self.total = 0          # every event ever appended, including ones rotated out of memory
+        self.last_ts = float('-inf')
+        self.lock = threading.Lock()
+        self._index = {}        # app -> _Index
+        self._all = _Index()    # same for all apps
+        self.segment = 0        # number of the segment being written (`path`)
+        self.segments = []      # numbers of the closed segments still on disk, oldest first
+        self._file = None
+        if path:
+            self._load_index()
+            self._file = open(path, 'ab')
+
+    def segment_path(self, segment):
+        return self.path if segment == self.segment else f"{self.path}.{segment}"
+
+    def _load_index(self):
+        """ Rebuild the offset index from the segments on disk (one sequential read at startup). """
+        closed = []
+        for name in glob.glob(glob.escape(self.path) + '.*'):
+            suffix = name[len(self.path) + 1:]
+            if suffix.isdigit():
+                closed.append(int(suffix))
+        closed.sort()
+        keep = self.max_segments - 1
+        for segment in closed[:-keep]:
+            os.remove(f"{self.path}.{segment}")
+        self.segments = closed[-keep:]
+        self.segment = self.segments[-1] + 1 if self.segments else 0
+        for segment in self.segments + [self.segment]:
+            path = self.segment_path(segment)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self._add_to_index(record['app'], self._clamp(record['ts']), segment, offset)
+                        self.total = max(self.total, record['seq'])
+                    except (ValueError, KeyError):
+                        pass  # truncated last line after a crash
+                    offset += len(line)
+
+    def _clamp(self, ts):
+        if ts < self.last_ts:
+            ts = self.last_ts
+        self.last_ts = ts
+        return ts
+
+    def _add_to_index(self, app, ts, segment, offset):
+        index = self._index.get(app)
+        if index is None:
+            index = self._index[app] = _Index()
+        index.add(ts, segment, offset)
+        self._all.add(ts, segment, offset)
+
+    def _rotate(self):
+        """ Close the current segment, start a new one and drop segments beyond max_segments. """
+        self._file.close()
+        os.replace(self.path, f"{self.path}.{self.segment}")
+        self.segments.append(self.segment)
+        self.segment += 1
+        while len(self.segments) > self.max_segments - 1:
+            dropped = self.segments.pop(0)
+            os.remove(f"{self.path}.{dropped}")
+            self._all.drop_through(dropped)
+            for app in list(self._index):
+                index = self._index[app]
+                index.drop_through(dropped)
+                if not len(index):
+                    del self._index[app]
+        self._file = open(self.path, 'ab')
+
+    def append(self, ts, app, pid, up_kbps, down_kbps, score, reason, remotes=()):
+        with self.lock:
+            self.total += 1
+            event = AnomalyEvent(self.total, self._clamp(ts), app, pid, up_kbps, down_kbps,
+                                 None if score is None else float(score), reason, remotes)
+            self.events.append(event)
+            if self._file:
+                offset = self._file.tell()
+                if offset >= self.segment_bytes:
+                    self._rotate()
+                    offset = 0
+                self._file.write((json.dumps(event._asdict(), ensure_ascii=False) + "\n").encode('utf-8'))
+                self._file.flush()
+                self._add_to_index(app, event.ts, self.segment, offset)
+        return event
+
+    def since(self, seq):
+        """ Events newer than seq still held in memory (for incremental UI updates). """
+        with self.lock:
+            if not self.events or self.events[-1].seq <= seq:
+                return []
+            first = self.events[0].seq
+            start = max(0, seq - first + 1)
+            return list(self.events)[start:]
+
+    def recent(self, n=50):
+        with self.lock:
+            return list(self.events)[-n:]
+
+    def query(self, app=None, start=None, end=None, limit=500):
+        """ Events for app (or all apps) with start <= ts <= end, oldest first. """
+        if not self._file:
+            with self.lock:
+                matches = [e for e in self.events
+                           if (app is None or e.app == app)
+                           and (start is None or e.ts >= start) and (end is None or e.ts <= end)]
+            return matches[-limit:] if limit else matches
+
+        results = []
+        files = {}
+        # Held while reading: a rotation would rename the segment being read
+        with self.lock:
+            index = self._all if app is None else self._index.get(app, _Index())
+            lo = bisect_left(index.times, start) if start is not None else 0
+            hi = bisect_right(index.times, end) if end is not None else len(index)
+            if limit and hi - lo > limit:
+                lo = hi - limit
+            try:
+                for segment, offset in zip(index.segments[lo:hi], index.offsets[lo:hi]):
+                    f = files.get(segment)
+                    if f is None:
+                        f = files[segment] = open(self.segment_path(segment), 'rb')
+                    f.seek(offset)
+                    results.append(AnomalyEvent(**json.loads(f.readline())))
+            finally:
+                for f in files.values():
+                    f.close()
+        return results
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,167 @@
+# app_features.py
+# Per-app temporal features for the anomaly model.
+# The same definitions are computed two ways:
+#   FeatureEngine.update()   -> live, O(1) per app per tick (real-time-detector.py, dashboard.py)
+#   compute_features_frame() -> vectorized over the whole baseline (train-app-model.py)
+# Both walk an app's rows in order and must produce identical values.
+# FeatureEngine.to_sections()/from_sections() carry the rolling windows across a restart
+# (see state_snapshot.py), so the first ticks after a warm start are not scored cold.
+import math
+from collections import deque
+
+WINDOW = 8      # son kaç pencere (tick) için rolling max/std/ortalama
+ALPHA = 0.3     # EWMA katsayısı
+
+FEATURE_COLUMNS = [
+    'upload_kbps', 'download_kbps',
+    'up_ewma', 'down_ewma',
+    'up_max', 'down_max',
+    'up_std', 'down_std',
+    'up_down_log_ratio',
+    'connections',
+]
+
+class _RollingSeries:
+    """ Ring buffer with O(1) rolling sum/sum-of-squares, amortized O(1) max and an EWMA. """
+    __slots__ = ('window', 'alpha', 'values', 'maxq', 'count', 'total', 'total_sq', 'ewma')
+
+    def __init__(self, window, alpha):
+        self.window = window
+        self.alpha = alpha
+        self.values = deque(maxlen=window)
+        self.maxq = deque()  # (index, value), values decreasing
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.ewma = None
+
+    def push(self, x):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+
+        while self.maxq and self.maxq[-1][1] <= x:
+            self.maxq.pop()
+        self.maxq.append((self.count, x))
+        if self.maxq[0][0] <= self.count - self.window:
+            self.maxq.popleft()
+        self.count += 1
+
+        self.ewma = x if self.ewma is None else self.alpha * x + (1 - self.alpha) * self.ewma
+
+    def mean(self):
+        return self.total / len(self.values)
+
+    def std(self):
+        n = len(self.values)
+        var = self.total_sq / n - (self.total / n) ** 2
+        return math.sqrt(var) if var > 1e-12 else 0.0
+
+    def max(self):
+        return self.maxq[0][1]
+
+    def restore(self, values, ewma):
+        """ Rebuild sums and the max queue by replaying the window, then put back the EWMA. """
+        for x in values:
+            self.push(x)
+        self.ewma = ewma
+
+class _AppState:
+    __slots__ = ('up', 'down')
+
+    def __init__(self, window, alpha):
+        self.up = _RollingSeries(window, alpha)
+        self.down = _RollingSeries(window, alpha)
+
+class FeatureEngine:
+    """ Keeps per-app rolling state; update() returns the feature dict for the new window. """
+
+    def __init__(self, window=WINDOW, alpha=ALPHA):
+        self.window = window
+        self.alpha = alpha
+        self.apps = {}
+
+    def update(self, app, upload_kbps, download_kbps, connections=0):
+        state = self.apps.get(app)
+        if state is None:
+            state = self.apps[app] = _AppState(self.window, self.alpha)
+        up, down = state.up, state.down
+        up.push(upload_kbps)
+        down.push(download_kbps)
+        return {
+            'upload_kbps': upload_kbps,
+            'download_kbps': download_kbps,
+            'up_ewma': up.ewma,
+            'down_ewma': down.ewma,
+            'up_max': up.max(),
+            'down_max': down.max(),
+            'up_std': up.std(),
+            'down_std': down.std(),
+            'up_down_log_ratio': math.log((up.mean() + 1.0) / (down.mean() + 1.0)),
+            'connections': connections,
+        }
+
+    def to_sections(self):
+        """ Snapshot sections: app names, window lengths, the flattened windows and the EWMAs. """
+        import numpy as np
+        states = list(self.apps.values())
+        return {
+            'feat_window': self.window,
+            'feat_alpha': self.alpha,
+            'feat_apps': list(self.apps),
+            'feat_lengths': np.fromiter((len(st.up.values) for st in states), dtype=np.int64, count=len(states)),
+            'feat_up': np.array([x for st in states for x in st.up.values], dtype=np.float64),
+            'feat_down': np.array([x for st in states for x in st.down.values], dtype=np.float64),
+            'feat_up_ewma': np.array([st.up.ewma for st in states], dtype=np.float64),
+            'feat_down_ewma': np.array([st.down.ewma for st in states], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_sections(cls, sections):
+        """ Engine with the snapshot's window/alpha; callers keep it only if those match the model. """
+        engine = cls(int(sections['feat_window']), sections['feat_alpha'])
+        apps = sections['feat_apps']
+        lengths = sections['feat_lengths'].tolist()
+        up, down = sections['feat_up'].tolist(), sections['feat_down'].tolist()
+        up_ewma, down_ewma = sections['feat_up_ewma'].tolist(), sections['feat_down_ewma'].tolist()
+        if not len(apps) == len(lengths) == len(up_ewma) == len(down_ewma) or not sum(lengths) == len(up) == len(down):
+            raise ValueError(f"feat_*: windows do not match {len(apps)} apps")
+        start = 0
+        for i, (app, n) in enumerate(zip(apps, lengths)):
+            if n == 0:
+                continue
+            state = engine.apps[app] = _AppState(engine.window, engine.alpha)
+            state.up.restore(up[start:start + n], up_ewma[i])
+            state.down.restore(down[start:start + n], down_ewma[i])
+            start += n
+        return engine
+
+def compute_features_frame(df, window=WINDOW, alpha=ALPHA):
+    """ Vectorized equivalent of feeding df's rows (in order) through FeatureEngine, grouped by process_name. """
+    import numpy as np
+    out = df.copy()
+    if 'connections' not in out.columns:
+        out['connections'] = 0
+    grouped = out.groupby('process_name', sort=False)
+    means = {}
+    for col, prefix in (('upload_kbps', 'up'), ('download_kbps', 'down')):
+        rolling = grouped[col].rolling(window, min_periods=1)
+        out[f'{prefix}_ewma'] = grouped[col].transform(lambda s: s.ewm(alpha=alpha, adjust=False).mean())
+        out[f'{prefix}_max'] = rolling.max().reset_index(level=0, drop=True)
+        out[f'{prefix}_std'] = rolling.std(ddof=0).reset_index(level=0, drop=True).fillna(0.0)
+        means[prefix] = rolling.mean().reset_index(level=0, drop=True)
+    out['up_down_log_ratio'] = np.log((means['up'] + 1.0) / (means['down'] + 1.0))
+    return out[['process_name'] + FEATURE_COLUMNS]
+
+def fill_live_row(row, model_columns, features, app_column):
+    """ Put the features the model was trained with into a zeroed row (DataFrame with model_columns). """
+    for name, value in features.items():
+        if name in model_columns:
+            row[name] = value
+    if app_column in model_columns:
+        row[app_column] = 1
+    return row
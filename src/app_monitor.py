@@ -1,8 +1,24 @@
 import psutil
 import time
 import os
-from collections import defaultdict
-import signal  
+import sys
+import argparse
+import heapq
+from collections import namedtuple
+import signal
+
+# Terminal UI: curses when available (Linux/macOS), ANSI cursor control otherwise.
+# Only lines that changed since the previous frame are rewritten.
+#   python app_monitor.py                  # interactive, sort keys: u d t c n, q to quit
+#   python app_monitor.py --sort total --top 10
+#   python app_monitor.py --plain          # scrolling output, e.g. for logging to a file
+
+INTERVAL = 1.0       # seconds between samples
+DEFAULT_TOP = 20     # rows shown
+MIN_RATE = 0.1       # KB/s; quieter processes are hidden (unless sorting by connections)
+SORT_KEYS = {'u': 'upload', 'd': 'download', 't': 'total', 'c': 'connections', 'n': 'name'}
+
+Row = namedtuple('Row', ['pid', 'name', 'upload', 'download', 'connections'])
 
 # --- Globals and Signal Handling ---
 keep_running = True
@@ -10,12 +26,8 @@ keep_running = True
 def signal_handler(sig, frame):
     """ Changes the global flag to stop the main loop when Ctrl+C is pressed. """
     global keep_running
-    print("\nStopping the monitor...")
     keep_running = False
 
-signal.signal(signal.SIGINT, signal_handler)
-
-last_bytes = defaultdict(lambda: {'sent': 0, 'recv': 0})
 process_names = {}
 
 def get_process_name(pid):
@@ -27,43 +39,232 @@ def get_process_name(pid):
             process_names[pid] = '?'
     return process_names[pid]
 
-print("--- Live Application Network Monitor ---")
-print("Press Ctrl+C to stop.")
+def established_pids():
+    """ PID -> number of ESTABLISHED connections, from a single net_connections() call. """
+    counts = {}
+    for conn in psutil.net_connections():
+        if conn.pid is not None and conn.status == psutil.CONN_ESTABLISHED:
+            counts[conn.pid] = counts.get(conn.pid, 0) + 1
+    return counts
 
-while keep_running:
-    try:
-        connections = psutil.net_connections()
-        current_bytes = defaultdict(lambda: {'sent': 0, 'recv': 0})
+def sample_io(pids):
+    """ One io_counters() call per PID, however many sockets the process has. """
+    counters = {}
+    for pid in pids:
+        try:
+            io = psutil.Process(pid).io_counters()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, AttributeError):
+            continue  # Skip processes that have ended or we can't access
+        counters[pid] = (io.write_bytes, io.read_bytes)
+    return counters
+
+class RateSampler:
+    """ Per-PID KB/s between consecutive samples, using the real elapsed time. """
+
+    def __init__(self):
+        self.last = {}
+        self.last_time = None
+
+    def sample(self):
+        connections = established_pids()
+        counters = sample_io(connections)
+        now = time.monotonic()
+        rows = []
+        if self.last_time is not None:
+            elapsed = max(now - self.last_time, 1e-6)
+            for pid, (sent, recv) in counters.items():
+                previous = self.last.get(pid)
+                if previous is None:
+                    continue  # first sighting: no baseline yet
+                rows.append(Row(pid, get_process_name(pid),
+                                max(0, sent - previous[0]) / 1024 / elapsed,
+                                max(0, recv - previous[1]) / 1024 / elapsed,
+                                connections[pid]))
+        # Forget names of PIDs that are gone so a reused PID is looked up again
+        for pid in [pid for pid in process_names if pid not in connections]:
+            del process_names[pid]
+        self.last = counters
+        self.last_time = now
+        return rows
+
+def top_rows(rows, sort, n):
+    """ Top-n rows by the chosen column (name sorts ascending, everything else descending). """
+    if sort != 'connections':
+        rows = [r for r in rows if r.upload > MIN_RATE or r.download > MIN_RATE]
+    if sort == 'name':
+        return sorted(rows, key=lambda r: (r.name.lower(), r.pid))[:n]
+    if sort == 'total':
+        return heapq.nlargest(n, rows, key=lambda r: r.upload + r.download)
+    return heapq.nlargest(n, rows, key=lambda r: getattr(r, sort))
+
+def build_frame(rows, sort, top):
+    """ Screen content as a list of lines. """
+    shown = top_rows(rows, sort, top)
+    total_up = sum(r.upload for r in rows)
+    total_down = sum(r.download for r in rows)
+    lines = [
+        f"--- Live Application Network Monitor ---  {time.strftime('%H:%M:%S')}  "
+        f"{len(rows)} processes  ↑{total_up:.1f} ↓{total_down:.1f} KB/s",
+        f"sort: {sort}  [u]pload [d]ownload [t]otal [c]onnections [n]ame  [q]uit",
+        "",
+        f"{'PID':>7}  {'PROCESS':<30} | {'UPLOAD (KB/s)':>14} | {'DOWNLOAD (KB/s)':>16} | {'CONNS':>5}",
+        "-" * 84,
+    ]
+    for r in shown:
+        lines.append(f"{r.pid:>7}  {r.name[:30]:<30} | {r.upload:>14.2f} | {r.download:>16.2f} | {r.connections:>5}")
+    return lines
+
+class PlainRenderer:
+    """ Scrolling output without cursor control (pipes, log files). """
+
+    def start(self):
+        pass
+
+    def draw(self, lines):
+        print("\n".join(lines) + "\n", flush=True)
+
+    def read_key(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def stop(self):
+        pass
+
+class AnsiRenderer:
+    """ ANSI cursor positioning: rewrites only changed lines, clears the screen once. """
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.lines = []
 
-        for conn in connections:
-            if conn.pid is not None and conn.status == 'ESTABLISHED':
+    def start(self):
+        if os.name == 'nt':
+            os.system('')  # enables VT escape processing in the Windows console
+        self.out.write("\x1b[?25l\x1b[2J")  # hide cursor, clear screen
+        self.out.flush()
+
+    def draw(self, lines):
+        parts = []
+        for i, line in enumerate(lines):
+            if i >= len(self.lines) or self.lines[i] != line:
+                parts.append(f"\x1b[{i + 1};1H{line}\x1b[K")
+        if len(lines) < len(self.lines):
+            parts.append(f"\x1b[{len(lines) + 1};1H\x1b[J")  # erase rows that disappeared
+        if parts:
+            self.out.write("".join(parts))
+            self.out.flush()
+        self.lines = list(lines)
+
+    def read_key(self, timeout):
+        time.sleep(timeout)  # no portable non-blocking keyboard input without curses
+        return None
+
+    def stop(self):
+        self.out.write(f"\x1b[{len(self.lines) + 1};1H\x1b[?25h\n")
+        self.out.flush()
+
+class CursesRenderer:
+    """ curses window; only changed lines are rewritten and curses sends only changed cells. """
+
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.lines = []
+
+    def start(self):
+        import curses
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+
+    def draw(self, lines):
+        import curses
+        height, width = self.stdscr.getmaxyx()
+        lines = lines[:height]
+        for i, line in enumerate(lines):
+            if i >= len(self.lines) or self.lines[i] != line:
                 try:
-                    proc_io = psutil.Process(conn.pid).io_counters()
-                    current_bytes[conn.pid]['sent'] += proc_io.write_bytes
-                    current_bytes[conn.pid]['recv'] += proc_io.read_bytes
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue # Skip processes that have ended or we can't access
-
-        # Clear the screen
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print(f"{'PROCESS':<30} | {'UPLOAD (KB/s)':<20} | {'DOWNLOAD (KB/s)':<20}")
-        print("-" * 75)
-
-        for pid, data in current_bytes.items():
-            proc_name = get_process_name(pid)
-            
-            upload_speed = (data['sent'] - last_bytes[pid]['sent']) / 1024
-            download_speed = (data['recv'] - last_bytes[pid]['recv']) / 1024
-
-            if upload_speed > 0.1 or download_speed > 0.1:
-                print(f"{proc_name:<30} | {upload_speed:<20.2f} | {download_speed:<20.2f}")
-            
-            last_bytes[pid] = data
-
-        time.sleep(1)
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        break
-
-print("Monitor stopped.")
\ No newline at end of file
+                    self.stdscr.addnstr(i, 0, line, width - 1)
+                    self.stdscr.clrtoeol()
+                except curses.error:
+                    pass
+        for i in range(len(lines), min(len(self.lines), height)):
+            self.stdscr.move(i, 0)
+            self.stdscr.clrtoeol()
+        self.lines = list(lines)
+        self.stdscr.refresh()
+
+    def read_key(self, timeout):
+        import curses
+        self.stdscr.timeout(max(int(timeout * 1000), 0))
+        ch = self.stdscr.getch()
+        if ch == curses.KEY_RESIZE:
+            self.stdscr.clear()
+            self.lines = []  # force a full redraw at the new size
+            return None
+        return chr(ch) if 0 <= ch < 256 else None
+
+    def stop(self):
+        pass
+
+def run(renderer, sort='upload', top=DEFAULT_TOP, interval=INTERVAL):
+    """ Sample and draw until stopped; returns an error message if sampling is not permitted. """
+    sampler = RateSampler()
+    renderer.start()
+    try:
+        next_due = time.monotonic()
+        while keep_running:
+            try:
+                rows = sampler.sample()
+            except psutil.AccessDenied as e:
+                # e.g. net_connections() as non-root on macOS; reported once the terminal is restored
+                detail = f" ({e})" if str(e) else ""
+                return f"Access denied while reading connections{detail}. Try running with sudo / as administrator."
+            renderer.draw(build_frame(rows, sort, top))
+            next_due += interval
+            # Wait for the next sample, handling sort keys in between
+            while keep_running:
+                remaining = next_due - time.monotonic()
+                if remaining <= 0:
+                    break
+                key = renderer.read_key(remaining)
+                if key == 'q':
+                    return None
+                if key in SORT_KEYS and SORT_KEYS[key] != sort:
+                    sort = SORT_KEYS[key]
+                    renderer.draw(build_frame(rows, sort, top))
+            next_due = max(next_due, time.monotonic())  # don't try to catch up after a slow sample
+    finally:
+        renderer.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Live per-application network monitor")
+    parser.add_argument('--sort', choices=sorted(set(SORT_KEYS.values())), default='upload')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help="number of rows shown")
+    parser.add_argument('--interval', type=float, default=INTERVAL, help="seconds between samples")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--plain', action='store_true', help="scrolling output without cursor control")
+    mode.add_argument('--ansi', action='store_true', help="ANSI cursor control instead of curses")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, signal_handler)
+
+    if args.plain or not sys.stdout.isatty():
+        error = run(PlainRenderer(), args.sort, args.top, args.interval)
+    elif args.ansi:
+        error = run(AnsiRenderer(), args.sort, args.top, args.interval)
+    else:
+        try:
+            import curses
+        except ImportError:  # Windows without windows-curses
+            error = run(AnsiRenderer(), args.sort, args.top, args.interval)
+        else:
+            error = curses.wrapper(lambda stdscr: run(CursesRenderer(stdscr), args.sort, args.top, args.interval))
+    if error:
+        print(f"An error occurred: {error}")
+    print("Monitor stopped.")
+    if error:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
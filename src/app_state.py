@@ -0,0 +1,181 @@
+# app_state.py
+# Compact per-app / per-PID session state for the dashboard.
+# App names are interned to small integer IDs once; every counter is a column in a
+# growable NumPy array indexed by that ID (struct-of-arrays), so a tick's updates are a
+# handful of vectorized operations instead of one dict-of-dicts lookup per field.
+# Per-PID counters from the previous tick are kept as sorted parallel arrays and
+# matched against the new tick with searchsorted.
+import numpy as np
+
+INITIAL_CAPACITY = 256
+
+class NameTable:
+    """ Interns strings to dense integer IDs (0, 1, 2, ...). """
+    __slots__ = ('ids', 'names')
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        app_id = self.ids.get(name)
+        if app_id is None:
+            app_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return app_id
+
+    def __len__(self):
+        return len(self.names)
+
+class AppUsage:
+    """ Read-only view of one app's row, for display code. """
+    __slots__ = ('name', 'upload', 'download', 'samples', 'total_upload_speed', 'total_download_speed', 'first_seen')
+
+    def __init__(self, name, upload, download, samples, total_upload_speed, total_download_speed, first_seen):
+        self.name = name
+        self.upload = upload
+        self.download = download
+        self.samples = samples
+        self.total_upload_speed = total_upload_speed
+        self.total_download_speed = total_download_speed
+        self.first_seen = first_seen
+
+    def avg_speed(self, direction):
+        """ direction: 'upload' or 'download' -> mean KB/s over the app's samples. """
+        total = self.total_upload_speed if direction == 'upload' else self.total_download_speed
+        return total / max(self.samples, 1)
+
+class AppStats:
+    """ Session totals per app: bytes, samples, summed KB/s and first-seen time. """
+    FIELDS = (('upload', np.float64), ('download', np.float64), ('samples', np.int64),
+              ('total_upload_speed', np.float64), ('total_download_speed', np.float64),
+              ('first_seen', np.float64))
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.names = NameTable()
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.FIELDS}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = len(self.columns['samples'])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def ids_for(self, names, now):
+        """ Intern names (registering new apps with first_seen=now); returns an int array of IDs. """
+        ids = np.fromiter((self.names.intern(name) for name in names), dtype=np.int64, count=len(names))
+        if len(self.names) > self.size:
+            self._grow(len(self.names))
+            self.columns['first_seen'][self.size:len(self.names)] = now
+            self.size = len(self.names)
+        return ids
+
+    def add(self, ids, upload, download, upload_kbps, download_kbps):
+        """ Vectorized tick update; ids may repeat (several PIDs of one app). """
+        cols = self.columns
+        np.add.at(cols['upload'], ids, upload)
+        np.add.at(cols['download'], ids, download)
+        np.add.at(cols['samples'], ids, 1)
+        np.add.at(cols['total_upload_speed'], ids, upload_kbps)
+        np.add.at(cols['total_download_speed'], ids, download_kbps)
+
+    def column(self, name):
+        return self.columns[name][:self.size]
+
+    def record(self, app_id):
+        cols = self.columns
+        return AppUsage(self.names.names[app_id], float(cols['upload'][app_id]), float(cols['download'][app_id]),
+                        int(cols['samples'][app_id]), float(cols['total_upload_speed'][app_id]),
+                        float(cols['total_download_speed'][app_id]), float(cols['first_seen'][app_id]))
+
+    def top(self, key, n=None, where=None):
+        """ Records sorted by key (field name or per-app value array), descending; optional boolean mask. """
+        values = self.column(key) if isinstance(key, str) else key
+        ids = np.arange(self.size) if where is None else np.flatnonzero(where)
+        if n is not None and n < len(ids):
+            part = np.argpartition(-values[ids], n - 1)[:n]
+            ids = ids[part]
+        ids = ids[np.argsort(-values[ids], kind='stable')]
+        return [self.record(i) for i in ids]
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def to_sections(self):
+        """ Snapshot sections (see state_snapshot.py): the name table plus one array per field. """
+        sections = {'app_names': self.names.names}
+        sections.update((f'app_{name}', self.column(name)) for name, _ in self.FIELDS)
+        return sections
+
+    @classmethod
+    def from_sections(cls, sections):
+        names = sections['app_names']
+        stats = cls(max(INITIAL_CAPACITY, len(names)))
+        for name in names:
+            stats.names.intern(name)
+        stats.size = len(names)
+        for name, dtype in cls.FIELDS:
+            column = sections[f'app_{name}']
+            if len(column) != stats.size:
+                raise ValueError(f"app_{name}: {len(column)} rows for {stats.size} apps")
+            stats.columns[name][:stats.size] = column
+        return stats
+
+class PidCounters:
+    """ Previous-tick byte counters per PID as sorted parallel arrays. """
+    __slots__ = ('pids', 'sent', 'recv')
+
+    def __init__(self, pids=None, sent=None, recv=None):
+        self.pids = np.empty(0, dtype=np.int64) if pids is None else pids
+        self.sent = np.empty(0, dtype=np.int64) if sent is None else sent
+        self.recv = np.empty(0, dtype=np.int64) if recv is None else recv
+
+    def __len__(self):
+        return len(self.pids)
+
+    @classmethod
+    def from_arrays(cls, pids, sent, recv):
+        order = np.argsort(pids, kind='stable')
+        return cls(pids[order], sent[order], recv[order])
+
+    def diff(self, pids, sent, recv):
+        """ For the new tick's arrays: (known mask, sent delta, recv delta); deltas clipped at 0. """
+        if not len(self.pids):
+            zeros = np.zeros(len(pids), dtype=np.int64)
+            return np.zeros(len(pids), dtype=bool), zeros, zeros
+        pos = np.searchsorted(self.pids, pids)
+        pos = np.minimum(pos, len(self.pids) - 1)
+        known = self.pids[pos] == pids
+        sent_diff = np.where(known, np.maximum(sent - self.sent[pos], 0), 0)
+        recv_diff = np.where(known, np.maximum(recv - self.recv[pos], 0), 0)
+        return known, sent_diff, recv_diff
+
+    def nbytes(self):
+        return self.pids.nbytes + self.sent.nbytes + self.recv.nbytes
+
+    def to_sections(self):
+        return {'pid_pids': self.pids, 'pid_sent': self.sent, 'pid_recv': self.recv}
+
+    @classmethod
+    def from_sections(cls, sections):
+        return cls(sections['pid_pids'], sections['pid_sent'], sections['pid_recv'])
+
+def stats_to_arrays(stats):
+    """ get_network_io_stats() dict -> (pids, names, sent, recv, connections) columns. """
+    n = len(stats)
+    pids = np.fromiter(stats.keys(), dtype=np.int64, count=n)
+    values = list(stats.values())
+    names = [v['name'] for v in values]
+    sent = np.fromiter((v['bytes_sent'] for v in values), dtype=np.int64, count=n)
+    recv = np.fromiter((v['bytes_recv'] for v in values), dtype=np.int64, count=n)
+    conns = np.fromiter((v['connections'] for v in values), dtype=np.int64, count=n)
+    return pids, names, sent, recv, conns
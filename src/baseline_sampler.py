@@ -0,0 +1,83 @@
+# baseline_sampler.py
+# Bounded, per-app baseline for data-collector.py.
+# Instead of appending every sample, each app keeps a uniform random sample of its
+# rows (reservoir sampling, Algorithm R), optionally split into time-of-day strata so
+# that e.g. night-time behaviour is not crowded out by daytime rows. Memory and CSV
+# size are bounded by apps x capacity, however long collection runs; apps with fewer
+# rows than the capacity keep all of them.
+#
+# Rows are sampled individually, so consecutive ticks are not preserved: temporal
+# features (app_features.FEATURE_COLUMNS) must be computed at collection time and
+# stored with each row. train-app-model.py uses them as-is when present.
+import os
+import random
+import time
+
+PER_APP_ROWS = 2000   # rows kept per app
+STRATA = 1            # time-of-day strata per app (1 = off, 4 = 6-hour blocks, 24 = hourly)
+
+class Reservoir:
+    __slots__ = ('capacity', 'items', 'seen')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = []
+        self.seen = 0
+
+    def add(self, item, rng):
+        self.seen += 1
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+        else:
+            j = rng.randrange(self.seen)
+            if j < self.capacity:
+                self.items[j] = item
+
+class BaselineSampler:
+    def __init__(self, per_app=PER_APP_ROWS, strata=STRATA, seed=None):
+        self.per_app = per_app
+        self.strata = max(1, strata)
+        self.per_stratum = max(1, per_app // self.strata)
+        self.rng = random.Random(seed)
+        self.reservoirs = {}   # (app, stratum) -> Reservoir
+
+    def stratum(self, ts):
+        if self.strata == 1:
+            return 0
+        return time.localtime(ts).tm_hour * self.strata // 24
+
+    def add(self, row, ts=None, app=None):
+        """ row: dict with at least 'process_name', or any row (e.g. a tuple) when app is given. """
+        ts = time.time() if ts is None else ts
+        key = (row['process_name'] if app is None else app, self.stratum(ts))
+        reservoir = self.reservoirs.get(key)
+        if reservoir is None:
+            reservoir = self.reservoirs[key] = Reservoir(self.per_stratum)
+        reservoir.add(row, self.rng)
+
+    def rows(self):
+        """ Kept rows, grouped by app and stratum. """
+        out = []
+        for key in sorted(self.reservoirs, key=lambda k: (str(k[0]), k[1])):
+            out.extend(self.reservoirs[key].items)
+        return out
+
+    def summary(self):
+        """ app -> (rows seen, rows kept) """
+        result = {}
+        for (app, _), reservoir in self.reservoirs.items():
+            seen, kept = result.get(app, (0, 0))
+            result[app] = (seen + reservoir.seen, kept + len(reservoir.items))
+        return result
+
+    def __len__(self):
+        return sum(len(r.items) for r in self.reservoirs.values())
+
+    def save_csv(self, path, columns=None, rows=None):
+        """ Atomically (re)write the whole sample (or rows taken earlier with rows()); returns the row count. """
+        import pandas as pd
+        df = pd.DataFrame(self.rows() if rows is None else rows, columns=columns)
+        tmp = path + '.tmp'
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        return len(df)
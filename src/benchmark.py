@@ -0,0 +1,395 @@
+# benchmark.py
+# Synthetic throughput benchmarks for the monitor hot paths.
+# Canlı ağ veya yönetici yetkisi gerekmez; paketler ve bağlantı tabloları sentetik üretilir.
+#
+#   python src/benchmark.py --processes 50 --flows 2000 --packets 50000 --ipv6 0.3
+#   python src/benchmark.py --output new.json --compare old.json
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(os.path.dirname(SRC_DIR), 'models')
+
+# Same shape as psutil's sconn / addr named tuples
+Addr = namedtuple('Addr', ['ip', 'port'])
+Conn = namedtuple('Conn', ['fd', 'family', 'type', 'laddr', 'raddr', 'status', 'pid'])
+
+def load_script(filename, module_name, workdir=None):
+    """ Import one of the src/ scripts by path (their file names are not valid module names). """
+    path = os.path.join(SRC_DIR, filename)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    previous = os.getcwd()
+    try:
+        if workdir:
+            os.chdir(workdir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            spec.loader.exec_module(module)
+    finally:
+        os.chdir(previous)
+    return module
+
+class SyntheticTraffic:
+    """ Deterministic generator for connection tables, packet streams and per-process counters. """
+
+    def __init__(self, processes=50, flows=2000, ipv6_ratio=0.2, app_names=None, seed=42):
+        self.rng = random.Random(seed)
+        self.processes = processes
+        self.flows = flows
+        self.ipv6_ratio = ipv6_ratio
+        names = list(app_names or [])
+        self.pids = list(range(1000, 1000 + processes))
+        self.names = {}
+        for i, pid in enumerate(self.pids):
+            # Mix known apps (from the model columns) with never-seen ones
+            if names and i % 4 != 3:
+                self.names[pid] = names[i % len(names)]
+            else:
+                self.names[pid] = f"synthetic_{i}.exe"
+        self.connections = [self._make_flow(i) for i in range(flows)]
+
+    def _make_flow(self, i):
+        pid = self.pids[i % len(self.pids)]
+        if self.rng.random() < self.ipv6_ratio:
+            family = socket.AF_INET6
+            l_ip = "2001:db8::1"
+            r_ip = f"2001:db8:{self.rng.randint(1, 0xffff):x}::{self.rng.randint(1, 0xffff):x}"
+        else:
+            family = socket.AF_INET
+            l_ip = "192.168.1.10"
+            r_ip = f"{self.rng.randint(1, 223)}.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+        sock_type = socket.SOCK_STREAM if self.rng.random() < 0.8 else socket.SOCK_DGRAM
+        return Conn(-1, family, sock_type, Addr(l_ip, 20000 + i % 40000),
+                    Addr(r_ip, self.rng.choice((80, 443, 53, 8080))), 'ESTABLISHED', pid)
+
+    def packets(self, count):
+        """ Build scapy packets for random flows in both directions. """
+        from scapy.all import Ether, IP, IPv6, TCP, UDP, Raw
+        pkts = []
+        for _ in range(count):
+            c = self.rng.choice(self.connections)
+            outgoing = self.rng.random() < 0.5
+            src, dst = (c.laddr, c.raddr) if outgoing else (c.raddr, c.laddr)
+            l3 = IPv6(src=src.ip, dst=dst.ip) if c.family == socket.AF_INET6 else IP(src=src.ip, dst=dst.ip)
+            l4 = TCP(sport=src.port, dport=dst.port) if c.type == socket.SOCK_STREAM else UDP(sport=src.port, dport=dst.port)
+            payload = Raw(b"x" * self.rng.choice((0, 64, 512, 1400)))
+            frame = Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02") / l3 / l4 / payload
+            # Re-dissect from raw bytes so packets look like sniffed ones (cached raw, no rebuild on len())
+            pkts.append(Ether(bytes(frame)))
+        return pkts
+
+    def byte_snapshot(self):
+        """ One tick of pid -> {'up','down'} byte counts, as produced by the sniffers. """
+        return {pid: {'up': self.rng.randint(0, 200000), 'down': self.rng.randint(0, 2000000)}
+                for pid in self.pids}
+
+    def io_stats(self, previous=None):
+        """ Monotonic per-PID counters in the dashboard's get_network_io_stats() format. """
+        stats = {}
+        for pid in self.pids:
+            last = (previous or {}).get(pid, {'bytes_sent': 0, 'bytes_recv': 0})
+            stats[pid] = {
+                'name': self.names[pid],
+                'bytes_sent': last['bytes_sent'] + self.rng.randint(0, 200000),
+                'bytes_recv': last['bytes_recv'] + self.rng.randint(0, 2000000),
+                'connections': self.flows // max(self.processes, 1),
+            }
+        return stats
+
+class SyntheticPsutil:
+    """ Drop-in for the psutil calls made by the sniffer scripts. """
+
+    def __init__(self, traffic):
+        import psutil
+        self._psutil = psutil
+        self.traffic = traffic
+
+    def net_connections(self, kind='inet'):
+        return list(self.traffic.connections)
+
+    def Process(self, pid):
+        name = self.traffic.names.get(pid, '?')
+        return namedtuple('Proc', ['name'])(lambda: name)
+
+    def __getattr__(self, attr):
+        return getattr(self._psutil, attr)
+
+def timed(fn, repeat):
+    """ Run fn repeat times, return per-call latencies in seconds. """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def summarize(samples):
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        'runs': n,
+        'mean_ms': sum(ordered) / n * 1000,
+        'p50_ms': ordered[n // 2] * 1000,
+        'p95_ms': ordered[min(n - 1, int(n * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+def bench_packet_handler(module, traffic, packets, pps=None, sampler=None):
+    """ Packets/sec through packet_handler with a prebuilt conn_map (sampled like a capture worker if given). """
+    module.conn_map.clear()
+    module.conn_map.update(module.build_conn_map())
+    module.last_map_refresh = time.time()
+    module.MAP_REFRESH = 10 ** 9  # keep the rebuild out of the per-packet timing
+    module.pid_bytes.clear()
+
+    def handle(pkt):
+        weight = sampler.sample() if sampler else 1
+        if weight:
+            module.packet_handler(pkt, weight)
+
+    lag_max = 0.0
+    start = time.perf_counter()
+    if pps:
+        interval = 1.0 / pps
+        for i, pkt in enumerate(packets):
+            due = start + i * interval
+            now = time.perf_counter()
+            if now < due:
+                time.sleep(due - now)
+            else:
+                lag_max = max(lag_max, now - due)
+            handle(pkt)
+    else:
+        for pkt in packets:
+            handle(pkt)
+    elapsed = time.perf_counter() - start
+
+    attributed = sum(v['up'] + v['down'] for v in module.pid_bytes.values())
+    total = sum(len(p) for p in packets)
+    result = {
+        'packets': len(packets),
+        'seconds': elapsed,
+        'packets_per_sec': len(packets) / elapsed if elapsed else 0.0,
+        'attributed_byte_ratio': attributed / total if total else 0.0,
+    }
+    if pps:
+        result['offered_pps'] = pps
+        result['max_lag_ms'] = lag_max * 1000
+    return result
+
+def bench_conn_map(module, repeat):
+    return summarize(timed(module.build_conn_map, repeat))
+
+def bench_run_detection(detector, traffic, repeat):
+    """ Per-tick latency of the real-time detector's scoring step. """
+    def tick():
+        with contextlib.redirect_stdout(io.StringIO()):
+            detector.detect_snapshot(traffic.byte_snapshot())
+    return summarize(timed(tick, repeat))
+
+def bench_calculate_bandwidth(dashboard, traffic, model, model_columns, repeat):
+    """ Per-tick latency of NetworkMonitorDashboard.calculate_bandwidth_usage without Tk. """
+    cls = dashboard.NetworkMonitorDashboard
+    dashboard.ANOMALY_LOG_PATH = None  # keep benchmark runs off the on-disk event log
+    dashboard.STATE_SNAPSHOT_PATH = None
+    dash = cls.__new__(cls)
+    dash.init_monitor_state()
+    dash.model = model
+    dash.model_columns = model_columns
+    from score_thresholds import ThresholdTable
+    dash.thresholds = ThresholdTable.load(model, MODELS_DIR)
+    state = {'stats': None}
+
+    def next_stats():
+        state['stats'] = traffic.io_stats(state['stats'])
+        return state['stats']
+
+    dash.get_network_io_stats = next_stats
+    dash.calculate_bandwidth_usage()  # first tick only primes the per-PID counters
+
+    def tick():
+        dash.last_measurement_time = time.monotonic() - 2
+        dash.calculate_bandwidth_usage()
+    return summarize(timed(tick, repeat))
+
+def bench_app_state(apps, repeat, seed=42):
+    """ Footprint and per-tick update cost of the dashboard's session state at `apps` apps/PIDs. """
+    import numpy as np
+    from app_state import AppStats, PidCounters, stats_to_arrays
+    rng = random.Random(seed)
+    names = [f"app_{i}.exe" for i in range(apps)]
+    stats = {1000 + i: {'name': names[i], 'bytes_sent': rng.randrange(10 ** 9),
+                        'bytes_recv': rng.randrange(10 ** 9), 'connections': rng.randrange(1, 20)}
+             for i in range(apps)}
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        state = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return state, size
+
+    def build_dicts():
+        # Previous layout: dict of six-key dicts per app plus a dict of dicts per PID
+        history = {name: {'upload': 1, 'download': 1, 'samples': 1, 'first_seen': time.time(),
+                          'total_upload_speed': 1.0, 'total_download_speed': 1.0} for name in names}
+        last = {pid: dict(v) for pid, v in stats.items()}
+        return history, last
+
+    def build_arrays():
+        app_stats = AppStats()
+        pids, row_names, sent, recv, _ = stats_to_arrays(stats)
+        ids = app_stats.ids_for(row_names, time.time())
+        app_stats.add(ids, sent, recv, sent / 1024.0, recv / 1024.0)
+        return app_stats, PidCounters.from_arrays(pids, sent, recv)
+
+    _, dict_bytes = measure(build_dicts)
+    (app_stats, counters), array_bytes = measure(build_arrays)
+
+    def tick():
+        pids, row_names, sent, recv, conns = stats_to_arrays(stats)
+        known, sent_diff, recv_diff = counters.diff(pids, sent + 512, recv + 2048)
+        active = np.flatnonzero(known)
+        ids = app_stats.ids_for([row_names[i] for i in active], time.time())
+        app_stats.add(ids, sent_diff[active], recv_diff[active], sent_diff[active] / 1024.0, recv_diff[active] / 1024.0)
+        app_stats.top('upload', 20)
+
+    result = summarize(timed(tick, repeat))
+    result.update({
+        'apps': apps,
+        'dict_state_mb': dict_bytes / (1024 * 1024),
+        'array_state_mb': array_bytes / (1024 * 1024),
+        'array_columns_mb': (app_stats.nbytes() + counters.nbytes()) / (1024 * 1024),
+    })
+    return result
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def run(args):
+    if args.trace_memory:
+        tracemalloc.start()
+    collector = load_script('data-collector.py', 'bench_data_collector')
+    detector = load_script('real-time-detector.py', 'bench_real_time_detector', workdir=MODELS_DIR)
+    app_names = [c[len('process_name_'):] for c in detector.model_columns if c.startswith('process_name_')]
+
+    traffic = SyntheticTraffic(args.processes, args.flows, args.ipv6, app_names, args.seed)
+    fake_psutil = SyntheticPsutil(traffic)
+    collector.psutil = fake_psutil
+    detector.psutil = fake_psutil
+    samplers = [None, None]
+    if args.sample_rate > 1:
+        from packet_sampling import PacketSampler
+        samplers = [PacketSampler(args.sample_rate, seed=args.seed) for _ in range(2)]
+
+    print(f"{args.packets} sentetik paket üretiliyor...")
+    packets = traffic.packets(args.packets)
+
+    results = {}
+    print("packet_handler (data-collector)...")
+    results['packet_handler_collector'] = bench_packet_handler(collector, traffic, packets, args.pps, samplers[0])
+    print("packet_handler (real-time-detector)...")
+    results['packet_handler_detector'] = bench_packet_handler(detector, traffic, packets, args.pps, samplers[1])
+    print("build_conn_map...")
+    results['build_conn_map'] = bench_conn_map(collector, args.repeat)
+    print("detect_snapshot (run_detection tick)...")
+    results['run_detection_tick'] = bench_run_detection(detector, traffic, args.repeat)
+
+    try:
+        dashboard = load_script('dashboard.py', 'bench_dashboard')
+    except ImportError as e:
+        print(f"dashboard atlandı: {e}")
+    else:
+        print("calculate_bandwidth_usage (dashboard tick)...")
+        results['calculate_bandwidth_usage'] = bench_calculate_bandwidth(
+            dashboard, traffic, detector.model, detector.model_columns, args.repeat)
+
+    if args.state_apps:
+        print(f"app_state ({args.state_apps} uygulama/PID)...")
+        results['app_state'] = bench_app_state(args.state_apps, args.repeat, args.seed)
+
+    results['memory'] = {'peak_rss_mb': peak_rss_mb()}
+    if args.trace_memory:
+        # tracemalloc slows every allocation down, so timings from such runs are not comparable
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results['memory']['python_current_mb'] = current / (1024 * 1024)
+        results['memory']['python_peak_mb'] = peak / (1024 * 1024)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': vars(args),
+        },
+        'results': results,
+    }
+
+def compare(new, old):
+    """ Print relative change of every numeric metric present in both runs. """
+    print(f"\n{'metric':<55} {'old':>12} {'new':>12} {'change':>9}")
+    for section, values in new['results'].items():
+        for key, value in values.items():
+            before = old.get('results', {}).get(section, {}).get(key)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before * 100
+            print(f"{section + '.' + key:<55} {before:>12.3f} {value:>12.3f} {change:>+8.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic benchmark for the network monitor hot paths")
+    parser.add_argument('--processes', type=int, default=50, help="number of synthetic processes")
+    parser.add_argument('--flows', type=int, default=2000, help="number of synthetic connections")
+    parser.add_argument('--packets', type=int, default=20000, help="packets replayed through packet_handler")
+    parser.add_argument('--pps', type=float, default=None, help="pace the replay at this rate instead of max speed")
+    parser.add_argument('--sample-rate', type=int, default=1, help="1-in-N packet sampling in the sniffers")
+    parser.add_argument('--ipv6', type=float, default=0.2, help="fraction of IPv6 flows (0-1)")
+    parser.add_argument('--repeat', type=int, default=20, help="repetitions for per-tick latencies")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--state-apps', type=int, default=10000, help="apps/PIDs for the session state benchmark (0 = skip)")
+    parser.add_argument('--trace-memory', action='store_true', help="also record Python heap usage (slows the run)")
+    parser.add_argument('--output', default='bench_results.json', help="JSON result file")
+    parser.add_argument('--compare', default=None, help="previous JSON result to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report['results'], indent=2))
+    print(f"\nSonuçlar kaydedildi -> {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
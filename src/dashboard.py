@@ -3,12 +3,12 @@ from tkinter import ttk, messagebox
 import psutil
 import threading
 import time
+import numpy as np
 from datetime import datetime
-from collections import defaultdict
 
 # Windows notifications
 try:
-    from plyer import notification
+    import plyer
     NOTIFICATIONS_AVAILABLE = True
 except ImportError:
     NOTIFICATIONS_AVAILABLE = False
@@ -16,12 +16,54 @@ except ImportError:
 
 # Model imports
 try:
-    import joblib
     import pandas as pd
     SKLEARN_AVAILABLE = True
 except ImportError:
     SKLEARN_AVAILABLE = False
 
+from self_metrics import metrics
+from tick_scheduler import TickScheduler
+from monitor_daemon import DaemonSubscriber
+from app_features import FeatureEngine, fill_live_row
+from prediction_cache import PredictionCache
+from score_thresholds import ThresholdTable
+from anomaly_store import AnomalyStore
+from app_state import AppStats, PidCounters, stats_to_arrays
+from notifications import NotificationDispatcher, DesktopSink, LogFileSink, WebhookSink
+import state_snapshot
+from throughput_history import ThroughputHistory, HistoryTable, RESOLUTIONS
+from throughput_chart import ThroughputChart
+from endpoint_enrichment import EndpointEnricher
+from model_manager import ModelManager, timed_scores
+
+STATS_LOG_INTERVAL = 60  # Self-metrics log line interval in seconds (None = off)
+METRICS_PORT = None      # e.g. 9108 -> http://127.0.0.1:9108/metrics
+UPDATE_INTERVAL = 2      # Seconds between display updates
+MAX_UPDATE_INTERVAL = 8  # Upper bound when updates are stretched under load
+SENSITIVITY = 'p99'      # Per-app score quantile used as cutoff ('p99' or 'p999')
+APP_SENSITIVITY = {}     # Per-app override, e.g. {'Code.exe': 'p999'}
+MODEL_DIR = "."          # Watched for new model versions, swapped in between ticks
+MODEL_POLL_INTERVAL = 5  # Seconds between checks of the model files (None = load once at startup)
+CANDIDATE_MODEL_DIR = None  # e.g. "candidate" -> score a candidate model in shadow mode and report agreement
+ANOMALY_LOG_CAPACITY = 1000  # Anomaly events kept in memory
+ANOMALY_LOG_PATH = "anomaly_events.jsonl"  # On-disk event log (None = memory only)
+ANOMALY_LIST_SIZE = 50   # Lines shown in the anomaly listbox
+NOTIFY_COALESCE_WINDOW = 5  # Seconds an anomaly burst is collected into one digest
+NOTIFY_APP_RATE = 1 / 60     # Per-app notifications per second (token bucket refill)
+NOTIFY_APP_BURST = 2         # Per-app burst before rate limiting kicks in
+NOTIFY_LOG_PATH = None       # e.g. "notifications.jsonl" -> also log every notification
+NOTIFY_WEBHOOK_URL = None    # e.g. "http://127.0.0.1:8080/notify" -> also POST as JSON
+STATE_SNAPSHOT_PATH = "dashboard_state.bin"  # Warm-start snapshot (None = always start cold)
+STATE_SNAPSHOT_INTERVAL = state_snapshot.SNAPSHOT_INTERVAL  # Seconds between snapshots
+CHART_HEIGHT = 140       # Throughput chart height in pixels
+CHART_DECIMATION = 'minmax'  # 'minmax' (keeps spikes) or 'lttb' (keeps shape)
+HISTORY_MAX_APPS = 32    # Apps with their own throughput history (most recently active)
+ENRICH_ENDPOINTS = True  # Resolve remote addresses in the background (shown in the table and anomaly log)
+ENRICH_DNS = True        # Reverse DNS via the system resolver (False = ENRICH_DATABASE only, fully offline)
+ENRICH_DATABASE = None   # e.g. "endpoints.txt": local hosts / CIDR name file, checked before DNS
+ENDPOINTS_PER_APP = 3    # Remote addresses kept per process row / anomaly event
+DAEMON_ADDRESS = None    # e.g. "/tmp/ainetmonitor.sock" -> read traffic from monitor_daemon.py instead of polling psutil
+
 class NetworkMonitorDashboard:
     def __init__(self, root):
         self.root = root
@@ -41,26 +83,18 @@ class NetworkMonitorDashboard:
         self.setup_dark_theme()
         
         # Network monitoring state
-        self.monitoring = True
-        self.start_time = time.time()
-        self.last_io_stats = {}
-        self.total_anomalies = 0
-        self.total_upload_mb = 0.0
-        self.total_download_mb = 0.0
-        self.anomaly_log = []
-        self.seen_unknown = set()
-        self.app_usage_history = defaultdict(lambda: {
-            'upload': 0, 'download': 0, 'samples': 0, 
-            'first_seen': time.time(), 'total_upload_speed': 0, 'total_download_speed': 0
-        })
-        self.last_notification_time = 0
-        self.current_process_data = []  # Store current session data
-        self.sort_mode = 'time'  # 'upload', 'download', 'time'
+        self.init_monitor_state()
+        
+        # Shared capture: take per-process counters from a running monitor daemon
+        if DAEMON_ADDRESS:
+            self.daemon_feed = DaemonSubscriber(DAEMON_ADDRESS)
+            self.get_network_io_stats = self.daemon_feed.io_stats
         
         # Load model
         self.model = None
         self.model_columns = None
         self.load_model()
+        self.restore_state()  # After the model: restored feature windows must match its window/alpha
         
         # Create interface
         self.create_widgets()
@@ -68,6 +102,38 @@ class NetworkMonitorDashboard:
         # Start monitoring
         self.start_monitoring_thread()
         
+    def init_monitor_state(self):
+        """Initialize network monitoring state (no widgets involved)"""
+        self.monitoring = True
+        self.start_time = time.time()
+        self.last_pid_counters = PidCounters()  # Previous tick's per-PID byte counters
+        self.total_anomalies = 0
+        self.total_upload_mb = 0.0
+        self.total_download_mb = 0.0
+        self.anomaly_store = AnomalyStore(ANOMALY_LOG_CAPACITY, ANOMALY_LOG_PATH)
+        self.shown_anomaly_seq = 0  # Last event already in the listbox
+        self.seen_unknown = set()
+        self.app_stats = AppStats()  # Per-app session totals, one array column per counter
+        self.notifier = NotificationDispatcher(self.create_notification_sinks(), NOTIFY_COALESCE_WINDOW,
+                                               NOTIFY_APP_RATE, NOTIFY_APP_BURST)
+        self.enricher = self.create_enricher()  # Remote address -> name, resolved off the UI thread
+        self.current_process_data = []  # Store current session data
+        self.feature_engine = FeatureEngine()  # Per-app temporal model features
+        self.prediction_cache = PredictionCache()  # (app, bucketed features) -> model score
+        self.thresholds = ThresholdTable(fallback=-0.5)  # IsolationForest cutoff with contamination='auto'
+        self.model_manager = None  # Set by load_model(); hot-reloads MODEL_DIR and runs the shadow candidate
+        self.sort_mode = 'time'  # 'upload', 'download', 'time'
+        self.pending_updates = 0  # update_display calls queued via root.after
+        self.pending_lock = threading.Lock()
+        self.display_idle = threading.Event()  # Set while no scheduled update is queued or running
+        self.display_idle.set()
+        self.scheduler = TickScheduler(UPDATE_INTERVAL, MAX_UPDATE_INTERVAL)
+        self.last_snapshot = time.monotonic()
+        self.total_history = ThroughputHistory()  # Fixed-size 1s/1m/1h rings for the chart
+        self.app_history = HistoryTable(HISTORY_MAX_APPS)
+        self.chart_app = None  # None = total traffic
+        self.chart_level = 0   # Index into RESOLUTIONS
+
     def setup_dark_theme(self):
         """Setup dark mode theme for tkinter"""
         # Dark color scheme
@@ -96,20 +162,29 @@ class NetworkMonitorDashboard:
         style.configure('Treeview.Heading', background=self.accent_color, foreground=self.fg_color)
 
     def load_model(self):
-        """Load anomaly detection model"""
+        """Load anomaly detection model (and the shadow candidate, if configured)"""
         if not SKLEARN_AVAILABLE:
             print("scikit-learn not available")
             return
             
+        self.model_manager = ModelManager(MODEL_DIR, CANDIDATE_MODEL_DIR, SENSITIVITY, APP_SENSITIVITY,
+                                          MODEL_POLL_INTERVAL or 0)
         try:
-            self.model = joblib.load("app_anomaly_model.joblib")
-            self.model_columns = joblib.load("model_columns.joblib")
-            if not isinstance(self.model_columns, list):
-                self.model_columns = list(self.model_columns)
+            self.apply_model(self.model_manager.load())
             print("Model loaded successfully!")
         except Exception as e:
             print(f"Model load error: {e}")
 
+    def apply_model(self, bundle):
+        """Switch scoring to a loaded model bundle (startup, or between ticks after a reload)"""
+        self.model = bundle.model
+        self.model_columns = bundle.columns
+        self.thresholds = bundle.thresholds
+        if bundle.feature_settings != (self.feature_engine.window, self.feature_engine.alpha):
+            self.feature_engine = FeatureEngine(*bundle.feature_settings)
+        # Cached predictions belong to the previous model
+        self.prediction_cache.invalidate(bundle.cache_features)
+
     def create_widgets(self):
         """Create all interface elements"""
         
@@ -150,6 +225,11 @@ class NetworkMonitorDashboard:
         self.sort_label = ttk.Label(metrics_grid, text="Zaman (Yeni→Eski)", font=("Arial", 9, "italic"))
         self.sort_label.grid(row=2, column=1, sticky="w", padx=(10,20))
         
+        # Self-metrics (monitor's own cost per tick)
+        ttk.Label(metrics_grid, text="⚙️ Monitör Sağlığı:", font=("Arial", 9)).grid(row=3, column=0, sticky="w")
+        self.self_metrics_label = ttk.Label(metrics_grid, text="-", font=("Consolas", 9))
+        self.self_metrics_label.grid(row=3, column=1, columnspan=3, sticky="w", padx=(10,20))
+        
         # === 2. MAIN CONTENT AREA ===
         main_frame = ttk.Frame(self.root)
         main_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -168,7 +248,7 @@ class NetworkMonitorDashboard:
         
         # Treeview for current processes
         self.process_tree = ttk.Treeview(process_frame, 
-                                       columns=("Status", "Upload", "Download", "Connections"), 
+                                       columns=("Status", "Upload", "Download", "Connections", "Endpoints"), 
                                        show="tree headings", height=12)
         
         # Column headings (Clickable for sorting)
@@ -177,6 +257,7 @@ class NetworkMonitorDashboard:
         self.process_tree.heading("Upload", text="📤 Upload (KB/s)", command=lambda: self.sort_by_column('upload'))
         self.process_tree.heading("Download", text="📥 Download (KB/s)", command=lambda: self.sort_by_column('download'))
         self.process_tree.heading("Connections", text="🔗 Bağlantı")
+        self.process_tree.heading("Endpoints", text="🌍 Uç Noktalar")
         
         # Column widths
         self.process_tree.column("#0", width=150)
@@ -184,12 +265,14 @@ class NetworkMonitorDashboard:
         self.process_tree.column("Upload", width=120)
         self.process_tree.column("Download", width=120)
         self.process_tree.column("Connections", width=80)
+        self.process_tree.column("Endpoints", width=220)
         
         # Scrollbar for process tree
         process_scroll = ttk.Scrollbar(process_frame, orient="vertical", command=self.process_tree.yview)
         self.process_tree.configure(yscrollcommand=process_scroll.set)
         
         self.process_tree.pack(side="left", fill="both", expand=True)
+        self.process_tree.bind("<Double-1>", self.show_app_anomalies)  # Per-app anomaly history
         process_scroll.pack(side="right", fill="y")
         
         # RIGHT TABLE - Session Totals
@@ -232,6 +315,26 @@ class NetworkMonitorDashboard:
         bottom_frame = ttk.LabelFrame(main_frame, text="🚨 Anomali Günlüğü")
         bottom_frame.pack(side="bottom", fill="x", expand=False, pady=(10,0))
         
+        # === 4b. THROUGHPUT CHART (above the anomaly log) ===
+        chart_frame = ttk.LabelFrame(main_frame, text="📈 Trafik Geçmişi")
+        chart_frame.pack(side="bottom", fill="x", expand=False, pady=(10,0))
+        
+        chart_controls = ttk.Frame(chart_frame)
+        chart_controls.pack(fill="x", padx=10, pady=(5,0))
+        self.chart_level_var = tk.IntVar(value=self.chart_level)
+        for level, (label, _, _) in enumerate(RESOLUTIONS):
+            ttk.Radiobutton(chart_controls, text=label, value=level, variable=self.chart_level_var,
+                            command=lambda: self.show_chart(self.chart_app, self.chart_level_var.get())).pack(side="left")
+        ttk.Button(chart_controls, text="Toplam", command=lambda: self.show_chart(None, self.chart_level)).pack(side="left", padx=(10,0))
+        ttk.Label(chart_controls, text="(uygulama grafiği için tabloda bir satıra tıklayın)", font=("Arial", 9, "italic")).pack(side="left", padx=(10,0))
+        
+        chart_canvas = tk.Canvas(chart_frame, height=CHART_HEIGHT, bg=self.frame_color, highlightthickness=0)
+        chart_canvas.pack(fill="x", padx=10, pady=(5,10))
+        self.chart = ThroughputChart(chart_canvas, self.success_color, self.accent_color,
+                                     self.fg_color, "#555555", CHART_DECIMATION)
+        self.chart.show(self.total_history, self.chart_level, "Toplam")
+        self.process_tree.bind("<<TreeviewSelect>>", self.select_chart_app)
+        
         # Anomaly listbox (horizontal now)
         anomaly_frame = ttk.Frame(bottom_frame)
         anomaly_frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -296,6 +399,7 @@ class NetworkMonitorDashboard:
                             internet_connections.append(conn)
                     
                     if internet_connections:
+                        remotes = list(dict.fromkeys(conn.raddr.ip for conn in internet_connections))
                         try:
                             # Get I/O counters
                             io_counters = proc.io_counters()
@@ -303,7 +407,8 @@ class NetworkMonitorDashboard:
                                 'name': name,
                                 'bytes_sent': io_counters.write_bytes,
                                 'bytes_recv': io_counters.read_bytes,
-                                'connections': len(internet_connections)
+                                'connections': len(internet_connections),
+                                'remotes': remotes
                             }
                         except (psutil.AccessDenied, AttributeError):
                             # Fallback for processes we can't access
@@ -311,7 +416,8 @@ class NetworkMonitorDashboard:
                                 'name': name,
                                 'bytes_sent': len(internet_connections) * 1024,
                                 'bytes_recv': len(internet_connections) * 1024,
-                                'connections': len(internet_connections)
+                                'connections': len(internet_connections),
+                                'remotes': remotes
                             }
                             
                 except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
@@ -322,11 +428,22 @@ class NetworkMonitorDashboard:
 
     def calculate_bandwidth_usage(self):
         """Calculate per-process bandwidth usage"""
-        current_time = time.time()
-        current_stats = self.get_network_io_stats()
-        
-        if not self.last_io_stats:
-            self.last_io_stats = current_stats
+        current_time = time.monotonic()  # Rates use the real elapsed time, immune to clock changes
+        with metrics.timer('get_network_io_stats'):
+            current_stats = self.get_network_io_stats()
+        metrics.set_gauge('tracked_pids', len(current_stats))
+        
+        pids, names, sent, recv, conns = stats_to_arrays(current_stats)
+        
+        # A model reloaded in the background takes over here, never halfway through a tick
+        if self.model_manager:
+            bundle = self.model_manager.poll()
+            if bundle:
+                self.apply_model(bundle)
+                print(f"Model reloaded (v{bundle.version})")
+        
+        if not len(self.last_pid_counters):
+            self.last_pid_counters = PidCounters.from_arrays(pids, sent, recv)
             self.last_measurement_time = current_time
             return []
         
@@ -334,96 +451,174 @@ class NetworkMonitorDashboard:
         if time_diff < 1:
             return []
         
-        process_bandwidth = []
+        # Calculate bandwidth for all PIDs at once
+        known, sent_diff, recv_diff = self.last_pid_counters.diff(pids, sent, recv)
+        upload_rates = (sent_diff / 1024) / time_diff
+        download_rates = (recv_diff / 1024) / time_diff
+        active = np.flatnonzero(known & ((upload_rates > 0.1) | (download_rates > 0.1) | (conns > 0)))
         
-        for pid, current in current_stats.items():
-            if pid in self.last_io_stats:
-                last = self.last_io_stats[pid]
-                
-                # Calculate bandwidth
-                bytes_sent_diff = max(0, current['bytes_sent'] - last['bytes_sent'])
-                bytes_recv_diff = max(0, current['bytes_recv'] - last['bytes_recv'])
-                
-                upload_kbps = (bytes_sent_diff / 1024) / time_diff
-                download_kbps = (bytes_recv_diff / 1024) / time_diff
+        # Update totals and usage history (vectorized; several PIDs may share an app)
+        now = time.time()
+        app_ids = self.app_stats.ids_for([names[i] for i in active], now)
+        self.app_stats.add(app_ids, sent_diff[active], recv_diff[active],
+                           upload_rates[active], download_rates[active])
+        self.total_upload_mb += sent_diff[active].sum() / (1024 * 1024)
+        self.total_download_mb += recv_diff[active].sum() / (1024 * 1024)
+        
+        process_bandwidth = []
+        shadow_rows = []  # every scored (app, features) of this tick, cache hits included
+        app_rates = {}  # app -> (up, down) KB/s summed over its PIDs, for the throughput history
+        
+        for i in active:
+            current = current_stats[int(pids[i])]
+            pid = current.get('pid', int(pids[i]))  # Daemon feed: keyed per label, 'pid' is one of its PIDs
+            upload_kbps = float(upload_rates[i])
+            download_kbps = float(download_rates[i])
+            up, down = app_rates.get(current['name'], (0.0, 0.0))
+            app_rates[current['name']] = (up + upload_kbps, down + download_kbps)
+            
+            # Remote endpoints: cached names now, misses are resolved in the background for later ticks
+            endpoints = []
+            for ip in current.get('remotes', ())[:ENDPOINTS_PER_APP]:
+                endpoint = self.enricher.get(ip) if self.enricher else None
+                endpoints.append([ip, endpoint.host if endpoint else None])
+            
+            # Anomaly detection (MODEL ONLY - NO CONNECTION THRESHOLD)
+            status = "✅ Normal"
+            is_anom = False
+            score = None
+            features = self.feature_engine.update(current['name'], upload_kbps, download_kbps, current['connections'])
+            
+            if self.model and self.model_columns:
+                proc_name = current['name']
+                app_col = f"process_name_{proc_name}"
                 
-                if upload_kbps > 0.1 or download_kbps > 0.1 or current['connections'] > 0:
-                    # Anomaly detection (MODEL ONLY - NO CONNECTION THRESHOLD)
-                    status = "✅ Normal"
-                    is_anom = False
-                    
-                    if self.model and self.model_columns:
-                        proc_name = current['name']
-                        app_col = f"process_name_{proc_name}"
-                        
-                        if app_col in self.model_columns:
-                            try:
-                                live_row = pd.DataFrame(0, index=[0], columns=self.model_columns)
-                                if 'upload_kbps' in live_row.columns:
-                                    live_row['upload_kbps'] = upload_kbps
-                                if 'download_kbps' in live_row.columns:
-                                    live_row['download_kbps'] = download_kbps
-                                if app_col in live_row.columns:
-                                    live_row[app_col] = 1
-                                
-                                pred = self.model.predict(live_row)[0]
-                                if pred == -1:
-                                    status = "🚨 Davranışsal Anomali"
-                                    is_anom = True
-                            except Exception:
-                                status = "⚠️ Model Hatası"
-                        else:
-                            if proc_name not in self.seen_unknown:
-                                status = "🚨🚨 Bilinmeyen Uygulama"
-                                is_anom = True
-                                self.seen_unknown.add(proc_name)
-                            else:
-                                status = "⚪ Bilinmeyen"
-                    
-                    # Update totals and usage history
-                    upload_mb = (bytes_sent_diff / (1024 * 1024))
-                    download_mb = (bytes_recv_diff / (1024 * 1024))
-                    
-                    self.total_upload_mb += upload_mb
-                    self.total_download_mb += download_mb
-                    
-                    # Track per-app usage history with speed tracking
-                    self.app_usage_history[current['name']]['upload'] += bytes_sent_diff
-                    self.app_usage_history[current['name']]['download'] += bytes_recv_diff
-                    self.app_usage_history[current['name']]['samples'] += 1
-                    self.app_usage_history[current['name']]['total_upload_speed'] += upload_kbps
-                    self.app_usage_history[current['name']]['total_download_speed'] += download_kbps
-                    
-                    # Log anomaly and send notification
-                    if is_anom:
-                        self.total_anomalies += 1
-                        anomaly_time = datetime.now().strftime("%H:%M:%S")
-                        self.anomaly_log.append(f"{anomaly_time} - {current['name']} - {status}")
-                        
-                        # Send notification (max 1 per 30 seconds)
-                        current_time = time.time()
-                        if current_time - self.last_notification_time > 30:
-                            self.show_notification(
-                                "🚨 Network Anomaly Detected!",
-                                f"{current['name']} - {status}"
-                            )
-                            self.last_notification_time = current_time
-                    
-                    process_bandwidth.append({
-                        'name': current['name'],
-                        'upload_kbps': upload_kbps,
-                        'download_kbps': download_kbps,
-                        'connections': current['connections'],
-                        'status': status,
-                        'is_anomaly': is_anom
-                    })
+                if app_col in self.model_columns:
+                    try:
+                        cache_key = self.prediction_cache.key(proc_name, features)
+                        score = self.prediction_cache.get(cache_key)
+                        if score is None:
+                            live_row = pd.DataFrame(0.0, index=[0], columns=self.model_columns)
+                            fill_live_row(live_row, self.model_columns, features, app_col)
+                            
+                            score = timed_scores(self.model, live_row)[0][0]
+                            self.prediction_cache.put(cache_key, score)
+                        shadow_rows.append((proc_name, features))
+                        if self.thresholds.is_anomaly(proc_name, score):
+                            status = "🚨 Davranışsal Anomali"
+                            is_anom = True
+                    except Exception:
+                        status = "⚠️ Model Hatası"
+                else:
+                    if proc_name not in self.seen_unknown:
+                        status = "🚨🚨 Bilinmeyen Uygulama"
+                        is_anom = True
+                        self.seen_unknown.add(proc_name)
+                    else:
+                        status = "⚪ Bilinmeyen"
+            
+            # Log anomaly and send notification
+            if is_anom:
+                self.total_anomalies += 1
+                self.anomaly_store.append(time.time(), current['name'], pid,
+                                          upload_kbps, download_kbps, score, status, endpoints)
+                # Queued only; coalescing, rate limiting and sending happen on the notifier thread
+                self.notifier.notify(current['name'], status, pid=pid,
+                                     upload_kbps=upload_kbps, download_kbps=download_kbps,
+                                     endpoints=self.format_endpoints(endpoints))
+            
+            process_bandwidth.append({
+                'name': current['name'],
+                'upload_kbps': upload_kbps,
+                'download_kbps': download_kbps,
+                'connections': current['connections'],
+                'status': status,
+                'is_anomaly': is_anom,
+                'endpoints': endpoints
+            })
+
+        if self.model_manager:
+            self.model_manager.shadow(shadow_rows)
+        self.total_history.add(now, float(upload_rates[active].sum()), float(download_rates[active].sum()))
+        self.app_history.add_tick(now, app_rates)
         
         # Update state
-        self.last_io_stats = current_stats
+        self.last_pid_counters = PidCounters.from_arrays(pids, sent, recv)
         self.last_measurement_time = current_time
+        if STATE_SNAPSHOT_PATH and current_time - self.last_snapshot >= STATE_SNAPSHOT_INTERVAL:
+            self.save_state()
         
         return process_bandwidth
 
+    def state_sections(self):
+        """Monitor state as snapshot sections (see state_snapshot.py)"""
+        sections = {
+            'seen_unknown': sorted(self.seen_unknown),
+            'start_time': self.start_time,
+            'total_anomalies': self.total_anomalies,
+            'total_upload_mb': self.total_upload_mb,
+            'total_download_mb': self.total_download_mb,
+        }
+        sections.update(self.app_stats.to_sections())
+        sections.update(self.feature_engine.to_sections())
+        if len(self.last_pid_counters):
+            sections.update(self.last_pid_counters.to_sections())
+            # Wall-clock time of the counters; monotonic clocks do not carry over between processes
+            sections['measured_at'] = time.time() - (time.monotonic() - self.last_measurement_time)
+        return sections
+
+    def save_state(self):
+        """Write a warm-start snapshot (atomic; a failure only costs the warm start)"""
+        self.last_snapshot = time.monotonic()
+        try:
+            with metrics.timer('state_snapshot'):
+                size = state_snapshot.save(STATE_SNAPSHOT_PATH, self.state_sections())
+            metrics.set_gauge('state_snapshot_bytes', size)
+        except OSError as e:
+            print(f"State snapshot error: {e}")
+
+    def restore_state(self):
+        """Warm start from the last snapshot: unknown apps stay reported, session totals,
+        per-PID counters and feature windows continue if the snapshot is recent enough"""
+        if not STATE_SNAPSHOT_PATH:
+            return
+        started = time.perf_counter()
+        snapshot = state_snapshot.load(STATE_SNAPSHOT_PATH)
+        if snapshot is None:
+            return
+        sections = snapshot.sections
+        try:
+            seen_unknown = set(sections.get('seen_unknown', []))
+            session = None
+            if 0 <= time.time() - snapshot.saved_at <= state_snapshot.SESSION_MAX_AGE:
+                session = (AppStats.from_sections(sections), sections['start_time'], int(sections['total_anomalies']),
+                           sections['total_upload_mb'], sections['total_download_mb'])
+            counters = None
+            if 'pid_pids' in sections and state_snapshot.is_fresh(snapshot, state_snapshot.PID_STATE_MAX_AGE):
+                counters = (PidCounters.from_sections(sections), state_snapshot.monotonic_at(sections['measured_at']))
+            engine = None
+            if 'feat_apps' in sections and 0 <= time.time() - snapshot.saved_at <= state_snapshot.PID_STATE_MAX_AGE:
+                engine = FeatureEngine.from_sections(sections)
+                if (engine.window, engine.alpha) != (self.feature_engine.window, self.feature_engine.alpha):
+                    engine = None  # Trained with other settings: start the windows cold
+        except (KeyError, ValueError) as e:
+            print(f"State snapshot ignored: {e}")
+            return
+        
+        self.seen_unknown |= seen_unknown
+        if session:
+            (self.app_stats, self.start_time, self.total_anomalies,
+             self.total_upload_mb, self.total_download_mb) = session
+        if counters:
+            self.last_pid_counters, self.last_measurement_time = counters
+        if engine:
+            self.feature_engine = engine
+        metrics.observe('state_restore', time.perf_counter() - started)
+        print(f"Warm start: {len(self.seen_unknown)} known unknown apps"
+              f"{f', {len(self.app_stats)} app session totals' if session else ''}"
+              f"{f', {len(self.last_pid_counters)} PID counters' if counters else ''}"
+              f"{f', {len(engine.apps)} feature windows' if engine else ''}")
+
     def sort_by_column(self, column_type):
         """Sort table by clicked column header"""
         if self.sort_mode == column_type:
@@ -484,22 +679,36 @@ class NetworkMonitorDashboard:
         # Refresh display with new sorting
         self.update_display()
 
-    def show_notification(self, title, message):
-        """Show Windows notification"""
+    def create_enricher(self):
+        """Endpoint name resolver enabled by configuration"""
+        if not ENRICH_ENDPOINTS:
+            return None
+        try:
+            return EndpointEnricher(ENRICH_DATABASE, ENRICH_DNS)
+        except OSError as e:
+            print(f"Endpoint database error: {e}")
+            return EndpointEnricher(None, ENRICH_DNS)
+
+    def format_endpoints(self, endpoints):
+        """'name (ip), ip' for a row's remote endpoints; names resolved since they were recorded are filled in"""
+        if self.enricher:
+            return ", ".join(self.enricher.describe(ip, host) for ip, host in endpoints)
+        return ", ".join(ip for ip, _ in endpoints)
+
+    def create_notification_sinks(self):
+        """Notification outputs enabled by configuration"""
+        sinks = []
         if NOTIFICATIONS_AVAILABLE:
-            try:
-                notification.notify(
-                    title=title,
-                    message=message,
-                    app_name="Network Monitor",
-                    timeout=5
-                )
-            except Exception as e:
-                print(f"Notification error: {e}")
+            sinks.append(DesktopSink("Network Monitor"))
+        if NOTIFY_LOG_PATH:
+            sinks.append(LogFileSink(NOTIFY_LOG_PATH))
+        if NOTIFY_WEBHOOK_URL:
+            sinks.append(WebhookSink(NOTIFY_WEBHOOK_URL))
+        return sinks
     
     def show_top_apps(self, sort_type):
         """Show detailed app statistics popup"""
-        if not hasattr(self, 'app_usage_history') or not self.app_usage_history:
+        if not hasattr(self, 'app_stats') or not len(self.app_stats):
             messagebox.showinfo("Bilgi", "Henüz yeterli veri toplanmadı.")
             return
         
@@ -531,15 +740,15 @@ class NetworkMonitorDashboard:
         text_widget.configure(yscrollcommand=scrollbar.set)
         
         # Top 15 apps
-        sorted_apps = sorted(self.app_usage_history.items(), 
-                           key=lambda x: x[1][sort_type], reverse=True)[:15]
+        sorted_apps = self.app_stats.top(sort_type, 15)
         
         text_widget.insert(tk.END, f"🏆 TOP 15 - En Çok {sort_type.upper()} Kullanan:\\n\\n")
         
-        for i, (app_name, usage) in enumerate(sorted_apps, 1):
-            value_mb = usage[sort_type] / (1024*1024)  # Convert to MB
-            avg_speed = usage[f'total_{sort_type}_speed'] / max(usage['samples'], 1)  # Average KB/s
-            duration = time.time() - usage['first_seen']
+        for i, usage in enumerate(sorted_apps, 1):
+            app_name = usage.name
+            value_mb = getattr(usage, sort_type) / (1024*1024)  # Convert to MB
+            avg_speed = usage.avg_speed(sort_type)  # Average KB/s
+            duration = time.time() - usage.first_seen
             duration_min = duration / 60
             
             if value_mb > 0.01:  # Only show if > 0.01 MB
@@ -549,14 +758,15 @@ class NetworkMonitorDashboard:
                     f"   📊 Toplam: {value_mb:>8.2f} MB\\n"
                     f"   ⚡ Ortalama: {avg_speed:>6.1f} KB/s\\n"
                     f"   ⏱️ Süre: {duration_min:>6.1f} dakika\\n"
-                    f"   📈 Örnek: {usage['samples']:>4d} ölçüm\\n\\n")
+                    f"   📈 Örnek: {usage.samples:>4d} ölçüm\\n\\n")
         
         # Summary statistics
         text_widget.insert(tk.END, "\\n" + "─" * 50 + "\\n\\n")
         text_widget.insert(tk.END, "📊 GENEL İSTATİSTİKLER:\\n\\n")
         
-        total_value = sum(app[sort_type] for app in self.app_usage_history.values()) / (1024*1024)
-        total_apps = len([app for app in self.app_usage_history.values() if app[sort_type] > 0])
+        values = self.app_stats.column(sort_type)
+        total_value = values.sum() / (1024*1024)
+        total_apps = int(np.count_nonzero(values > 0))
         session_duration = (time.time() - self.start_time) / 60
         
         text_widget.insert(tk.END, 
@@ -576,8 +786,38 @@ class NetworkMonitorDashboard:
                              padx=20, pady=5)
         close_btn.pack(pady=(20, 0))
 
+    def format_anomaly(self, event):
+        """One listbox line for an anomaly event"""
+        anomaly_time = datetime.fromtimestamp(event.ts).strftime("%H:%M:%S")
+        score = f" (skor {event.score:.3f})" if event.score is not None else ""
+        endpoints = f" → {self.format_endpoints(event.remotes)}" if event.remotes else ""
+        return (f"{anomaly_time} - {event.app} [{event.pid}] - {event.reason}{score} - "
+                f"↑{event.up_kbps:.1f} ↓{event.down_kbps:.1f} KB/s{endpoints}")
+
+    def show_app_anomalies(self, event=None):
+        """Show last 24h of anomalies for the double-clicked app"""
+        selection = self.process_tree.selection()
+        if not selection:
+            return
+        app_name = self.process_tree.item(selection[0], 'text')
+        events = self.anomaly_store.query(app=app_name, start=time.time() - 24 * 3600)
+        
+        popup = tk.Toplevel(self.root)
+        popup.title(f"🚨 {app_name} - Anomali Geçmişi")
+        popup.geometry("700x400")
+        popup.configure(bg=self.bg_color)
+        popup.transient(self.root)
+        
+        listbox = tk.Listbox(popup, font=("Consolas", 9), bg=self.frame_color, fg=self.fg_color)
+        listbox.pack(fill="both", expand=True, padx=10, pady=10)
+        if not events:
+            listbox.insert(tk.END, "Son 24 saatte anomali yok.")
+        for anomaly in events:
+            listbox.insert(tk.END, self.format_anomaly(anomaly))
+
     def update_display(self):
         """Update the GUI with current data"""
+        display_start = time.perf_counter()
         # === CLEAR EXISTING DATA ===
         for item in self.process_tree.get_children():
             self.process_tree.delete(item)
@@ -616,7 +856,8 @@ class NetworkMonitorDashboard:
                     status,
                     f"{process['upload_kbps']:.1f}",
                     f"{process['download_kbps']:.1f}",
-                    f"{process['connections']}"
+                    f"{process['connections']}",
+                    self.format_endpoints(process['endpoints'])
                 ),
                 tags=tags
             )
@@ -626,27 +867,22 @@ class NetworkMonitorDashboard:
         self.process_tree.tag_configure('normal', foreground=self.success_color)
         
         # === UPDATE SESSION TOTALS TABLE ===
+        # Top 20 apps by total usage, selected on the arrays without building every row
+        uploads = self.app_stats.column('upload')
+        downloads = self.app_stats.column('download')
         session_data = []
-        for app_name, usage in self.app_usage_history.items():
-            if usage['upload'] > 0 or usage['download'] > 0:
-                duration = time.time() - usage['first_seen']
-                avg_upload = usage['total_upload_speed'] / max(usage['samples'], 1)
-                avg_download = usage['total_download_speed'] / max(usage['samples'], 1)
-                
-                session_data.append({
-                    'name': app_name,
-                    'total_upload': usage['upload'] / (1024*1024),  # MB
-                    'total_download': usage['download'] / (1024*1024),  # MB
-                    'avg_upload': avg_upload,
-                    'avg_download': avg_download,
-                    'duration': duration / 60  # minutes
-                })
-        
-        # Sort session data by total usage
-        session_data.sort(key=lambda x: x['total_upload'] + x['total_download'], reverse=True)
-        
-        # Add to session tree (top 20)
-        for session in session_data[:20]:
+        for usage in self.app_stats.top(uploads + downloads, 20, where=(uploads > 0) | (downloads > 0)):
+            session_data.append({
+                'name': usage.name,
+                'total_upload': usage.upload / (1024*1024),  # MB
+                'total_download': usage.download / (1024*1024),  # MB
+                'avg_upload': usage.avg_speed('upload'),
+                'avg_download': usage.avg_speed('download'),
+                'duration': (time.time() - usage.first_seen) / 60  # minutes
+            })
+        
+        # Add to session tree
+        for session in session_data:
             self.session_tree.insert("", "end",
                 text=session['name'],
                 values=(
@@ -658,16 +894,22 @@ class NetworkMonitorDashboard:
                 )
             )
         
-        # === UPDATE ANOMALY LOG ===
-        # Clear listbox
-        self.anomaly_listbox.delete(0, tk.END)
-        
-        # Add recent anomalies (last 50)
-        recent_anomalies = self.anomaly_log[-50:]
-        for anomaly in recent_anomalies:
-            self.anomaly_listbox.insert(tk.END, anomaly)
+        # === UPDATE THROUGHPUT CHART ===
+        if self.chart_app is not None and self.chart_app not in self.app_history:
+            self.show_chart(None, self.chart_level)  # App's history was dropped: back to the total
+        self.chart.append()
         
-        if self.anomaly_log:
+        # === UPDATE ANOMALY LOG ===
+        # Append only events that are new since the last update
+        new_events = self.anomaly_store.since(self.shown_anomaly_seq)
+        for event in new_events:
+            self.anomaly_listbox.insert(tk.END, self.format_anomaly(event))
+        if new_events:
+            self.shown_anomaly_seq = new_events[-1].seq
+            # Keep only the most recent lines
+            overflow = self.anomaly_listbox.size() - ANOMALY_LIST_SIZE
+            if overflow > 0:
+                self.anomaly_listbox.delete(0, overflow - 1)
             self.anomaly_listbox.see(tk.END)  # Auto scroll to bottom
         
         # === UPDATE METRICS WITH AVERAGES ===
@@ -687,18 +929,74 @@ class NetworkMonitorDashboard:
         
         # Update status
         active_processes = len([p for p in process_data if p['upload_kbps'] > 0.1 or p['download_kbps'] > 0.1])
-        total_apps = len(session_data)
+        total_apps = int(np.count_nonzero((uploads > 0) | (downloads > 0)))
         self.status_label.config(
-            text=f"📊 Anlık: {active_processes} aktif | Session: {total_apps} uygulama | {len(self.anomaly_log)} anomali"
+            text=f"📊 Anlık: {active_processes} aktif | Session: {total_apps} uygulama | {self.total_anomalies} anomali"
         )
+        
+        metrics.observe('update_display', time.perf_counter() - display_start)
+        self.update_self_metrics_panel()
+
+    def show_chart(self, app, level):
+        """Show the throughput history of one app (None = total) at one resolution"""
+        history = self.app_history.get(app) if app is not None else None
+        if history is None:
+            app = None
+            history = self.total_history
+        self.chart_app = app
+        self.chart_level = level
+        self.chart_level_var.set(level)
+        self.chart.show(history, level, app or "Toplam")
+
+    def select_chart_app(self, event=None):
+        """Chart the app selected in the current traffic table"""
+        selection = self.process_tree.selection()
+        if selection:
+            self.show_chart(self.process_tree.item(selection[0], 'text'), self.chart_level)
+
+    def update_self_metrics_panel(self):
+        """Show the monitor's own timings and queue depth"""
+        stats = metrics.snapshot()
+        timers = stats['timers']
+        parts = []
+        for name, label in (('update_display', 'tick'), ('get_network_io_stats', 'io tarama'), ('model_predict', 'predict')):
+            if name in timers:
+                parts.append(f"{label} {timers[name]['last_ms']:.0f}ms (max {timers[name]['max_ms']:.0f})")
+        parts.append(f"tahmin önbelleği: %{self.prediction_cache.hit_rate * 100:.0f}")
+        parts.append(f"bekleyen güncelleme: {stats['gauges'].get('pending_updates', 0)}")
+        if self.model_manager and self.model_manager.candidate:
+            parts.append(self.model_manager.describe())
+        self.self_metrics_label.config(text=" | ".join(parts))
+
+    def run_scheduled_update(self, queued_at):
+        """Run an update_display queued by the monitoring thread"""
+        with self.pending_lock:
+            self.pending_updates -= 1
+            metrics.set_gauge('pending_updates', self.pending_updates)
+        try:
+            self.update_display()
+        finally:
+            # Queue wait counts as load too, so a busy Tk loop also stretches the interval
+            self.scheduler.done(time.monotonic() - queued_at)
+            metrics.set_gauge('tick_interval', round(self.scheduler.interval, 2))
+            self.display_idle.set()
 
     def monitoring_loop(self):
         """Background monitoring loop"""
         while self.monitoring:
             try:
+                self.scheduler.wait()
+                if not self.display_idle.is_set():
+                    # Previous update still queued/running: merge this tick into the next one
+                    self.scheduler.skip()
+                    metrics.set_gauge('ticks_skipped', self.scheduler.skipped)
+                    continue
+                self.display_idle.clear()
                 # Thread-safe GUI update
-                self.root.after(0, self.update_display)
-                time.sleep(2)  # Update every 2 seconds
+                with self.pending_lock:
+                    self.pending_updates += 1
+                    metrics.set_gauge('pending_updates', self.pending_updates)
+                self.root.after(0, self.run_scheduled_update, time.monotonic())
             except Exception as e:
                 print(f"Monitoring error: {e}")
                 break
@@ -707,18 +1005,34 @@ class NetworkMonitorDashboard:
         """Start monitoring in background thread"""
         self.monitor_thread = threading.Thread(target=self.monitoring_loop, daemon=True)
         self.monitor_thread.start()
+        self.notifier.start()
+        if self.model_manager and MODEL_POLL_INTERVAL:
+            self.model_manager.start()
+        if STATS_LOG_INTERVAL:
+            metrics.start_log_thread(STATS_LOG_INTERVAL)
+        if METRICS_PORT:
+            try:
+                metrics.serve_prometheus(METRICS_PORT)
+            except OSError as e:
+                print(f"Metrics endpoint error: {e}")
 
     def on_closing(self):
         """Handle application closing"""
         self.monitoring = False
+        self.notifier.stop()
+        if self.model_manager:
+            self.model_manager.stop()
+        if self.enricher:
+            self.enricher.close()
+        self.anomaly_store.close()
+        if STATE_SNAPSHOT_PATH:
+            self.save_state()
         self.root.destroy()
 
 # Main execution
 if __name__ == "__main__":
     # Install plyer if needed
-    try:
-        from plyer import notification
-    except ImportError:
+    if not NOTIFICATIONS_AVAILABLE:
         print("🚨 Bilgilendirme: Windows notification özelliği için 'plyer' kütüphanesini yükleyin:")
         print("pip install plyer")
     
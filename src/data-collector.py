@@ -4,16 +4,38 @@ import time
 import threading
 from collections import defaultdict
 import psutil
-from scapy.all import sniff, IP, IPv6, TCP, UDP
+from scapy.all import IP, IPv6, TCP, UDP
 import signal
 import pandas as pd
+from self_metrics import metrics
+from tick_scheduler import TickScheduler
+from multi_capture import MultiCapture
+from fleet_agent import FleetAgent
+from baseline_sampler import BaselineSampler
+from unit_attribution import UnitResolver, aggregate
+from app_features import FeatureEngine, FEATURE_COLUMNS
+from packet_sampling import variance_term, confidence_interval, format_rate
 
 TIME_WINDOW = 2        # kaç saniyede bir örnek toplanacak (train verisi için)
+MAX_TIME_WINDOW = 8    # yük altında tick aralığı en fazla bu kadar uzatılır
 MAP_REFRESH = 2        # conn_map kaç saniyede bir yenilensin
 BPF_FILTER = "ip or ip6"
+INTERFACES = None        # None = scapy'nin varsayılan arayüzü, 'all' = tüm aktif arayüzler, ya da ['eth0', 'tun0']
+STATS_LOG_INTERVAL = 60  # öz metrik log satırı (saniye), None = kapalı
+METRICS_PORT = None      # örn. 9108 -> http://127.0.0.1:9108/metrics
+SAMPLE_RATE = 1          # 1 = her paket, N = ortalama N pakette 1 (byte'lar N ile ölçeklenir)
+SAMPLE_MODE = 'random'   # 'random' (sFlow tarzı) veya 'count' (tam olarak her N. paket)
+CPU_BUDGET = None        # örn. 0.25 -> yakalama için CPU bütçesi (arayüzlere bölünür), N otomatik ayarlanır
+BASELINE_MODE = 'all'    # 'all' = her örnek CSV'ye, 'reservoir' = uygulama başına sınırlı rastgele örneklem
+RESERVOIR_PER_APP = 2000 # 'reservoir' modunda uygulama başına tutulan satır
+RESERVOIR_STRATA = 1     # gün içi zaman dilimi sayısı (1 = kapalı, 4 = 6 saatlik bloklar)
+CHECKPOINT_INTERVAL = 300  # 'reservoir' modunda CSV kaç saniyede bir atomik olarak yeniden yazılsın
+BASELINE_CSV = 'app_traffic_baseline.csv'
+ATTRIBUTION = 'process'  # 'process' = süreç adı, 'unit' = container / systemd servisi (/proc/<pid>/cgroup)
+AGGREGATOR_ADDRESS = None  # örn. "10.0.0.5:47900" -> tick'ler fleet_aggregator.py'ye de gönderilir (ajan modu)
 
 keep_running = True
-pid_bytes = defaultdict(lambda: {'up': 0, 'down': 0})
+pid_bytes = defaultdict(lambda: {'up': 0, 'down': 0, 'up_var': 0, 'down_var': 0})
 lock = threading.Lock()
 conn_map = {}
 last_map_refresh = 0
@@ -77,30 +99,48 @@ def match_packet_to_pid(pkt):
         if pid is not None:
             direction = 'in'
 
+    metrics.incr('match_hit' if pid is not None else 'match_miss')
     return pid, direction
 
-def packet_handler(pkt):
+def packet_handler(pkt, weight=1):
     global last_map_refresh
+    start = time.perf_counter()
     now = time.time()
     if now - last_map_refresh > MAP_REFRESH:
-        new_map = build_conn_map()
+        with metrics.timer('build_conn_map'):
+            new_map = build_conn_map()
         with lock:
             conn_map.clear()
             conn_map.update(new_map)
             last_map_refresh = now
+        metrics.set_gauge('conn_map_size', len(new_map))
 
+    metrics.incr('packets_seen')  # sampled packets (skipped ones are counted per interface)
     pid, direction = match_packet_to_pid(pkt)
     if pid is None:
+        metrics.incr('packets_dropped')
+        metrics.observe('packet_handler', time.perf_counter() - start)
         return
     pkt_len = len(pkt)
+    var = variance_term(pkt_len, weight)
     with lock:
         if direction == 'out':
-            pid_bytes[pid]['up'] += pkt_len
+            pid_bytes[pid]['up'] += pkt_len * weight
+            pid_bytes[pid]['up_var'] += var
         else:
-            pid_bytes[pid]['down'] += pkt_len
+            pid_bytes[pid]['down'] += pkt_len * weight
+            pid_bytes[pid]['down_var'] += var
+    metrics.incr('packets_attributed')
+    metrics.observe('packet_handler', time.perf_counter() - start)
 
-def sniffer():
-    sniff(filter=BPF_FILTER, prn=packet_handler, store=False)
+def count_connections():
+    """ pid -> number of connections (conn_map holds both directions of each one). """
+    with lock:
+        pids = list(conn_map.values())
+    counts = defaultdict(int)
+    for pid in pids:
+        counts[pid] += 1
+    return {pid: n // 2 for pid, n in counts.items()}
 
 def get_proc_name(pid):
     try:
@@ -108,34 +148,85 @@ def get_proc_name(pid):
     except Exception:
         return "?"
 
+# pid -> etiket (süreç adı veya birim), PID ömrü boyunca önbellekte
+resolver = UnitResolver(get_proc_name, ATTRIBUTION)
+
 def main():
-    t = threading.Thread(target=sniffer, daemon=True)
-    t.start()
+    capture = MultiCapture(packet_handler, INTERFACES, BPF_FILTER,
+                           sample_rate=SAMPLE_RATE, sample_mode=SAMPLE_MODE, cpu_budget=CPU_BUDGET).start()
+    print("Yakalanan arayüzler:", ", ".join(i or "varsayılan" for i in capture.interfaces))
+    if STATS_LOG_INTERVAL:
+        metrics.start_log_thread(STATS_LOG_INTERVAL)
+    if METRICS_PORT:
+        metrics.serve_prometheus(METRICS_PORT)
+    agent = FleetAgent(AGGREGATOR_ADDRESS).start() if AGGREGATOR_ADDRESS else None
     print("Veri toplama başladı. Ctrl+C ile durdurup CSV oluşturabilirsiniz.")
     samples = []
+    baseline = None
+    if BASELINE_MODE == 'reservoir':
+        # Satırlar tek tek örneklendiği için zamansal özellikler burada, ardışık tick'lerle hesaplanır
+        baseline = BaselineSampler(RESERVOIR_PER_APP, RESERVOIR_STRATA)
+        feature_engine = FeatureEngine()
+        last_checkpoint = time.monotonic()
     try:
+        scheduler = TickScheduler(TIME_WINDOW, MAX_TIME_WINDOW)
         while keep_running:
-            time.sleep(TIME_WINDOW)
+            elapsed = scheduler.wait()  # gerçek geçen süre (monotonic), KB/s bununla hesaplanır
             with lock:
                 snapshot = dict(pid_bytes)
                 pid_bytes.clear()
-            for pid, vals in snapshot.items():
-                up_kbps = vals['up'] / 1024.0 / TIME_WINDOW
-                down_kbps = vals['down'] / 1024.0 / TIME_WINDOW
+            metrics.set_gauge('pending_pids', len(snapshot))
+            conns = count_connections()
+            metrics.set_gauge('sample_rate', capture.sample_rate)
+            metrics.set_gauge('tick_interval', round(scheduler.interval, 2))
+            metrics.set_gauge('ticks_skipped', scheduler.skipped)
+            capture.publish_metrics()
+            tick_rows = []
+            # PID sayaçları tick başına bir kez etikete (süreç / birim) göre toplanır
+            for name, vals in aggregate(snapshot, resolver, conns):
+                up_kbps = vals['up'] / 1024.0 / elapsed
+                down_kbps = vals['down'] / 1024.0 / elapsed
                 if up_kbps > 0 or down_kbps > 0:
-                    samples.append({
-                        'process_name': get_proc_name(pid),
-                        'upload_kbps': up_kbps,
-                        'download_kbps': down_kbps
-                    })
-                    print(f"{get_proc_name(pid):30} ↑{up_kbps:7.2f} KB/s ↓{down_kbps:7.2f} KB/s")
+                    if baseline is not None:
+                        row = {'process_name': name}
+                        row.update(feature_engine.update(name, up_kbps, down_kbps, vals['connections']))
+                        baseline.add(row)
+                    else:
+                        samples.append({
+                            'process_name': name,
+                            'upload_kbps': up_kbps,
+                            'download_kbps': down_kbps,
+                            'connections': vals['connections']
+                        })
+                    up_ci = confidence_interval(vals['up_var']) / 1024.0 / elapsed
+                    down_ci = confidence_interval(vals['down_var']) / 1024.0 / elapsed
+                    print(f"{name:30} ↑{format_rate(up_kbps, up_ci, 7)} KB/s ↓{format_rate(down_kbps, down_ci, 7)} KB/s")
+                    tick_rows.append((name, up_kbps, down_kbps, vals['connections']))
+            resolver.retain(conns)
+            if agent:
+                agent.submit(time.time(), tick_rows)
+            if baseline is not None and time.monotonic() - last_checkpoint > CHECKPOINT_INTERVAL:
+                baseline.save_csv(BASELINE_CSV, ['process_name'] + FEATURE_COLUMNS)
+                last_checkpoint = time.monotonic()
+            scheduler.done()
     except KeyboardInterrupt:
         pass
-
-    if samples:
+    capture.stop()
+    if agent:
+        agent.stop()
+    for iface, counters in capture.stats().items():
+        print(f"{iface}: {counters['packets']} paket, {counters['bytes'] / 1024 / 1024:.1f} MB, "
+              f"{counters['duplicates']} tekrar, {counters['errors']} hata")
+
+    if baseline is not None and len(baseline):
+        rows = baseline.save_csv(BASELINE_CSV, ['process_name'] + FEATURE_COLUMNS)
+        print(f"\n{rows} satır örneklem kaydedildi -> {BASELINE_CSV}")
+        for app, (seen, kept) in sorted(baseline.summary().items(), key=lambda item: -item[1][0]):
+            print(f"  {app:30} {seen:>8} örnek, {kept:>6} tutuldu")
+    elif samples:
         df = pd.DataFrame(samples)
-        df.to_csv('app_traffic_baseline.csv', index=False)
-        print(f"\n{len(samples)} satır veri kaydedildi -> app_traffic_baseline.csv")
+        df.to_csv(BASELINE_CSV, index=False)
+        print(f"\n{len(samples)} satır veri kaydedildi -> {BASELINE_CSV}")
     else:
         print("\nHiç veri toplanmadı.")
 
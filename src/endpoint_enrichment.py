@@ -0,0 +1,215 @@
+# endpoint_enrichment.py
+# Names for the remote addresses the monitors already see (conn_map keys, psutil raddr).
+# Lookups never block a tick: get() answers from a TTL-bounded LRU cache and, on a miss,
+# queues the address for a small background resolver pool. A result (or a failure, kept
+# for the shorter NEGATIVE_TTL) lands in the cache, so the name is there on a later tick
+# or when an anomaly event is shown; a full queue drops the request instead of waiting.
+#
+# Sources, in order: an optional local database file, then reverse DNS through the
+# system resolver (set dns=False to stay fully offline, or point the system at a local
+# resolver stub). Database lines:
+#     8.8.8.8        dns.google                  hosts-file style: address, name
+#     10.20.0.0/16,build-farm,Corp LAN           CIDR range, name[, organisation]
+#
+#   python src/endpoint_enrichment.py 8.8.8.8 1.1.1.1 --db endpoints.txt --offline
+import argparse
+import ipaddress
+import socket
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from self_metrics import metrics
+
+TTL = 3600            # seconds a resolved name is kept
+NEGATIVE_TTL = 300    # seconds a failed lookup is remembered (no retry storm for unnamed hosts)
+MAX_ENTRIES = 4096    # cache size (least recently used entries are evicted)
+WORKERS = 4           # resolver threads
+MAX_PENDING = 256     # queued lookups; beyond this new misses are dropped and retried later
+
+Endpoint = namedtuple('Endpoint', ['ip', 'host', 'org', 'source'])   # host None = no name found
+
+def reverse_dns(ip):
+    """ PTR name through the system resolver, or None. """
+    try:
+        return socket.gethostbyaddr(ip)[0]
+    except (OSError, UnicodeError):
+        return None
+
+class EndpointDatabase:
+    """ Offline address -> (name, organisation) table: exact addresses plus CIDR ranges. """
+
+    def __init__(self, path=None):
+        self.exact = {}
+        # version -> (starts, ends, (name, org), parents), sorted by start, wider ranges first on a tie;
+        # parents[i] is the index of the closest range enclosing range i, or -1
+        self.ranges = {4: ([], [], [], []), 6: ([], [], [], [])}
+        if path:
+            self.load(path)
+
+    def __len__(self):
+        return len(self.exact) + sum(len(r[0]) for r in self.ranges.values())
+
+    def load(self, path):
+        entries = {4: [], 6: []}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                fields = [p.strip() for p in line.split(',')] if ',' in line else line.split()
+                if len(fields) < 2:
+                    continue
+                org = fields[2] if len(fields) > 2 else None
+                try:
+                    if '/' in fields[0]:
+                        net = ipaddress.ip_network(fields[0], strict=False)
+                        entries[net.version].append((int(net.network_address), int(net.broadcast_address),
+                                                     (fields[1], org)))
+                    else:
+                        self.exact[str(ipaddress.ip_address(fields[0]))] = (fields[1], org)
+                except ValueError:
+                    continue
+        for version, items in entries.items():
+            starts, ends, values, parents = self.ranges[version]
+            items.extend(zip(starts, ends, values))
+            items.sort(key=lambda item: (item[0], -item[1]))
+            del starts[:], ends[:], values[:], parents[:]
+            # CIDR blocks either nest or are disjoint, so the open ranges form a stack
+            open_ranges = []
+            for i, (start, end, value) in enumerate(items):
+                while open_ranges and ends[open_ranges[-1]] < start:
+                    open_ranges.pop()
+                parents.append(open_ranges[-1] if open_ranges else -1)
+                open_ranges.append(i)
+                starts.append(start)
+                ends.append(end)
+                values.append(value)
+
+    def lookup(self, ip):
+        found = self.exact.get(ip)
+        if found:
+            return found
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        starts, ends, values, parents = self.ranges[address.version]
+        value = int(address)
+        i = bisect_right(starts, value) - 1
+        # Any covering range encloses range i, so climb its parents: at most one step per prefix length
+        while i >= 0 and ends[i] < value:
+            i = parents[i]
+        return values[i] if i >= 0 else None
+
+class EndpointEnricher:
+    def __init__(self, database=None, dns=True, resolver=reverse_dns, workers=WORKERS, ttl=TTL,
+                 negative_ttl=NEGATIVE_TTL, max_entries=MAX_ENTRIES, max_pending=MAX_PENDING, on_resolved=None):
+        """ database: EndpointDatabase or a path; resolver(ip) -> name or None (e.g. a stub in tests). """
+        self.database = EndpointDatabase(database) if isinstance(database, str) else database
+        self.resolver = resolver if dns else None
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_pending = max_pending
+        self.on_resolved = on_resolved   # called on a resolver thread with each new Endpoint
+        self.cache = OrderedDict()       # ip -> (expires, Endpoint), least recently used first
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.executor = None             # created on the first miss
+        self.workers = workers
+
+    def peek(self, ip):
+        """ Cached Endpoint (even if expired) without scheduling anything. """
+        with self.lock:
+            entry = self.cache.get(ip)
+        return entry[1] if entry else None
+
+    def get(self, ip, now=None):
+        """ Fresh cached Endpoint or None; a miss or expired entry is queued for resolution. """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.cache.get(ip)
+            if entry is not None:
+                self.cache.move_to_end(ip)
+                if entry[0] > now:
+                    metrics.incr('enrich_hit')
+                    return entry[1]
+            if ip in self.pending:
+                return entry[1] if entry else None
+            if len(self.pending) >= self.max_pending:
+                metrics.incr('enrich_dropped')
+                return entry[1] if entry else None
+            self.pending.add(ip)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='enrich')
+        metrics.incr('enrich_miss')
+        self.executor.submit(self._resolve, ip)
+        return entry[1] if entry else None
+
+    def prefetch(self, ips):
+        for ip in ips:
+            self.get(ip)
+
+    def describe(self, ip, host=None):
+        """ 'name (ip)' when a name is known (host or cache), else the bare address. """
+        if host is None:
+            endpoint = self.peek(ip)
+            host = endpoint.host if endpoint else None
+        return f"{host} ({ip})" if host else ip
+
+    def _resolve(self, ip):
+        endpoint = Endpoint(ip, None, None, None)
+        try:
+            with metrics.timer('enrich_lookup'):
+                found = self.database.lookup(ip) if self.database else None
+                if found:
+                    endpoint = Endpoint(ip, found[0], found[1], 'db')
+                elif self.resolver:
+                    host = self.resolver(ip)
+                    if host:
+                        endpoint = Endpoint(ip, host, None, 'dns')
+        except Exception:
+            pass
+        ttl = self.ttl if endpoint.host else self.negative_ttl
+        with self.lock:
+            self.pending.discard(ip)
+            self.cache[ip] = (time.monotonic() + ttl, endpoint)
+            self.cache.move_to_end(ip)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+            metrics.set_gauge('enrich_cache_size', len(self.cache))
+        if self.on_resolved:
+            self.on_resolved(endpoint)
+
+    def wait(self, timeout=5.0):
+        """ Block until queued lookups are done (CLI / shutdown). """
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve remote endpoints the way the monitors do")
+    parser.add_argument('ips', nargs='+')
+    parser.add_argument('--db', help="local hosts / CIDR database file")
+    parser.add_argument('--offline', action='store_true', help="database only, no DNS")
+    args = parser.parse_args()
+
+    enricher = EndpointEnricher(args.db, dns=not args.offline)
+    enricher.prefetch(args.ips)
+    enricher.wait()
+    for ip in args.ips:
+        endpoint = enricher.peek(ip)
+        org = f" [{endpoint.org}]" if endpoint and endpoint.org else ""
+        source = endpoint.source if endpoint and endpoint.source else "bulunamadı"
+        print(f"{enricher.describe(ip)}{org} - {source}")
+    enricher.close()
+
+if __name__ == "__main__":
+    main()
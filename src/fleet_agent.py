@@ -0,0 +1,206 @@
+# fleet_agent.py
+# Agent side of the fleet protocol.
+# FleetAgent.submit() is called once per tick from the collector/detector loop and only
+# appends to a bounded buffer; a background thread sends the buffered ticks in batches,
+# waits for the aggregator's ACK, and keeps unacknowledged ticks for the next attempt.
+# fetch_model() downloads the fleet model into the files real-time-detector.py loads, after
+# checking its HMAC with the shared fleet key (fleet_protocol.load_key()).
+#
+#   python src/fleet_agent.py --replay app_traffic_baseline.csv --agents 50   # loopback load test
+#   python src/fleet_agent.py --fetch-model models
+import argparse
+import io
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from self_metrics import metrics
+import fleet_protocol as proto
+
+BATCH_INTERVAL = 10        # seconds between sends
+MAX_BATCH_TICKS = 256      # ticks per BATCH frame
+MAX_BUFFERED_TICKS = 4096  # oldest ticks are dropped when the aggregator is unreachable this long
+CONNECT_TIMEOUT = 5
+VERSION_FILE = 'fleet_model_version'
+
+def parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+def connect(address, host_name, timeout=CONNECT_TIMEOUT):
+    sock = socket.create_connection(parse_address(address), timeout=timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.sendall(proto.encode_hello(host_name))
+    return sock
+
+def expect(sock, kind):
+    got, payload = proto.read_frame(sock)
+    if got == proto.ERROR:
+        raise proto.ProtocolError(payload.decode('utf-8', 'replace'))
+    if got != kind:
+        raise proto.ProtocolError(f"expected message {kind}, got {got}")
+    return payload
+
+class FleetAgent:
+    def __init__(self, address, host_name=None, batch_interval=BATCH_INTERVAL, max_buffered=MAX_BUFFERED_TICKS):
+        self.address = address
+        self.host_name = host_name or socket.gethostname()
+        self.batch_interval = batch_interval
+        self.buffer = deque(maxlen=max_buffered)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.sock = None
+        self.seq = 0   # tick sequence number, so an ACK removes exactly the ticks it covers
+        self.sent_records = 0
+        self.thread = threading.Thread(target=self._run, daemon=True, name="fleet-agent")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """ Send what is buffered (best effort) and stop. """
+        self.stopping.set()
+        self.thread.join(timeout)
+
+    def submit(self, ts, rows):
+        """ rows: [(app, up_kbps, down_kbps, connections), ...] for one tick; never blocks on the network. """
+        if not rows:
+            return
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                metrics.incr('agent_ticks_dropped')
+            self.seq += 1
+            self.buffer.append((self.seq, ts, rows))
+
+    def _run(self):
+        backoff = 1
+        while True:
+            stopping = self.stopping.wait(self.batch_interval)
+            try:
+                self.flush()
+                backoff = 1
+            except (OSError, proto.ProtocolError) as e:
+                self._close()
+                metrics.incr('agent_send_errors')
+                if stopping:
+                    print(f"Aggregator'a gönderilemedi ({self.address}): {e}")
+                else:
+                    self.stopping.wait(min(backoff, 60))  # on top of the batch interval
+                    backoff *= 2
+            if stopping:
+                self._close()
+                return
+
+    def flush(self):
+        """ Send buffered ticks in batches; each batch leaves the buffer only once it is acknowledged. """
+        while True:
+            with self.lock:
+                batch = [self.buffer[i] for i in range(min(len(self.buffer), MAX_BATCH_TICKS))]
+            if not batch:
+                return
+            if self.sock is None:
+                self.sock = connect(self.address, self.host_name)
+            self.sock.sendall(proto.encode_batch([(ts, rows) for _, ts, rows in batch]))
+            accepted = proto.decode_ack(expect(self.sock, proto.ACK))
+            last = batch[-1][0]
+            with self.lock:
+                # Ticks may have been evicted meanwhile; drop only the ones this batch covered
+                while self.buffer and self.buffer[0][0] <= last:
+                    self.buffer.popleft()
+            self.sent_records += accepted
+            metrics.incr('agent_records_sent', accepted)
+
+    def _close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+def fetch_model(address, directory='.', host_name=None, key=None):
+    """
+    Download the fleet model into directory (app_anomaly_model.joblib, model_columns.joblib,
+    feature_config.joblib, app_thresholds.joblib). Returns the version, or None if the
+    aggregator has no model or the local copy is already current. Raises ProtocolError
+    without a fleet key or if the bundle's signature does not match it.
+    """
+    import joblib
+    from score_thresholds import THRESHOLDS_FILE
+    key = key or proto.load_key()
+    if not key:
+        raise proto.ProtocolError(f"no fleet key ({proto.KEY_ENV} or {proto.KEY_FILE}), refusing to fetch a model")
+    version_path = os.path.join(directory, VERSION_FILE)
+    try:
+        with open(version_path) as f:
+            have = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        have = 0
+    with connect(address, host_name or socket.gethostname()) as sock:
+        sock.sendall(proto.encode_model_request(have))
+        version, blob = proto.decode_model(expect(sock, proto.MODEL), key)
+    if not blob:
+        return None
+    bundle = joblib.load(io.BytesIO(blob))  # only reached with a verified signature
+    os.makedirs(directory, exist_ok=True)
+    joblib.dump(bundle['model'], os.path.join(directory, 'app_anomaly_model.joblib'))
+    joblib.dump(bundle['columns'], os.path.join(directory, 'model_columns.joblib'))
+    joblib.dump(bundle['feature_config'], os.path.join(directory, 'feature_config.joblib'))
+    joblib.dump(bundle['thresholds'], os.path.join(directory, THRESHOLDS_FILE))
+    with open(version_path, 'w') as f:
+        f.write(str(version))
+    return version
+
+def replay(address, csv_path, agents, ticks_per_agent, tick_seconds=2.0):
+    """ Loopback load test: `agents` simulated hosts each send ticks built from a baseline CSV. """
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    if 'connections' not in df.columns:
+        df['connections'] = 0
+    rows = list(df[['process_name', 'upload_kbps', 'download_kbps', 'connections']].itertuples(index=False, name=None))
+    per_tick = 5
+
+    def run_agent(n, results):
+        agent = FleetAgent(address, f"sim-{n:04d}", batch_interval=0)
+        start = time.time() - ticks_per_agent * tick_seconds
+        for t in range(ticks_per_agent):
+            offset = (n * 7 + t * per_tick) % len(rows)
+            agent.submit(start + t * tick_seconds, [rows[(offset + i) % len(rows)] for i in range(per_tick)])
+        agent.flush()
+        agent._close()
+        results[n] = agent.sent_records
+
+    results = {}
+    threads = [threading.Thread(target=run_agent, args=(n, results)) for n in range(agents)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    total = sum(results.values())
+    print(f"{len(results)}/{agents} ajan, {total} kayıt, {elapsed:.2f} sn ({total / elapsed:.0f} kayıt/sn)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet agent utilities")
+    parser.add_argument('--address', default="127.0.0.1:47900", help="aggregator host:port")
+    parser.add_argument('--fetch-model', metavar='DIR', help="download the fleet model into DIR")
+    parser.add_argument('--key-file', default=None, help=f"shared fleet key (default: ${proto.KEY_ENV} or {proto.KEY_FILE})")
+    parser.add_argument('--replay', metavar='CSV', help="send ticks built from a baseline CSV (load test)")
+    parser.add_argument('--agents', type=int, default=10, help="simulated agents for --replay")
+    parser.add_argument('--ticks', type=int, default=100, help="ticks per simulated agent")
+    args = parser.parse_args()
+
+    if args.fetch_model:
+        version = fetch_model(args.address, args.fetch_model, key=proto.load_key(args.key_file))
+        print(f"Model indirildi (sürüm {version})" if version else "Yeni model yok.")
+    elif args.replay:
+        replay(args.address, args.replay, args.agents, args.ticks)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
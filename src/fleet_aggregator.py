@@ -0,0 +1,283 @@
+# fleet_aggregator.py
+# Fleet-wide baseline and model service for many monitoring agents.
+# Ajanlar (data-collector.py / real-time-detector.py, AGGREGATOR_ADDRESS ayarlıyken) tick'lerini
+# fleet_protocol formatında toplu gönderir. Aggregator zamansal özellikleri geliş sırasında host başına
+# hesaplar ve satırları uygulama başına sınırlı bir rezervuar örnekleminde tutar (baseline_sampler):
+# ajan sayısı ve çalışma süresi ne olursa olsun bellek, baseline CSV ve eğitim süresi
+# uygulama sayısı x SAMPLE_PER_APP ile sınırlıdır. Model periyodik olarak bu örneklemden yeniden eğitilir.
+#
+#   python src/fleet_aggregator.py --listen 0.0.0.0:47900 --model-dir fleet_models
+#   python src/fleet_aggregator.py --train-now                 # mevcut baseline ile hemen eğit
+#   python src/fleet_aggregator.py --gen-key fleet.key           # ortak anahtarı üret, ajanlara dağıt
+#
+# Model paketleri joblib (pickle) ile taşınır ve ortak anahtarla HMAC imzalanır; ajanlar imzası
+# tutmayan paketi yüklemez. Anahtar yoksa aggregator model dağıtmaz (tick toplamaya devam eder).
+import argparse
+import asyncio
+import io
+import os
+import secrets
+import signal
+import time
+
+from self_metrics import metrics
+from app_features import FeatureEngine, FEATURE_COLUMNS, WINDOW, ALPHA
+from baseline_sampler import BaselineSampler, PER_APP_ROWS
+import fleet_protocol as proto
+
+DEFAULT_LISTEN = "127.0.0.1:47900"
+CHECKPOINT_INTERVAL = 300   # seconds between atomic rewrites of the sampled baseline CSV
+SAMPLE_PER_APP = PER_APP_ROWS  # fleet-wide rows kept per app (reservoir sample across all hosts)
+SAMPLE_STRATA = 1           # time-of-day strata per app (see baseline_sampler.py)
+TRAIN_INTERVAL = 3600       # seconds between retraining checks
+MIN_NEW_ROWS = 1000         # retrain only when at least this many rows arrived since the last model
+BASELINE_COLUMNS = ['host', 'ts', 'process_name'] + FEATURE_COLUMNS
+BUNDLE_FILE = 'fleet_model.joblib'
+
+def train_bundle(df):
+    """ Train on a fleet baseline; same features and model settings as train-app-model.py. """
+    import pandas as pd
+    from sklearn.ensemble import IsolationForest
+    from score_thresholds import compute_thresholds
+
+    if all(c in df.columns for c in FEATURE_COLUMNS):
+        features = df[['process_name'] + FEATURE_COLUMNS]   # computed per host at ingest time
+    else:
+        df = df.sort_values(['host', 'ts'], kind='stable')
+        features = pd.concat(host_features(df))
+    features = pd.get_dummies(features, columns=['process_name'])
+    model = IsolationForest(contamination='auto', random_state=42, n_estimators=200)
+    model.fit(features)
+    thresholds = compute_thresholds(model.score_samples(features), df['process_name'])
+    return {
+        'model': model,
+        'columns': features.columns,
+        'feature_config': {'window': WINDOW, 'alpha': ALPHA},
+        'thresholds': thresholds,
+        'rows': len(df),
+        'hosts': int(df['host'].nunique()),
+    }
+
+def host_features(df):
+    """ Raw rows sorted by (host, ts) -> feature frames; temporal features never cross hosts. """
+    from app_features import compute_features_frame
+    return [compute_features_frame(part, WINDOW, ALPHA) for _, part in df.groupby('host', sort=False)]
+
+def dump_bundle(bundle):
+    import joblib
+    buffer = io.BytesIO()
+    joblib.dump(bundle, buffer, compress=3)
+    return buffer.getvalue()
+
+class FleetAggregator:
+    def __init__(self, listen=DEFAULT_LISTEN, baseline_path='fleet_baseline.csv', model_dir='.',
+                 train_interval=TRAIN_INTERVAL, min_new_rows=MIN_NEW_ROWS, key=None,
+                 sample_per_app=SAMPLE_PER_APP, strata=SAMPLE_STRATA):
+        self.listen = listen
+        self.key = key or proto.load_key()   # signs model bundles; None = models are not served
+        self.baseline_path = baseline_path
+        self.model_dir = model_dir
+        self.train_interval = train_interval
+        self.min_new_rows = min_new_rows
+        self.sample = BaselineSampler(sample_per_app, strata)   # bounded fleet baseline
+        self.engines = {}          # host -> FeatureEngine (temporal features per host and app)
+        self.rows_since_train = 0
+        self.rows_since_checkpoint = 0
+        self.hosts = {}            # host -> {'records', 'last_seen', 'connected'}
+        self.model_version = 0
+        self.model_blob = b''
+        self.stopping = None
+        self._load_bundle()
+        self._load_baseline()
+
+    def _load_bundle(self):
+        path = os.path.join(self.model_dir, BUNDLE_FILE)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.model_blob = f.read()
+            self.model_version = int(os.path.getmtime(path))
+            print(f"Mevcut fleet modeli yüklendi (sürüm {self.model_version}).")
+
+    def _load_baseline(self):
+        """ Feed an existing baseline CSV through the sample (it is rewritten bounded at the next checkpoint). """
+        if not os.path.exists(self.baseline_path):
+            return
+        import pandas as pd
+        df = pd.read_csv(self.baseline_path)
+        if df.empty:
+            return
+        if not all(c in df.columns for c in FEATURE_COLUMNS):
+            # Raw rows written by an older aggregator
+            df = df.sort_values(['host', 'ts'], kind='stable')
+            df = pd.concat([df[['host', 'ts']], pd.concat(host_features(df))], axis=1)
+        for row in df[BASELINE_COLUMNS].itertuples(index=False, name=None):
+            self.sample.add(row, row[1], row[2])
+        print(f"{len(df)} satırlık baseline okundu, {len(self.sample)} satır örneklemde.")
+
+    def add_records(self, host, records):
+        """ Features in arrival order (per host and app), then each row is offered to the sample. """
+        engine = self.engines.get(host)
+        if engine is None:
+            engine = self.engines[host] = FeatureEngine(WINDOW, ALPHA)
+        for ts, app, up, down, conns in records:
+            features = engine.update(app, up, down, conns)
+            self.sample.add((host, ts, app) + tuple(features[c] for c in FEATURE_COLUMNS), ts, app)
+        self.rows_since_train += len(records)
+        self.rows_since_checkpoint += len(records)
+
+    # --- agents ---
+    async def handle_agent(self, reader, writer):
+        host = None
+        try:
+            kind, payload = await proto.read_frame_async(reader)
+            if kind != proto.HELLO:
+                raise proto.ProtocolError("expected HELLO")
+            host = proto.decode_hello(payload)
+            state = self.hosts.setdefault(host, {'records': 0, 'last_seen': 0.0, 'connected': 0})
+            state['connected'] += 1
+            metrics.set_gauge('agents_connected', sum(s['connected'] for s in self.hosts.values()))
+            while True:
+                kind, payload = await proto.read_frame_async(reader)
+                if kind == proto.BATCH:
+                    records = proto.decode_batch(payload)
+                    self.add_records(host, records)
+                    state['records'] += len(records)
+                    state['last_seen'] = time.time()
+                    metrics.incr('fleet_records', len(records))
+                    metrics.incr('fleet_bytes', len(payload) + 5)
+                    writer.write(proto.encode_ack(len(records)))
+                elif kind == proto.MODEL_REQUEST:
+                    have = proto.decode_model_request(payload)
+                    if not self.key:
+                        raise proto.ProtocolError("aggregator has no fleet key, models are not served")
+                    blob = self.model_blob if self.model_version and have != self.model_version else b''
+                    writer.write(proto.encode_model(self.model_version, blob, self.key))
+                else:
+                    raise proto.ProtocolError(f"unexpected message type {kind}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:  # malformed frame: tell the agent and drop the connection
+            metrics.incr('fleet_protocol_errors')
+            try:
+                writer.write(proto.encode_error(str(e)))
+            except Exception:
+                pass
+        finally:
+            if host is not None:
+                self.hosts[host]['connected'] -= 1
+                metrics.set_gauge('agents_connected', sum(s['connected'] for s in self.hosts.values()))
+            writer.close()
+
+    # --- storage and training ---
+    async def checkpoint(self, loop):
+        """ Atomically rewrite the baseline CSV with the current sample (written off the event loop). """
+        if not self.rows_since_checkpoint:
+            return
+        self.rows_since_checkpoint = 0
+        rows = self.sample.rows()
+        metrics.set_gauge('fleet_sample_rows', len(rows))
+        with metrics.timer('fleet_checkpoint'):
+            await loop.run_in_executor(None, self.sample.save_csv, self.baseline_path, BASELINE_COLUMNS, rows)
+
+    def train(self, rows=None):
+        """ Retrain from the sampled baseline and publish the new bundle (blocking). """
+        import pandas as pd
+        df = pd.DataFrame(self.sample.rows() if rows is None else rows, columns=BASELINE_COLUMNS)
+        bundle = train_bundle(df)
+        blob = dump_bundle(bundle)
+        os.makedirs(self.model_dir, exist_ok=True)
+        path = os.path.join(self.model_dir, BUNDLE_FILE)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(blob)
+        os.replace(path + '.tmp', path)
+        self.model_blob = blob
+        self.model_version = max(int(time.time()), self.model_version + 1)
+        print(f"Fleet modeli eğitildi: {bundle['rows']} satır, {bundle['hosts']} host, "
+              f"{len(bundle['thresholds']['apps'])} uygulama eşiği (sürüm {self.model_version})")
+        return self.model_version
+
+    async def checkpoint_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self.stopping.is_set():
+            await self._sleep(CHECKPOINT_INTERVAL)
+            await self.checkpoint(loop)
+
+    async def train_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self.stopping.is_set():
+            await self._sleep(self.train_interval)
+            if self.rows_since_train < self.min_new_rows:
+                continue
+            self.rows_since_train = 0
+            rows = self.sample.rows()  # taken on the loop thread; ingestion keeps going meanwhile
+            try:
+                with metrics.timer('fleet_train'):
+                    await loop.run_in_executor(None, self.train, rows)
+            except Exception as e:
+                print("Eğitim hatası:", e)
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.stopping.set)
+            loop.add_signal_handler(signal.SIGTERM, self.stopping.set)
+        except (NotImplementedError, AttributeError):
+            pass  # Windows: Ctrl+C arrives as KeyboardInterrupt instead
+
+        host, port = self.listen.rsplit(':', 1)
+        server = await asyncio.start_server(self.handle_agent, host, int(port))
+        print(f"Aggregator dinliyor: {self.listen} (Ctrl+C ile durdurun)")
+        tasks = [asyncio.create_task(self.checkpoint_loop()), asyncio.create_task(self.train_loop())]
+        await self.stopping.wait()
+
+        print("\nAggregator durduruluyor...")
+        server.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.checkpoint(loop)
+        total = sum(s['records'] for s in self.hosts.values())
+        print(f"{len(self.hosts)} host'tan {total} kayıt alındı -> {self.baseline_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet aggregator: collects agent ticks, trains and serves models")
+    parser.add_argument('--listen', default=DEFAULT_LISTEN, help="host:port to accept agents on")
+    parser.add_argument('--baseline', default='fleet_baseline.csv', help="fleet-wide baseline CSV (sampled, bounded)")
+    parser.add_argument('--sample-per-app', type=int, default=SAMPLE_PER_APP, help="baseline rows kept per app")
+    parser.add_argument('--model-dir', default='.', help="where the trained bundle is kept")
+    parser.add_argument('--train-interval', type=float, default=TRAIN_INTERVAL, help="seconds between retraining checks")
+    parser.add_argument('--min-new-rows', type=int, default=MIN_NEW_ROWS, help="rows needed before retraining")
+    parser.add_argument('--train-now', action='store_true', help="train once from the baseline and exit")
+    parser.add_argument('--key-file', default=None, help=f"shared fleet key (default: ${proto.KEY_ENV} or {proto.KEY_FILE})")
+    parser.add_argument('--gen-key', metavar='PATH', help="write a new random fleet key to PATH and exit")
+    args = parser.parse_args()
+
+    if args.gen_key:
+        fd = os.open(args.gen_key, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32) + '\n')
+        print(f"Fleet anahtarı yazıldı -> {args.gen_key} (ajanlara güvenli bir yoldan kopyalayın)")
+        return
+    key = proto.load_key(args.key_file)
+    if not key:
+        print(f"Uyarı: fleet anahtarı yok (${proto.KEY_ENV} veya {proto.KEY_FILE}); model dağıtılmayacak.")
+    aggregator = FleetAggregator(args.listen, args.baseline, args.model_dir, args.train_interval, args.min_new_rows, key,
+                                 args.sample_per_app)
+    if args.train_now:
+        aggregator.train()
+        return
+    try:
+        asyncio.run(aggregator.run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# fleet_protocol.py
+# Binary wire format between monitoring agents and the fleet aggregator.
+#
+# Every message is one frame:   !I payload length | !B message type | payload
+#
+#   HELLO          !B protocol version, host name (!H length + UTF-8)
+#   BATCH          app name table (!H count, each !B length + UTF-8), then
+#                  !H tick count, each tick: !d timestamp, !H row count,
+#                  rows of !H app index, !f up KB/s, !f down KB/s, !H connections  (12 bytes)
+#   ACK            !I records accepted from the last BATCH
+#   MODEL_REQUEST  !I model version the agent already has (0 = none)
+#   MODEL          !I version, 32-byte HMAC-SHA256 tag, then the joblib-serialized model
+#                  bundle (empty if up to date; the tag is then all zeros)
+#   ERROR          UTF-8 message
+#
+# The host is sent once per connection in HELLO, and app names once per batch, so a
+# (host, app, up, down, conns) record costs 12 bytes on the wire.
+#
+# Model bundles are pickles and agents run as root, so a bundle is only unpickled after
+# its tag checks out: HMAC-SHA256 over version + bundle with a key shared by the
+# aggregator and its agents (FLEET_KEY_ENV or KEY_FILE, see load_key()). Without a key
+# the aggregator serves no model and agents refuse to fetch one.
+import hashlib
+import hmac
+import os
+import struct
+
+PROTOCOL_VERSION = 2
+KEY_ENV = 'AINETMONITOR_FLEET_KEY'   # shared key (hex or plain text); overrides KEY_FILE
+KEY_FILE = 'fleet.key'
+MAX_FRAME = 64 * 1024 * 1024   # largest accepted frame (model bundles included)
+
+HELLO, BATCH, ACK, MODEL_REQUEST, MODEL, ERROR = 1, 2, 3, 4, 5, 6
+
+_HEADER = struct.Struct('!IB')
+_U8 = struct.Struct('!B')
+_U16 = struct.Struct('!H')
+_U32 = struct.Struct('!I')
+_TICK = struct.Struct('!dH')
+_ROW = struct.Struct('!HffH')
+_TAG_SIZE = hashlib.sha256().digest_size
+
+class ProtocolError(Exception):
+    pass
+
+def encode_frame(kind, payload=b''):
+    return _HEADER.pack(len(payload), kind) + payload
+
+def _check_header(header):
+    length, kind = _HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ProtocolError(f"frame too large: {length} bytes")
+    return length, kind
+
+async def read_frame_async(reader):
+    """ (type, payload) from an asyncio StreamReader; raises IncompleteReadError on EOF. """
+    length, kind = _check_header(await reader.readexactly(_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def read_frame(sock):
+    """ Blocking variant of read_frame_async for a connected socket. """
+    length, kind = _check_header(_recv_exact(sock, _HEADER.size))
+    return kind, _recv_exact(sock, length)
+
+def _pack_str(text, prefix):
+    data = text.encode('utf-8')[:255 if prefix is _U8 else 65535]
+    return prefix.pack(len(data)) + data
+
+def encode_hello(host):
+    return encode_frame(HELLO, _U8.pack(PROTOCOL_VERSION) + _pack_str(host, _U16))
+
+def decode_hello(payload):
+    version, = _U8.unpack_from(payload, 0)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    length, = _U16.unpack_from(payload, 1)
+    return payload[3:3 + length].decode('utf-8', 'replace')
+
+def encode_batch(ticks):
+    """ ticks: [(timestamp, [(app, up_kbps, down_kbps, connections), ...]), ...] (at most 65535 of each). """
+    names = {}
+    body = [_U16.pack(len(ticks))]
+    for ts, rows in ticks:
+        body.append(_TICK.pack(ts, len(rows)))
+        for app, up, down, conns in rows:
+            index = names.get(app)
+            if index is None:
+                index = names[app] = len(names)
+            body.append(_ROW.pack(index, up, down, min(int(conns), 65535)))
+    table = [_U16.pack(len(names))] + [_pack_str(name, _U8) for name in names]
+    return encode_frame(BATCH, b''.join(table + body))
+
+def decode_batch(payload):
+    """ BATCH payload -> [(timestamp, app, up_kbps, down_kbps, connections), ...]. """
+    view = memoryview(payload)
+    try:
+        count, = _U16.unpack_from(view, 0)
+        offset = 2
+        names = []
+        for _ in range(count):
+            length = view[offset]
+            names.append(bytes(view[offset + 1:offset + 1 + length]).decode('utf-8', 'replace'))
+            offset += 1 + length
+        ticks, = _U16.unpack_from(view, offset)
+        offset += 2
+        records = []
+        for _ in range(ticks):
+            ts, rows = _TICK.unpack_from(view, offset)
+            offset += _TICK.size
+            end = offset + rows * _ROW.size
+            if end > len(view):
+                raise ProtocolError("truncated batch")
+            for index, up, down, conns in _ROW.iter_unpack(view[offset:end]):
+                if index >= count:
+                    raise ProtocolError(f"app index {index} outside a table of {count} names")
+                records.append((ts, names[index], up, down, conns))
+            offset = end
+    except (struct.error, IndexError):
+        raise ProtocolError("truncated batch") from None
+    return records
+
+def encode_ack(count):
+    return encode_frame(ACK, _U32.pack(count))
+
+def decode_ack(payload):
+    return _U32.unpack(payload)[0]
+
+def encode_model_request(version=0):
+    return encode_frame(MODEL_REQUEST, _U32.pack(version))
+
+def decode_model_request(payload):
+    return _U32.unpack(payload)[0]
+
+def load_key(path=None):
+    """ Shared fleet key as bytes from KEY_ENV or the key file, or None if neither is set. """
+    text = os.environ.get(KEY_ENV)
+    if text is None:
+        try:
+            with open(path or KEY_FILE) as f:
+                text = f.read()
+        except OSError:
+            return None
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        return bytes.fromhex(text)
+    except ValueError:
+        return text.encode('utf-8')
+
+def model_tag(key, version, blob):
+    return hmac.new(key, _U32.pack(version) + blob, hashlib.sha256).digest()
+
+def encode_model(version, blob=b'', key=None):
+    if blob and not key:
+        raise ProtocolError("a fleet key is required to send a model")
+    tag = model_tag(key, version, blob) if blob else bytes(_TAG_SIZE)
+    return encode_frame(MODEL, _U32.pack(version) + tag + blob)
+
+def decode_model(payload, key):
+    """ -> (version, bundle bytes or b'' when the agent is already up to date); verifies the tag. """
+    if len(payload) < _U32.size + _TAG_SIZE:
+        raise ProtocolError("truncated model message")
+    version, = _U32.unpack_from(payload, 0)
+    tag = payload[_U32.size:_U32.size + _TAG_SIZE]
+    blob = payload[_U32.size + _TAG_SIZE:]
+    if not blob:
+        return version, b''
+    if not key:
+        raise ProtocolError("no fleet key configured, refusing to load a model")
+    if not hmac.compare_digest(tag, model_tag(key, version, blob)):
+        raise ProtocolError("model signature mismatch")
+    return version, blob
+
+def encode_error(message):
+    return encode_frame(ERROR, message.encode('utf-8'))
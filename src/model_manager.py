@@ -0,0 +1,386 @@
+# model_manager.py
+# Hot model reload and shadow (A/B) scoring, so a retrained model goes live without a restart.
+#
+# A watcher thread polls the model files' (mtime, size). A changed set is loaded once it
+# has stayed unchanged for SETTLE_TIME (train-app-model.py and fetch_model() write four
+# files one after another), on the watcher thread - unpickling a forest would stall a tick
+# - and parked. The tick loop calls poll() between ticks; that is the only place the
+# active bundle changes, so a tick never mixes one model's columns with another's
+# thresholds. A load that fails (half-written or incompatible files) keeps the running
+# model and is not retried until the files change again.
+#
+# An optional candidate directory (e.g. models/candidate/) is watched the same way. Every
+# row a tick scored - prediction-cache hits included, so the comparison covers the real
+# traffic mix and not just novel vectors - is handed to shadow() once per tick. A
+# background thread scores that batch with both models (fresh scores, so the cache's
+# quantization does not leak into the comparison) and keeps agreement (same anomaly /
+# normal decision, each model with its own thresholds), anomaly rates and per-model
+# latency on identical batches. A full queue drops the batch, so the candidate never
+# slows a tick. promote() copies the candidate files
+# over the active ones and the next poll() picks them up like any new version.
+#
+#   python src/model_manager.py models --candidate models/candidate --promote
+import argparse
+import os
+import queue
+import shutil
+import threading
+import time
+
+from self_metrics import metrics
+from app_features import FEATURE_COLUMNS, WINDOW, ALPHA
+from score_thresholds import ThresholdTable, THRESHOLDS_FILE, DEFAULT_LEVEL
+
+MODEL_FILE = 'app_anomaly_model.joblib'
+COLUMNS_FILE = 'model_columns.joblib'
+CONFIG_FILE = 'feature_config.joblib'
+MODEL_FILES = (MODEL_FILE, COLUMNS_FILE, CONFIG_FILE, THRESHOLDS_FILE)
+POLL_INTERVAL = 5    # seconds between checks of the model files
+SETTLE_TIME = 2      # files must be unchanged this long before they are loaded
+SHADOW_QUEUE = 64    # batches waiting for the candidate; beyond this they are dropped
+
+def signature(directory):
+    """ (mtime_ns, size) of each model file, or None while the model or its columns are missing. """
+    sig = []
+    for name in MODEL_FILES:
+        try:
+            st = os.stat(os.path.join(directory, name))
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig) if sig[0] and sig[1] else None
+
+def feature_frame(columns, column_index, rows):
+    """ [(app, features dict)] -> DataFrame in the model's columns (one-hot app column set). """
+    import numpy as np
+    import pandas as pd
+    values = np.zeros((len(rows), len(columns)))
+    for r, (app, features) in enumerate(rows):
+        for name, value in features.items():
+            i = column_index.get(name)
+            if i is not None:
+                values[r, i] = value
+        i = column_index.get(f"process_name_{app}")
+        if i is not None:
+            values[r, i] = 1
+    return pd.DataFrame(values, columns=columns)
+
+def timed_scores(model, frame):
+    """ model.score_samples(frame) under the model_predict timer -> (scores, seconds). """
+    start = time.perf_counter()
+    scores = model.score_samples(frame)
+    seconds = time.perf_counter() - start
+    metrics.observe('model_predict', seconds)
+    return scores, seconds
+
+class ModelBundle:
+    """ One model version: estimator, columns, feature config and thresholds, loaded together. """
+
+    def __init__(self, model, columns, feature_config=None, thresholds=None, version=0, directory='.'):
+        self.model = model
+        self.columns = list(columns)
+        self.column_index = {c: i for i, c in enumerate(self.columns)}
+        self.feature_config = feature_config or {}
+        self.thresholds = thresholds or ThresholdTable(fallback=getattr(model, 'offset_', 0.0))
+        self.version = version
+        self.directory = directory
+
+    @classmethod
+    def load(cls, directory='.', sensitivity=DEFAULT_LEVEL, app_sensitivity=None, version=0):
+        import joblib
+        model = joblib.load(os.path.join(directory, MODEL_FILE))
+        columns = joblib.load(os.path.join(directory, COLUMNS_FILE))
+        try:
+            feature_config = joblib.load(os.path.join(directory, CONFIG_FILE))
+        except Exception:
+            feature_config = {}  # older models: default window/alpha
+        thresholds = ThresholdTable.load(model, directory, sensitivity, app_sensitivity)
+        return cls(model, columns, feature_config, thresholds, version, directory)
+
+    @property
+    def feature_settings(self):
+        """ (window, alpha) the model was trained with. """
+        return self.feature_config.get('window', WINDOW), self.feature_config.get('alpha', ALPHA)
+
+    @property
+    def cache_features(self):
+        """ Feature columns a PredictionCache key needs for this model. """
+        return [c for c in FEATURE_COLUMNS if c in self.column_index]
+
+    def knows(self, app):
+        return f"process_name_{app}" in self.column_index
+
+    def frame(self, rows):
+        return feature_frame(self.columns, self.column_index, rows)
+
+    def score_rows(self, rows):
+        """ [(app, features)] -> (scores, seconds spent in score_samples). """
+        frame = self.frame(rows)
+        start = time.perf_counter()
+        scores = self.model.score_samples(frame)
+        return scores, time.perf_counter() - start
+
+class ShadowStats:
+    """ Active vs candidate on the same rows. """
+
+    def __init__(self):
+        self.rows = 0
+        self.agree = 0
+        self.active_anomalies = 0
+        self.candidate_anomalies = 0
+        self.unknown = 0          # rows whose app is not in the candidate's columns
+        self.dropped = 0          # tick batches not scored because the queue was full
+        self.batches = 0
+        self.active_seconds = 0.0
+        self.candidate_seconds = 0.0
+
+    def summary(self):
+        rows = self.rows or 1
+        batches = self.batches or 1
+        return {
+            'rows': self.rows,
+            'agreement': self.agree / rows if self.rows else None,
+            'active_anomaly_rate': self.active_anomalies / rows,
+            'candidate_anomaly_rate': self.candidate_anomalies / rows,
+            'active_ms': self.active_seconds / batches * 1000,
+            'candidate_ms': self.candidate_seconds / batches * 1000,
+            'unknown': self.unknown,
+            'dropped': self.dropped,
+        }
+
+class _Source:
+    """ Watch state of one model directory. """
+    __slots__ = ('directory', 'loaded', 'seen', 'seen_at')
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.loaded = None    # signature of the files last loaded (or failed to load)
+        self.seen = None      # changed signature waiting to settle
+        self.seen_at = 0.0
+
+class ModelManager:
+    def __init__(self, directory='.', candidate_dir=None, sensitivity=DEFAULT_LEVEL, app_sensitivity=None,
+                 poll_interval=POLL_INTERVAL, settle_time=SETTLE_TIME, shadow_queue=SHADOW_QUEUE):
+        self.sources = {'active': _Source(directory)}
+        if candidate_dir:
+            self.sources['candidate'] = _Source(candidate_dir)
+        self.sensitivity = sensitivity
+        self.app_sensitivity = app_sensitivity
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.active = None
+        self.candidate = None
+        self.stats = ShadowStats()
+        self.versions = 0
+        self.ready = {}             # slot -> loaded bundle (or None = candidate removed), applied by poll()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.queue = queue.Queue(shadow_queue)
+        self.shadow_thread = None
+
+    @property
+    def directory(self):
+        return self.sources['active'].directory
+
+    @property
+    def candidate_dir(self):
+        source = self.sources.get('candidate')
+        return source.directory if source else None
+
+    def _load(self, source):
+        bundle = ModelBundle.load(source.directory, self.sensitivity, self.app_sensitivity, self.versions + 1)
+        self.versions += 1
+        return bundle
+
+    def load(self):
+        """ Synchronous startup load; raises if the active model can't be loaded. """
+        source = self.sources['active']
+        source.loaded = signature(source.directory)
+        self.active = self._load(source)
+        metrics.set_gauge('model_version', self.active.version)
+        candidate = self.sources.get('candidate')
+        if candidate:
+            candidate.loaded = signature(candidate.directory)
+            if candidate.loaded:
+                try:
+                    self.candidate = self._load(candidate)
+                except Exception as e:
+                    print(f"Aday model yüklenemedi ({candidate.directory}): {e}")
+        return self.active
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._watch, name='model-watch', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.shadow_thread is not None:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def _watch(self):
+        while not self.stop_event.wait(self.poll_interval):
+            self.check()
+
+    def check(self, now=None):
+        """ One watcher pass: load every settled change and park it for poll(). """
+        now = time.monotonic() if now is None else now
+        for slot, source in self.sources.items():
+            sig = signature(source.directory)
+            if sig == source.loaded:
+                source.seen = None
+                continue
+            if sig != source.seen:
+                source.seen, source.seen_at = sig, now  # wait until the writer is done
+                continue
+            if now - source.seen_at < self.settle_time:
+                continue
+            source.loaded, source.seen = sig, None
+            if sig is None:
+                if slot == 'candidate':
+                    with self.lock:
+                        self.ready[slot] = None
+                continue  # a missing active model keeps the running one
+            try:
+                with metrics.timer('model_load'):
+                    bundle = self._load(source)
+            except Exception as e:
+                metrics.incr('model_load_errors')
+                print(f"Model yüklenemedi ({source.directory}), önceki model kullanılmaya devam ediyor: {e}")
+                continue
+            with self.lock:
+                self.ready[slot] = bundle
+
+    def poll(self):
+        """ Call between ticks: applies parked loads, returns the new active bundle or None. """
+        if not self.ready:
+            return None
+        with self.lock:
+            ready, self.ready = self.ready, {}
+        if 'candidate' in ready:
+            self.candidate = ready['candidate']
+            self.stats = ShadowStats()
+            if self.candidate:
+                print(f"Aday model v{self.candidate.version} gölge modda çalışıyor.")
+        bundle = ready.get('active')
+        if bundle is None:
+            return None
+        self.active = bundle
+        self.stats = ShadowStats()  # agreement is always against the model currently deciding
+        metrics.incr('model_reloads')
+        metrics.set_gauge('model_version', bundle.version)
+        return bundle
+
+    def shadow(self, rows):
+        """ Queue one tick's scored rows [(app, features dict)], cache hits included, for the candidate. """
+        if self.candidate is None or self.active is None or not rows:
+            return
+        if self.shadow_thread is None:
+            self.shadow_thread = threading.Thread(target=self._shadow_loop, name='model-shadow', daemon=True)
+            self.shadow_thread.start()
+        try:
+            self.queue.put_nowait((self.active, self.candidate, self.stats, list(rows)))
+        except queue.Full:
+            self.stats.dropped += 1
+            metrics.incr('shadow_dropped')
+
+    def _shadow_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self._shadow_score(*item)
+            except Exception as e:
+                metrics.incr('shadow_errors')
+                print("Aday model skorlanamadı:", e)
+
+    def _shadow_score(self, active, candidate, stats, rows):
+        if candidate is not self.candidate:
+            return  # replaced while queued
+        known = [row for row in rows if candidate.knows(row[0])]
+        stats.unknown += len(rows) - len(known)
+        if not known:
+            return
+        active_scores, active_seconds = active.score_rows(known)
+        candidate_scores, candidate_seconds = candidate.score_rows(known)
+        metrics.observe('shadow_predict', candidate_seconds)
+        stats.batches += 1
+        stats.active_seconds += active_seconds
+        stats.candidate_seconds += candidate_seconds
+        for (app, _), a_score, c_score in zip(known, active_scores, candidate_scores):
+            a = bool(active.thresholds.is_anomaly(app, a_score))
+            c = bool(candidate.thresholds.is_anomaly(app, c_score))
+            stats.rows += 1
+            stats.agree += a == c
+            stats.active_anomalies += a
+            stats.candidate_anomalies += c
+        metrics.set_gauge('shadow_agreement', round(stats.agree / stats.rows, 4))
+
+    def report(self):
+        """ Shadow summary (ShadowStats.summary() plus versions), or None without a candidate. """
+        if self.candidate is None:
+            return None
+        summary = self.stats.summary()
+        summary['active_version'] = self.active.version if self.active else None
+        summary['candidate_version'] = self.candidate.version
+        return summary
+
+    def describe(self):
+        """ One-line Turkish summary for logs and the dashboard. """
+        r = self.report()
+        if r is None:
+            return ""
+        if not r['rows']:
+            return f"aday v{r['candidate_version']}: henüz karşılaştırma yok"
+        return (f"aday v{r['candidate_version']}: {r['rows']} satır, uyum %{r['agreement'] * 100:.1f}, "
+                f"anomali %{r['active_anomaly_rate'] * 100:.1f} → %{r['candidate_anomaly_rate'] * 100:.1f}, "
+                f"{r['active_ms']:.2f} → {r['candidate_ms']:.2f} ms/tick")
+
+    def promote(self):
+        """ Copy the candidate over the active model; the watcher loads it on its next pass. """
+        if not self.candidate_dir:
+            raise ValueError("no candidate directory")
+        promote_files(self.candidate_dir, self.directory)
+        self.candidate = None
+        with self.lock:
+            self.ready.pop('candidate', None)
+
+def promote_files(source, target):
+    """ Replace target's model files with source's, one os.replace() per file. """
+    if signature(source) is None:
+        raise FileNotFoundError(f"no model in {source}")
+    os.makedirs(target, exist_ok=True)
+    for name in MODEL_FILES:
+        src = os.path.join(source, name)
+        dst = os.path.join(target, name)
+        if not os.path.exists(src):
+            if os.path.exists(dst):
+                os.remove(dst)  # e.g. stale thresholds of the previous model
+            continue
+        shutil.copyfile(src, dst + '.tmp')
+        os.replace(dst + '.tmp', dst)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or promote a candidate model")
+    parser.add_argument('directory', nargs='?', default='.', help="active model directory")
+    parser.add_argument('--candidate', help="candidate model directory")
+    parser.add_argument('--promote', action='store_true', help="copy the candidate over the active model")
+    args = parser.parse_args()
+
+    manager = ModelManager(args.directory, args.candidate)
+    active = manager.load()
+    print(f"Aktif model: {args.directory} ({len(active.columns)} sütun)")
+    if manager.candidate:
+        print(f"Aday model: {args.candidate} ({len(manager.candidate.columns)} sütun)")
+    if args.promote:
+        manager.promote()
+        print("Aday model aktif dizine kopyalandı; çalışan izleyiciler bir sonraki kontrolde yükleyecek.")
+
+if __name__ == "__main__":
+    main()
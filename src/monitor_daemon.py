@@ -0,0 +1,466 @@
+# monitor_daemon.py
+# Headless monitoring daemon built on asyncio.
+# Tek bir yakalama (capture) birden fazla ön yüz tarafından paylaşılır: dashboard, CLI vb.
+# istemciler yerel bir Unix soketine bağlanıp her tick'i JSON satırı olarak alır.
+#
+#   sudo python src/monitor_daemon.py                     # daemon
+#   python src/monitor_daemon.py --client                 # CLI istemcisi
+#   python src/monitor_daemon.py --persist baseline.csv   # tick'leri CSV'ye de yaz
+import argparse
+import asyncio
+import csv
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from collections import defaultdict
+
+import psutil
+
+from self_metrics import metrics
+from tick_scheduler import TickScheduler
+from packet_sampling import variance_term
+from multi_capture import MultiCapture
+from app_features import FeatureEngine
+from prediction_cache import PredictionCache
+from model_manager import ModelManager, feature_frame, timed_scores, POLL_INTERVAL
+from unit_attribution import UnitResolver, aggregate
+
+TIME_WINDOW = 2
+MAX_TIME_WINDOW = 8
+MAP_REFRESH = 2
+PERSIST_INTERVAL = 30
+BPF_FILTER = "ip or ip6"
+PERSIST_COLUMNS = ['process_name', 'upload_kbps', 'download_kbps', 'connections']  # data-collector.py's raw schema
+CLIENT_QUEUE_SIZE = 16   # ticks buffered per client; slow clients lose the oldest ticks
+DEFAULT_ADDRESS = "/tmp/ainetmonitor.sock" if hasattr(socket, 'AF_UNIX') else "127.0.0.1:47800"
+
+def parse_address(address):
+    """ '/path/to.sock' -> ('unix', path); 'host:port' -> ('tcp', (host, port)). """
+    if os.sep not in address and ':' in address:
+        host, port = address.rsplit(':', 1)
+        return 'tcp', (host, int(port))
+    return 'unix', address
+
+def build_conn_map():
+    """ Connection 5-tuples (both directions) -> pid, plus connection count per pid. """
+    new_map = {}
+    conn_counts = defaultdict(int)
+    for c in psutil.net_connections(kind='inet'):
+        try:
+            if c.laddr and c.raddr and c.pid and c.status == 'ESTABLISHED':
+                l_ip, l_port = c.laddr
+                r_ip, r_port = c.raddr
+                proto = 6 if c.type == socket.SOCK_STREAM else 17
+                new_map[(l_ip, int(l_port), r_ip, int(r_port), proto)] = c.pid
+                new_map[(r_ip, int(r_port), l_ip, int(l_port), proto)] = c.pid
+                conn_counts[c.pid] += 1
+        except Exception:
+            continue
+    return new_map, dict(conn_counts)
+
+def get_proc_name(pid):
+    try:
+        return psutil.Process(pid).name()
+    except Exception:
+        return "?"
+
+class ModelScorer:
+    """ Batched IsolationForest scoring: one predict() call per tick for all known apps. """
+
+    def __init__(self, model_dir='.', candidate_dir=None, poll_interval=POLL_INTERVAL):
+        self.model = None
+        self.model_columns = None
+        self.seen_unknown = set()
+        self.feature_engine = FeatureEngine()
+        self.cache = PredictionCache()
+        self.manager = ModelManager(model_dir, candidate_dir, poll_interval=poll_interval or 0)
+        try:
+            self.apply(self.manager.load())
+            print("Model yüklendi.")
+        except Exception as e:
+            print("Model yüklenemedi, skorlama kapalı:", e)
+        if poll_interval:
+            self.manager.start()  # new versions (or a first model) are picked up without a restart
+
+    def apply(self, bundle):
+        self.model = bundle.model
+        self.model_columns = bundle.columns
+        self.column_index = bundle.column_index
+        self.thresholds = bundle.thresholds
+        if bundle.feature_settings != (self.feature_engine.window, self.feature_engine.alpha):
+            self.feature_engine = FeatureEngine(*bundle.feature_settings)
+        self.cache.invalidate(bundle.cache_features)
+
+    def score(self, apps):
+        """ Fill in apps[i]['status'] (runs in an executor thread). """
+        bundle = self.manager.poll()  # between ticks: a reloaded model applies to the whole batch
+        if bundle:
+            self.apply(bundle)
+            print(f"Yeni model sürümü devreye alındı (v{bundle.version}).")
+        for app in apps:
+            app['features'] = self.feature_engine.update(app['name'], app['up_kbps'], app['down_kbps'], app['connections'])
+        if self.model is None:
+            for app in apps:
+                app['status'] = 'unscored'
+            return apps
+        known = []
+        for app in apps:
+            if f"process_name_{app['name']}" not in self.column_index:
+                first = app['name'] not in self.seen_unknown
+                self.seen_unknown.add(app['name'])
+                app['status'] = 'unknown_first' if first else 'unknown'
+                continue
+            app['cache_key'] = self.cache.key(app['name'], app['features'])
+            score = self.cache.get(app['cache_key'])
+            if score is None:
+                known.append(app)
+            else:
+                app['score'] = score
+        if known:
+            frame = feature_frame(self.model_columns, self.column_index, [(app['name'], app['features']) for app in known])
+            scores, _ = timed_scores(self.model, frame)
+            for app, score in zip(known, scores):
+                self.cache.put(app['cache_key'], score)
+                app['score'] = score
+        # Every scored row of the tick, cached or not, as one batch for the candidate model
+        self.manager.shadow([(app['name'], app['features']) for app in apps if 'score' in app])
+        for app in apps:
+            app.pop('cache_key', None)
+            if 'score' in app:
+                app['score'] = float(app['score'])
+                app['status'] = 'anomaly' if self.thresholds.is_anomaly(app['name'], app['score']) else 'ok'
+        return apps
+
+class MonitorDaemon:
+    def __init__(self, address=DEFAULT_ADDRESS, model_dir='.', persist_path=None, sample_rate=1, interfaces=None,
+                 attribution='process', candidate_dir=None):
+        self.address = address
+        self.interfaces = interfaces  # None = scapy's default, 'all' or a list (see multi_capture)
+        self.capture = None
+        self.persist_path = persist_path
+        self.scorer = ModelScorer(model_dir, candidate_dir)
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+        self.pid_bytes = defaultdict(lambda: {'up': 0, 'down': 0, 'up_var': 0, 'down_var': 0})
+        self.conn_map = {}       # replaced as a whole, never mutated in place
+        self.conn_counts = {}
+        self.resolver = UnitResolver(get_proc_name, attribution)  # pid -> process name or unit label
+        self.clients = set()
+        self.pending_rows = []
+        self.stopping = None  # asyncio.Event, created inside the running loop
+
+    # --- collection (one scapy sniffer thread per interface) ---
+    def match_packet_to_pid(self, pkt):
+        from scapy.all import IP, IPv6, TCP, UDP
+        if pkt.haslayer(IP):
+            ip = pkt[IP]
+        elif pkt.haslayer(IPv6):
+            ip = pkt[IPv6]
+        else:
+            return None, None
+        if pkt.haslayer(TCP):
+            l4, proto = pkt[TCP], 6
+        elif pkt.haslayer(UDP):
+            l4, proto = pkt[UDP], 17
+        else:
+            return None, None
+        conn_map = self.conn_map
+        key = (ip.src, int(l4.sport), ip.dst, int(l4.dport), proto)
+        pid = conn_map.get(key)
+        if pid is not None:
+            metrics.incr('match_hit')
+            return pid, 'out'
+        pid = conn_map.get((ip.dst, int(l4.dport), ip.src, int(l4.sport), proto))
+        metrics.incr('match_hit' if pid is not None else 'match_miss')
+        return (pid, 'in') if pid is not None else (None, None)
+
+    def packet_handler(self, pkt, weight=1):
+        metrics.incr('packets_seen')  # sampled packets (skipped ones are counted per interface)
+        pid, direction = self.match_packet_to_pid(pkt)
+        if pid is None:
+            metrics.incr('packets_dropped')
+            return
+        pkt_len = len(pkt)
+        var = variance_term(pkt_len, weight)
+        with self.lock:
+            entry = self.pid_bytes[pid]
+            if direction == 'out':
+                entry['up'] += pkt_len * weight
+                entry['up_var'] += var
+            else:
+                entry['down'] += pkt_len * weight
+                entry['down_var'] += var
+        metrics.incr('packets_attributed')
+
+    # --- cooperative tasks ---
+    async def refresh_conn_map(self):
+        loop = asyncio.get_running_loop()
+        while not self.stopping.is_set():
+            with metrics.timer('build_conn_map'):
+                new_map, counts = await loop.run_in_executor(None, build_conn_map)
+            self.conn_map, self.conn_counts = new_map, counts
+            # Forget labels of PIDs without connections so a reused PID is looked up again
+            self.resolver.retain(counts)
+            metrics.set_gauge('conn_map_size', len(new_map))
+            await self._sleep(MAP_REFRESH)
+
+    async def score_ticks(self):
+        loop = asyncio.get_running_loop()
+        scheduler = TickScheduler(TIME_WINDOW, MAX_TIME_WINDOW)
+        while not self.stopping.is_set():
+            elapsed = await scheduler.wait_async()
+            with self.lock:
+                snapshot = dict(self.pid_bytes)
+                self.pid_bytes.clear()
+            missing = [pid for pid in snapshot if pid not in self.resolver.cache]
+            if missing:
+                await loop.run_in_executor(None, self.resolver.labels, missing)
+            apps = []
+            # Per-PID counters folded into one row per label (per unit in 'unit' mode)
+            for name, vals in aggregate(snapshot, self.resolver, self.conn_counts):
+                apps.append({
+                    'pid': vals['pids'][0],
+                    'pids': vals['pids'],
+                    'name': name,
+                    'up_bytes': vals['up'],
+                    'down_bytes': vals['down'],
+                    'up_kbps': vals['up'] / 1024.0 / elapsed,
+                    'down_kbps': vals['down'] / 1024.0 / elapsed,
+                    'connections': vals['connections'],
+                })
+            with metrics.timer('score_tick'):
+                apps = await loop.run_in_executor(None, self.scorer.score, apps)
+            self.pending_rows.extend(
+                (a['name'], a['up_kbps'], a['down_kbps'], a['connections'])
+                for a in apps if a['up_kbps'] > 0 or a['down_kbps'] > 0)
+            self.capture.publish_metrics()
+            self.broadcast({'type': 'tick', 'ts': time.time(), 'elapsed': elapsed, 'apps': apps,
+                            'interfaces': self.capture.stats()})
+            metrics.set_gauge('clients', len(self.clients))
+            scheduler.done()
+
+    async def persist(self):
+        """ Append scored rows to the baseline CSV (same schema as data-collector.py). """
+        loop = asyncio.get_running_loop()
+        while not self.stopping.is_set():
+            await self._sleep(PERSIST_INTERVAL)
+            await self.flush_rows(loop)
+
+    async def flush_rows(self, loop):
+        rows, self.pending_rows = self.pending_rows, []
+        if rows and self.persist_path:
+            await loop.run_in_executor(None, self._append_csv, rows)
+
+    def _append_csv(self, rows):
+        new_file = not os.path.exists(self.persist_path)
+        if not new_file:
+            self._upgrade_csv()
+        with open(self.persist_path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(PERSIST_COLUMNS)
+            writer.writerows(rows)
+
+    def _upgrade_csv(self):
+        """ Files written before the connections column: rewrite once with connections = 0. """
+        with open(self.persist_path, newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None or header == PERSIST_COLUMNS:
+                return
+            rows = [dict(zip(header, row)) for row in reader]
+        tmp = self.persist_path + '.tmp'
+        with open(tmp, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(PERSIST_COLUMNS)
+            writer.writerows([row.get(c) or 0 for c in PERSIST_COLUMNS] for row in rows)
+        os.replace(tmp, self.persist_path)
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    # --- subscribers ---
+    def broadcast(self, message):
+        self._push((json.dumps(message) + "\n").encode())
+
+    def _push(self, line):
+        for queue in list(self.clients):
+            if queue.full():
+                queue.get_nowait()  # drop the oldest tick rather than stall the daemon
+                metrics.incr('client_ticks_dropped')
+            queue.put_nowait(line)
+
+    async def handle_client(self, reader, writer):
+        queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.clients.add(queue)
+        try:
+            hello = {'type': 'hello', 'interval': TIME_WINDOW, 'pid': os.getpid()}
+            writer.write((json.dumps(hello) + "\n").encode())
+            while True:
+                line = await queue.get()
+                if line is None:  # daemon shutting down
+                    break
+                writer.write(line)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(queue)
+            writer.close()
+
+    async def start_server(self):
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)
+            return await asyncio.start_unix_server(self.handle_client, path=target)
+        return await asyncio.start_server(self.handle_client, *target)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.stopping.set)
+            loop.add_signal_handler(signal.SIGTERM, self.stopping.set)
+        except (NotImplementedError, AttributeError):
+            pass  # Windows: Ctrl+C arrives as KeyboardInterrupt instead
+
+        server = await self.start_server()
+        self.capture = MultiCapture(self.packet_handler, self.interfaces, BPF_FILTER,
+                                    sample_rate=self.sample_rate).start()
+        print(f"Daemon çalışıyor: {self.address} (Ctrl+C ile durdurun)")
+        print("Yakalanan arayüzler:", ", ".join(i or "varsayılan" for i in self.capture.interfaces))
+
+        tasks = [asyncio.create_task(coro) for coro in
+                 (self.refresh_conn_map(), self.score_ticks(), self.persist())]
+        await self.stopping.wait()
+
+        print("\nDaemon durduruluyor...")
+        await loop.run_in_executor(None, self.capture.stop)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._push(None)
+        server.close()
+        await server.wait_closed()
+        await self.flush_rows(loop)
+        self.scorer.manager.stop()
+        if self.scorer.manager.candidate:
+            print("Gölge model:", self.scorer.manager.describe())
+        kind, target = parse_address(self.address)
+        if kind == 'unix' and os.path.exists(target):
+            os.unlink(target)
+
+class DaemonSubscriber:
+    """
+    Blocking subscriber for front-ends (runs in a background thread).
+    io_stats() returns cumulative counters in the dashboard's get_network_io_stats()
+    format, so the dashboard can use the daemon as its source. Totals are kept per
+    label: in 'unit' mode a row's PIDs change from tick to tick, so each label gets a
+    stable key of its own and 'pid' only names one of its current PIDs for display.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, on_tick=None):
+        self.address = address
+        self.on_tick = on_tick
+        self.lock = threading.Lock()
+        self.totals = {}  # label -> {'key', 'pid', 'name', 'bytes_sent', 'bytes_recv', 'connections'}
+        self.connected = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        kind, target = parse_address(self.address)
+        sock = socket.socket(socket.AF_UNIX if kind == 'unix' else socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect(target)
+        return sock
+
+    def _run(self):
+        while True:
+            try:
+                with self._connect() as sock, sock.makefile('r', encoding='utf-8') as stream:
+                    self.connected = True
+                    for line in stream:
+                        message = json.loads(line)
+                        if message.get('type') == 'tick':
+                            self._apply(message)
+            except OSError:
+                pass
+            self.connected = False
+            time.sleep(2)  # daemon not up yet / restarted: retry
+
+    def _apply(self, message):
+        with self.lock:
+            for total in self.totals.values():
+                total['connections'] = 0
+            for app in message['apps']:
+                total = self.totals.get(app['name'])
+                if total is None:
+                    total = self.totals[app['name']] = {'key': len(self.totals) + 1, 'name': app['name'],
+                                                        'bytes_sent': 0, 'bytes_recv': 0, 'connections': 0}
+                total['pid'] = app['pid']
+                total['bytes_sent'] += app['up_bytes']
+                total['bytes_recv'] += app['down_bytes']
+                total['connections'] += app['connections']  # same-named processes share a label
+        if self.on_tick:
+            self.on_tick(message)
+
+    def io_stats(self):
+        with self.lock:
+            return {total['key']: dict(total) for total in self.totals.values()}
+
+def run_client(address):
+    """ Minimal CLI front-end: print every tick pushed by the daemon. """
+    kind, target = parse_address(address)
+    sock = socket.socket(socket.AF_UNIX if kind == 'unix' else socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.connect(target)
+    except OSError as e:
+        print(f"Daemon'a bağlanılamadı ({address}): {e}")
+        return
+    labels = {'ok': 'OK', 'anomaly': '🚨 Anomali', 'unknown': '⚪️ Bilinmeyen',
+              'unknown_first': '🚨 Bilinmeyen (ilk)', 'unscored': '-'}
+    try:
+        with sock, sock.makefile('r', encoding='utf-8') as stream:
+            for line in stream:
+                message = json.loads(line)
+                if message.get('type') != 'tick':
+                    continue
+                print(f"--- {time.strftime('%H:%M:%S', time.localtime(message['ts']))} ({message['elapsed']:.1f}s) ---")
+                for app in sorted(message['apps'], key=lambda a: a['up_kbps'] + a['down_kbps'], reverse=True):
+                    print(f"{labels.get(app['status'], app['status']):20} {app['name']:30} "
+                          f"↑{app['up_kbps']:8.2f} KB/s ↓{app['down_kbps']:8.2f} KB/s")
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless network monitor daemon")
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="Unix socket path or host:port")
+    parser.add_argument('--client', action='store_true', help="connect to a running daemon and print ticks")
+    parser.add_argument('--model-dir', default='.', help="directory with app_anomaly_model.joblib")
+    parser.add_argument('--candidate-dir', default=None, help="candidate model scored in shadow mode (agreement in the stats log)")
+    parser.add_argument('--persist', default=None, help="append scored rows to this CSV")
+    parser.add_argument('--sample-rate', type=int, default=1, help="1-in-N packet sampling")
+    parser.add_argument('--iface', default=None, help="interfaces to capture: 'all' or e.g. 'eth0,tun0' (default: scapy's default)")
+    parser.add_argument('--attribution', choices=('process', 'unit'), default='process',
+                        help="label traffic by process name or by container / systemd unit")
+    args = parser.parse_args()
+
+    if args.client:
+        run_client(args.address)
+        return
+    daemon = MonitorDaemon(args.address, args.model_dir, args.persist, args.sample_rate, args.iface, args.attribution,
+                           args.candidate_dir)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
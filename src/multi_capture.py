@@ -0,0 +1,222 @@
+# multi_capture.py
+# Packet capture on several interfaces at once.
+# Every interface gets its own worker (an AsyncSniffer plus a supervisor thread that
+# restarts it if the interface disappears, e.g. a VPN tunnel going down). All workers
+# feed the same packet handler, so PID accounting stays a single merged view, while
+# packets/bytes/duplicates are also counted per interface. Each worker also has its own
+# PacketSampler: the skip counter and the CPU-budget measurement (thread CPU time) stay
+# on one thread, and a CPU budget is split evenly between the workers.
+#
+# Double counting is avoided in two steps:
+#   1. topology: an interface whose bridge/bond master is also captured is dropped
+#      (Linux sysfs), since the master already sees its traffic;
+#   2. runtime: when several interfaces remain, a packet whose fingerprint was seen
+#      on another interface within DEDUP_WINDOW seconds is ignored.
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from self_metrics import metrics
+from packet_sampling import PacketSampler
+
+DEDUP_WINDOW = 0.05   # seconds a fingerprint is remembered
+RETRY_DELAY = 5       # seconds before restarting a failed interface worker
+SYSFS_NET = '/sys/class/net'
+
+def list_interfaces(include_loopback=False):
+    """ Names of interfaces that are up. """
+    import psutil
+    names = []
+    for name, stats in psutil.net_if_stats().items():
+        if not stats.isup:
+            continue
+        flags = getattr(stats, 'flags', '')
+        loopback = 'loopback' in flags.split(',') if flags else name in ('lo', 'lo0') or name.startswith('Loopback')
+        if loopback and not include_loopback:
+            continue
+        names.append(name)
+    return sorted(names)
+
+def interface_master(name, sysfs=SYSFS_NET):
+    """ Bridge or bond this interface is enslaved to (Linux only), else None. """
+    link = os.path.join(sysfs, name, 'master')
+    if os.path.islink(link):
+        return os.path.basename(os.path.realpath(link))
+    return None
+
+def resolve_interfaces(spec, sysfs=SYSFS_NET):
+    """
+    spec: None (scapy's default interface), 'all', a comma separated string or a list of names.
+    Returns (interfaces to capture, {dropped interface: master that covers it}).
+    """
+    if spec is None:
+        return [None], {}
+    if spec == 'all':
+        names = list_interfaces()
+    elif isinstance(spec, str):
+        names = [n.strip() for n in spec.split(',') if n.strip()]
+    else:
+        names = list(spec)
+
+    selected = set(names)
+    covered = {}
+    for name in names:
+        master = interface_master(name, sysfs)
+        seen = set()
+        while master and master not in seen:
+            if master in selected:
+                covered[name] = master
+                break
+            seen.add(master)
+            master = interface_master(master, sysfs)
+    return [n for n in names if n not in covered], covered
+
+def packet_fingerprint(pkt):
+    """ Link-layer independent identity of an IP packet (same on a bridge and its member port). """
+    from scapy.all import IP, IPv6
+    if pkt.haslayer(IP):
+        ip = pkt[IP]
+        return (4, ip.src, ip.dst, ip.id, ip.len, ip.proto, ip.chksum)
+    if pkt.haslayer(IPv6):
+        ip = pkt[IPv6]
+        l4 = ip.payload
+        return (6, ip.src, ip.dst, ip.plen, ip.nh, getattr(l4, 'sport', None), getattr(l4, 'dport', None),
+                getattr(l4, 'seq', None), getattr(l4, 'ack', None), getattr(l4, 'chksum', None))
+    return None
+
+class DuplicateFilter:
+    """ Remembers fingerprints for `window` seconds; seen() is True for a repeat from another interface. """
+
+    def __init__(self, window=DEDUP_WINDOW):
+        self.window = window
+        self.recent = OrderedDict()  # fingerprint -> (expiry, interface), in arrival order
+        self.lock = threading.Lock()
+
+    def seen(self, fingerprint, iface, now=None):
+        if fingerprint is None:
+            return False
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            while self.recent:
+                oldest = next(iter(self.recent.values()))
+                if oldest[0] > now:
+                    break
+                self.recent.popitem(last=False)
+            previous = self.recent.get(fingerprint)
+            if previous is not None and previous[1] != iface:
+                return True
+            self.recent[fingerprint] = (now + self.window, iface)
+            self.recent.move_to_end(fingerprint)
+            return False
+
+class InterfaceWorker:
+    """ One supervised AsyncSniffer on one interface. """
+
+    def __init__(self, iface, bpf_filter, on_packet, stopping, sampler=None):
+        self.iface = iface
+        self.sampler = sampler or PacketSampler()  # used only from this worker's sniffer thread
+        self.bpf_filter = bpf_filter
+        self.on_packet = on_packet
+        self.stopping = stopping
+        self.sniffer = None
+        self.packets = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_error = None
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"capture-{iface or 'default'}")
+
+    def _run(self):
+        from scapy.all import AsyncSniffer
+        while not self.stopping.is_set():
+            self.sniffer = AsyncSniffer(iface=self.iface, filter=self.bpf_filter,
+                                        prn=lambda pkt: self.on_packet(self, pkt), store=False)
+            self.sniffer.start()
+            if self.stopping.is_set():  # stop() raced with the (re)start
+                self.stop()
+            self.sniffer.join()
+            error = getattr(self.sniffer, 'exception', None)
+            if self.stopping.is_set():
+                break
+            self.errors += 1
+            self.last_error = str(error) if error else "capture ended"
+            print(f"Yakalama hatası ({self.iface or 'varsayılan'}): {self.last_error} - {RETRY_DELAY} sn sonra tekrar denenecek")
+            self.stopping.wait(RETRY_DELAY)
+
+    def stop(self):
+        sniffer = self.sniffer
+        if sniffer is not None and getattr(sniffer, 'running', False):
+            try:
+                sniffer.stop(join=False)
+            except Exception:
+                pass
+
+class MultiCapture:
+    def __init__(self, handler, interfaces=None, bpf_filter=None, dedup_window=DEDUP_WINDOW,
+                 sample_rate=1, sample_mode='random', cpu_budget=None):
+        """
+        handler(pkt, weight) gets every sampled packet with its PacketSampler weight;
+        interfaces as in resolve_interfaces(); cpu_budget is for the whole capture.
+        """
+        self.handler = handler
+        self.bpf_filter = bpf_filter
+        self.stopping = threading.Event()
+        names, self.covered = resolve_interfaces(interfaces)
+        budget = cpu_budget / len(names) if cpu_budget and names else None
+        self.workers = [InterfaceWorker(name, bpf_filter, self._on_packet, self.stopping,
+                                        PacketSampler(sample_rate, sample_mode, budget))
+                        for name in names]
+        # Duplicates are only possible when more than one interface is captured
+        self.dedup = DuplicateFilter(dedup_window) if len(self.workers) > 1 and dedup_window else None
+
+    @property
+    def interfaces(self):
+        return [w.iface for w in self.workers]
+
+    @property
+    def sample_rate(self):
+        """ Highest current 1-in-N rate among the workers. """
+        return max((w.sampler.rate for w in self.workers), default=1)
+
+    def start(self):
+        for name, master in self.covered.items():
+            print(f"{name} atlandı: {master} üzerinden zaten yakalanıyor")
+        for worker in self.workers:
+            worker.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self.stopping.set()
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.thread.join(timeout)
+
+    def _on_packet(self, worker, pkt):
+        worker.packets += 1
+        worker.bytes += len(pkt)
+        if self.dedup is not None and self.dedup.seen(packet_fingerprint(pkt), worker.iface):
+            worker.duplicates += 1
+            return
+        weight = worker.sampler.sample()
+        if not weight:
+            worker.skipped += 1
+            metrics.incr('packets_skipped')
+            return
+        self.handler(pkt, weight)
+
+    def stats(self):
+        """ Per-interface counters: {iface: {'packets', 'bytes', 'duplicates', 'skipped', 'errors', 'sample_rate'}}. """
+        return {w.iface or 'default': {'packets': w.packets, 'bytes': w.bytes, 'duplicates': w.duplicates,
+                                       'skipped': w.skipped, 'errors': w.errors, 'sample_rate': w.sampler.rate}
+                for w in self.workers}
+
+    def publish_metrics(self):
+        """ Copy the per-interface counters into self-metrics gauges (iface_<name>_<counter>). """
+        for iface, counters in self.stats().items():
+            label = re.sub(r'\W', '_', iface)
+            for name, value in counters.items():
+                metrics.set_gauge(f'iface_{label}_{name}', value)
@@ -0,0 +1,197 @@
+# notifications.py
+# Anomaly notifications off the monitoring path.
+# notify() only enqueues (never blocks, never raises); a background worker collects
+# events for a short coalescing window, applies a per-app token bucket, and hands one
+# notification (or one digest for a burst) to every configured sink. Events held back
+# by the rate limit are counted and reported in the next notification, not dropped
+# silently; a window whose events were all held back still sends a short digest of the
+# suppressed counts, so a muted app is never muted without anyone being told.
+import json
+import queue
+import threading
+import time
+import urllib.request
+
+from self_metrics import metrics
+
+COALESCE_WINDOW = 5.0   # seconds to wait for more events before sending
+APP_RATE = 1 / 60.0     # per-app tokens per second (one notification a minute on average)
+APP_BURST = 2           # per-app burst allowance
+MAX_PENDING = 1000      # queued events before notify() starts dropping
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, now=None):
+        """ Consume one token if available. """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+# --- Sinks: send(title, message, events) may block; it runs on the worker thread ---
+
+class DesktopSink:
+    """ plyer desktop/toast notification. """
+    name = 'desktop'
+
+    def __init__(self, app_name="Network Monitor", timeout=5):
+        from plyer import notification  # ImportError -> caller decides whether to skip the sink
+        self.notification = notification
+        self.app_name = app_name
+        self.timeout = timeout
+
+    def send(self, title, message, events):
+        self.notification.notify(title=title, message=message, app_name=self.app_name, timeout=self.timeout)
+
+class LogFileSink:
+    """ One JSON line per notification. """
+    name = 'logfile'
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, title, message, events):
+        record = {'ts': time.time(), 'title': title, 'message': message, 'events': events}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+class WebhookSink:
+    """ POSTs the notification as JSON (e.g. to a local relay). """
+    name = 'webhook'
+
+    def __init__(self, url, timeout=3):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title, message, events):
+        body = json.dumps({'title': title, 'message': message, 'events': events}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+class NotificationDispatcher:
+    def __init__(self, sinks, coalesce_window=COALESCE_WINDOW, app_rate=APP_RATE,
+                 app_burst=APP_BURST, max_pending=MAX_PENDING, title="🚨 Network Anomaly Detected!"):
+        self.sinks = list(sinks)
+        self.coalesce_window = coalesce_window
+        self.app_rate = app_rate
+        self.app_burst = app_burst
+        self.title = title
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.buckets = {}      # app -> TokenBucket
+        self.suppressed = {}   # app -> events held back since the last notification
+        self.sent = 0
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """ Flush what is queued and stop the worker. """
+        if self.thread is not None:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass  # worker is daemonic; pending events are lost at exit
+            self.thread.join(timeout)
+            self.thread = None
+
+    def notify(self, app, message, **details):
+        """ Queue an anomaly for notification; O(1) and safe to call from the monitoring loop. """
+        event = {'ts': time.time(), 'app': app, 'message': message}
+        event.update(details)
+        try:
+            self.queue.put_nowait(event)
+            metrics.incr('notify_queued')
+        except queue.Full:
+            metrics.incr('notify_dropped')
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            batch = [event]
+            deadline = time.monotonic() + self.coalesce_window
+            stopping = False
+            while not stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                else:
+                    batch.append(event)
+            self._dispatch(batch)
+            if stopping:
+                return
+
+    def _admit(self, batch):
+        """ Per-app rate limit; returns the events allowed through. """
+        now = time.monotonic()
+        allowed = []
+        for event in batch:
+            bucket = self.buckets.get(event['app'])
+            if bucket is None:
+                bucket = self.buckets[event['app']] = TokenBucket(self.app_rate, self.app_burst, now)
+            if bucket.take(now):
+                allowed.append(event)
+            else:
+                self.suppressed[event['app']] = self.suppressed.get(event['app'], 0) + 1
+                metrics.incr('notify_suppressed')
+        return allowed
+
+    def _dispatch(self, batch):
+        allowed = self._admit(batch)
+        if not allowed and not self.suppressed:
+            return
+        if allowed:
+            title, message = self.format(allowed)
+            if self.suppressed:
+                held = sum(self.suppressed.values())
+                message += f" (+{held} suppressed from {len(self.suppressed)} apps)"
+        else:
+            # Everything in this window was rate-limited: report the counts instead of staying silent
+            title, message = self.title, self.format_suppressed(self.suppressed)
+        self.suppressed = {}
+        for sink in self.sinks:
+            try:
+                with metrics.timer(f'notify_sink_{sink.name}'):
+                    sink.send(title, message, allowed)
+            except Exception as e:
+                metrics.incr('notify_sink_errors')
+                print(f"Notification error ({sink.name}): {e}")
+        self.sent += 1
+        metrics.incr('notify_sent')
+
+    def format_suppressed(self, suppressed):
+        """ Digest of rate-limited events: {app: count} -> message. """
+        top = ", ".join(f"{app} ({count})" for app, count in sorted(suppressed.items(), key=lambda item: -item[1])[:3])
+        return f"{sum(suppressed.values())} anomalies suppressed by the rate limit from {len(suppressed)} apps: {top}"
+
+    def format(self, events):
+        """ Single event -> its own message; a burst -> one digest. """
+        if len(events) == 1:
+            return self.title, f"{events[0]['app']} - {events[0]['message']}"
+        apps = {}
+        for event in events:
+            apps[event['app']] = apps.get(event['app'], 0) + 1
+        top = ", ".join(app for app, _ in sorted(apps.items(), key=lambda item: -item[1])[:3])
+        return self.title, f"{len(events)} anomalies from {len(apps)} apps: {top}"
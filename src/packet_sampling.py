@@ -0,0 +1,100 @@
+# packet_sampling.py
+# 1-in-N packet sampling for the sniffers, with unbiased (Horvitz-Thompson) byte
+# estimates, 95% confidence intervals and an adaptive rate that keeps the
+# sniffer thread under a CPU budget.
+import math
+import random
+import time
+
+Z_95 = 1.96
+CHECK_EVERY = 64   # packets between clock reads when a CPU budget is set
+
+class PacketSampler:
+    """
+    mode='count'  -> deterministic, every Nth packet
+    mode='random' -> sFlow-style: random skip in [1, 2N-1] between samples (mean N)
+
+    sample() returns the weight of the packet (N at the time it was taken) or 0 if
+    it was skipped. Summing len(pkt) * weight gives the byte estimate; summing
+    len(pkt)**2 * weight * (weight - 1) gives its variance estimate.
+
+    A sampler belongs to one capture thread (multi_capture gives every interface
+    worker its own): the skip counter is not locked, and the CPU budget is measured
+    with time.thread_time() of the thread calling sample().
+    """
+
+    def __init__(self, rate=1, mode='random', cpu_budget=None, max_rate=4096,
+                 adjust_every=1.0, seed=None):
+        self.rate = max(1, int(rate))
+        self.mode = mode
+        self.cpu_budget = cpu_budget  # fraction of one core for the calling capture thread, e.g. 0.25
+        self.max_rate = max_rate
+        self.adjust_every = adjust_every
+        self._rng = random.Random(seed)
+        self._skip = self._next_skip()
+        self._last_adjust = None
+        self._last_cpu = None
+        self._until_check = 0
+
+    def _next_skip(self):
+        if self.rate <= 1:
+            return 1
+        if self.mode == 'count':
+            return self.rate
+        return self._rng.randint(1, 2 * self.rate - 1)
+
+    def sample(self):
+        """ Call once per captured packet (from the sniffer thread). """
+        if self.cpu_budget:
+            self._maybe_adjust()
+        if self.rate <= 1:
+            return 1
+        self._skip -= 1
+        if self._skip > 0:
+            return 0
+        self._skip = self._next_skip()
+        return self.rate
+
+    def _maybe_adjust(self):
+        """
+        Re-tune the rate from the calling thread's CPU time, at most once per adjust_every.
+        Runs per packet, so it only reads the wall clock every CHECK_EVERY packets and the
+        thread's CPU clock only when an adjustment is due.
+        """
+        self._until_check -= 1
+        if self._until_check > 0:
+            return
+        self._until_check = CHECK_EVERY
+        now = time.monotonic()
+        if self._last_adjust is None:
+            self._last_adjust, self._last_cpu = now, time.thread_time()
+            return
+        wall = now - self._last_adjust
+        if wall < self.adjust_every:
+            return
+        cpu = time.thread_time()
+        load = (cpu - self._last_cpu) / wall
+        self._last_adjust, self._last_cpu = now, cpu
+        if load > self.cpu_budget:
+            # Cost scales roughly with 1/N, so jump straight to the rate that fits the budget
+            new_rate = min(self.max_rate, max(self.rate + 1, math.ceil(self.rate * load / self.cpu_budget)))
+        elif load < self.cpu_budget * 0.5 and self.rate > 1:
+            new_rate = max(1, self.rate // 2)
+        else:
+            return
+        if new_rate != self.rate:
+            self.rate = new_rate
+            self._skip = min(self._skip, self._next_skip())
+
+def variance_term(pkt_len, weight):
+    """ Contribution of one sampled packet to the variance of the byte estimate. """
+    return pkt_len * pkt_len * weight * (weight - 1)
+
+def confidence_interval(variance, z=Z_95):
+    """ Half-width of the confidence interval for an estimated byte total. """
+    return z * math.sqrt(variance) if variance > 0 else 0.0
+
+def format_rate(kbps, ci_kbps, width=0):
+    """ '12.34' or '12.34±0.56' when the rate is a sampled estimate. """
+    text = f"{kbps:{width}.2f}"
+    return f"{text}±{ci_kbps:.2f}" if ci_kbps else text
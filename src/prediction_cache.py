@@ -0,0 +1,80 @@
+# prediction_cache.py
+# Memoization in front of the model's scoring call.
+# Idle apps are scored at near-identical rates every tick, so scores are cached
+# under (app, log-bucketed feature values) in a bounded LRU. The cache must be
+# invalidated whenever the model changes.
+#
+# Buckets are uniform in log(|x| + EPSILON): above EPSILON a bucket is RELATIVE_ERROR
+# wide relative to the value (about 0.005 KB/s at 0.1 KB/s, 5 KB/s at 100 KB/s),
+# and below it values within ~EPSILON * RELATIVE_ERROR of each other share one. A plain
+# log1p(x) would make buckets 5% of (1 + x) wide, i.e. about 55% of the value at the
+# 0.1 KB/s rates of idle apps.
+import math
+from collections import OrderedDict
+
+from self_metrics import metrics
+
+RELATIVE_ERROR = 0.05   # neighbouring buckets differ by this fraction of the value
+EPSILON = 0.01          # values below this (KB/s, connections, log ratio) get absolute-width buckets
+SCALE = 1 / math.log1p(RELATIVE_ERROR)   # buckets per e-fold of (|x| + EPSILON)
+MAX_ENTRIES = 4096
+
+def quantize(value, scale=SCALE, epsilon=EPSILON):
+    """ Signed log bucket of |value| + epsilon: 0 stays 0, -x mirrors x, buckets ~5% of the value wide. """
+    bucket = int(round(math.log1p(abs(value) / epsilon) * scale))
+    return bucket if value >= 0 else -bucket
+
+class PredictionCache:
+    def __init__(self, feature_names=('upload_kbps', 'download_kbps'), maxsize=MAX_ENTRIES, scale=SCALE,
+                 epsilon=EPSILON):
+        self.feature_names = tuple(feature_names)
+        self.maxsize = maxsize
+        self.scale = scale
+        self.epsilon = epsilon
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, app, features):
+        """
+        features: dict of model feature values (only self.feature_names are used).
+        Values are quantized, so a cached score is reused for any feature vector whose
+        values all fall in the same buckets, not only for identical ones: the score returned
+        may belong to a vector up to RELATIVE_ERROR away in each feature (or EPSILON *
+        RELATIVE_ERROR for values below EPSILON). With all ten temporal features in the key
+        every value has to stay in its bucket, so the hit rate is much lower than with the
+        two rate features; hits come mostly from idle apps.
+        """
+        return (app,) + tuple(quantize(features.get(name, 0.0), self.scale, self.epsilon)
+                              for name in self.feature_names)
+
+    def get(self, key):
+        """ Cached prediction or None. """
+        pred = self.entries.get(key)
+        if pred is None:
+            self.misses += 1
+            metrics.incr('predict_cache_miss')
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        metrics.incr('predict_cache_hit')
+        return pred
+
+    def put(self, key, pred):
+        self.entries[key] = pred
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        metrics.set_gauge('predict_cache_size', len(self.entries))
+
+    def invalidate(self, feature_names=None):
+        """ Drop everything (call after a model (re)load); optionally switch the key features. """
+        self.entries.clear()
+        if feature_names is not None:
+            self.feature_names = tuple(feature_names)
+        metrics.set_gauge('predict_cache_size', 0)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -3,33 +3,90 @@ import time
 import threading
 from collections import defaultdict
 import psutil
-from scapy.all import sniff, IP, IPv6, TCP, UDP
+from scapy.all import IP, IPv6, TCP, UDP
 import signal
-import pandas as pd
-import joblib
+import socket
+from self_metrics import metrics
+from tick_scheduler import TickScheduler
+from app_features import FeatureEngine
+from prediction_cache import PredictionCache
+from model_manager import ModelManager, timed_scores
+from multi_capture import MultiCapture
+from unit_attribution import UnitResolver, aggregate
+from endpoint_enrichment import EndpointEnricher
+from fleet_agent import FleetAgent, fetch_model
+from packet_sampling import variance_term, confidence_interval, format_rate
 import sys
+import numpy as np
+import state_snapshot
 
 TIME_WINDOW = 2
+MAX_TIME_WINDOW = 8  # yük altında tick aralığı en fazla bu kadar uzatılır
+SENSITIVITY = 'p99'  # 'p99' veya 'p999' (app_thresholds.joblib içindeki seviyeler)
+APP_SENSITIVITY = {}  # uygulama bazında, örn. {'Code.exe': 'p999'}
+MODEL_POLL_INTERVAL = 5    # model dosyaları kaç saniyede bir kontrol edilsin (yeni sürüm tick'ler arasında devreye girer), None = kapalı
+CANDIDATE_MODEL_DIR = None # örn. 'candidate' -> aday model gölge modda skorlanır, uyum oranı raporlanır
 MAP_REFRESH = 2
 BPF_FILTER = "ip or ip6"
+INTERFACES = None        # None = scapy'nin varsayılan arayüzü, 'all' = tüm aktif arayüzler, ya da ['eth0', 'tun0']
+STATS_LOG_INTERVAL = 60  # öz metrik log satırı (saniye), None = kapalı
+METRICS_PORT = None      # örn. 9108 -> http://127.0.0.1:9108/metrics
+SAMPLE_RATE = 1          # 1 = her paket, N = ortalama N pakette 1 (byte'lar N ile ölçeklenir)
+SAMPLE_MODE = 'random'   # 'random' (sFlow tarzı) veya 'count' (tam olarak her N. paket)
+CPU_BUDGET = None        # örn. 0.25 -> yakalama için CPU bütçesi (arayüzlere bölünür), N otomatik ayarlanır
+ATTRIBUTION = 'process'  # 'process' = süreç adı, 'unit' = container / systemd servisi (modeli de aynı modda eğitin)
+ENRICH_ENDPOINTS = True  # anomalilerde uzak uç noktaları isimleriyle göster (arka planda çözülür)
+ENRICH_DNS = True        # False = yalnızca ENRICH_DATABASE (tamamen çevrimdışı)
+ENRICH_DATABASE = None   # örn. "endpoints.txt": yerel hosts / CIDR isim dosyası
+ENDPOINTS_PER_APP = 3
+STATE_SNAPSHOT_PATH = 'detector_state.bin'  # yeniden başlatmada sıcak başlangıç için durum dosyası, None = kapalı
+STATE_SNAPSHOT_INTERVAL = state_snapshot.SNAPSHOT_INTERVAL  # kaç saniyede bir durum kaydedilsin
+AGGREGATOR_ADDRESS = None  # örn. "10.0.0.5:47900" -> fleet modeli oradan alınır, tick'ler oraya gönderilir
 
-# load model & columns
+# fleet model from the aggregator (falls back to the local files if it is unreachable)
+if AGGREGATOR_ADDRESS:
+    try:
+        version = fetch_model(AGGREGATOR_ADDRESS, '.')
+        print(f"Fleet modeli indirildi (sürüm {version})." if version else "Fleet modeli güncel.")
+    except Exception as e:
+        print("Aggregator'dan model alınamadı, yerel model kullanılacak:", e)
+
+# load model & columns (a newer version in the directory replaces them between ticks)
+model_manager = ModelManager('.', CANDIDATE_MODEL_DIR, SENSITIVITY, APP_SENSITIVITY, MODEL_POLL_INTERVAL or 0)
 try:
-    model = joblib.load('app_anomaly_model.joblib')
-    model_columns = joblib.load('model_columns.joblib')
-    # ensure model_columns is an Index or list
-    model_columns = list(model_columns)
+    bundle = model_manager.load()
     print("Model yüklendi.")
 except Exception as e:
     print("Model dosyaları bulunamadı veya yüklenemedi:", e)
     sys.exit(1)
 
+model = bundle.model
+model_columns = bundle.columns
+# feature window/alpha used at training time (older models don't have feature_config.joblib)
+feature_engine = FeatureEngine(*bundle.feature_settings)
+# (uygulama, log-kovalanmış özellikler) -> skor; model yeniden yüklenirse invalidate() edilmeli
+prediction_cache = PredictionCache(bundle.cache_features)
+# uygulama bazlı eşikler (yoksa modelin genel eşiği)
+thresholds = bundle.thresholds
+
+def apply_model(bundle):
+    """ Switch scoring to a newly loaded model (called between ticks). """
+    global model, model_columns, feature_engine, thresholds
+    model = bundle.model
+    model_columns = bundle.columns
+    thresholds = bundle.thresholds
+    if bundle.feature_settings != (feature_engine.window, feature_engine.alpha):
+        feature_engine = FeatureEngine(*bundle.feature_settings)
+    prediction_cache.invalidate(bundle.cache_features)
+
 keep_running = True
-pid_bytes = defaultdict(lambda: {'up': 0, 'down': 0})
+pid_bytes = defaultdict(lambda: {'up': 0, 'down': 0, 'up_var': 0, 'down_var': 0})
 lock = threading.Lock()
 conn_map = {}
+pid_remotes = {}  # pid -> remote addresses, rebuilt with conn_map
 last_map_refresh = 0
 seen_unknown = set()
+agent = None  # FleetAgent when AGGREGATOR_ADDRESS is set
 
 def signal_handler(sig, frame):
     global keep_running
@@ -38,18 +95,21 @@ def signal_handler(sig, frame):
 
 signal.signal(signal.SIGINT, signal_handler)
 
-def build_conn_map():
+def build_conn_map(remotes=None):
+    """ Connection 5-tuples (both directions) -> pid; fills remotes (pid -> remote IPs) if given. """
     new_map = {}
     for c in psutil.net_connections(kind='inet'):
         try:
             if c.laddr and c.raddr and c.pid:
                 l_ip, l_port = c.laddr
                 r_ip, r_port = c.raddr
-                proto = 6 if c.type == psutil.SOCK_STREAM else 17
+                proto = 6 if c.type == socket.SOCK_STREAM else 17
                 key = (l_ip, int(l_port), r_ip, int(r_port), proto)
                 rev = (r_ip, int(r_port), l_ip, int(l_port), proto)
                 new_map[key] = c.pid
                 new_map[rev] = c.pid
+                if remotes is not None:
+                    remotes.setdefault(c.pid, set()).add(r_ip)
         except Exception:
             continue
     return new_map
@@ -82,31 +142,52 @@ def match_packet_to_pid(pkt):
         with lock:
             pid = conn_map.get(rev)
         if pid is not None:
+            metrics.incr('match_hit')
             return pid, 'in'
+    metrics.incr('match_hit' if pid else 'match_miss')
     return (pid, 'out') if pid else (None, None)
 
-def packet_handler(pkt):
-    global last_map_refresh
+def packet_handler(pkt, weight=1):
+    global last_map_refresh, pid_remotes
+    start = time.perf_counter()
     now = time.time()
     if now - last_map_refresh > MAP_REFRESH:
-        new_map = build_conn_map()
+        remotes = {}
+        with metrics.timer('build_conn_map'):
+            new_map = build_conn_map(remotes)
         with lock:
             conn_map.clear()
             conn_map.update(new_map)
+            pid_remotes = remotes
             last_map_refresh = now
+        metrics.set_gauge('conn_map_size', len(new_map))
 
+    metrics.incr('packets_seen')  # sampled packets (skipped ones are counted per interface)
     pid, direction = match_packet_to_pid(pkt)
     if pid is None:
+        metrics.incr('packets_dropped')
+        metrics.observe('packet_handler', time.perf_counter() - start)
         return
     l = len(pkt)
+    var = variance_term(l, weight)
     with lock:
         if direction == 'out':
-            pid_bytes[pid]['up'] += l
+            pid_bytes[pid]['up'] += l * weight
+            pid_bytes[pid]['up_var'] += var
         else:
-            pid_bytes[pid]['down'] += l
+            pid_bytes[pid]['down'] += l * weight
+            pid_bytes[pid]['down_var'] += var
+    metrics.incr('packets_attributed')
+    metrics.observe('packet_handler', time.perf_counter() - start)
 
-def sniffer():
-    sniff(filter=BPF_FILTER, prn=packet_handler, store=False)
+def count_connections():
+    """ pid -> number of connections (conn_map holds both directions of each one). """
+    with lock:
+        pids = list(conn_map.values())
+    counts = defaultdict(int)
+    for pid in pids:
+        counts[pid] += 1
+    return {pid: n // 2 for pid, n in counts.items()}
 
 def get_proc_name(pid):
     try:
@@ -114,44 +195,207 @@ def get_proc_name(pid):
     except Exception:
         return "?"
 
+# pid -> label (process name or unit), cached for the PID's lifetime
+resolver = UnitResolver(get_proc_name, ATTRIBUTION)
+
+def create_enricher():
+    """ Remote address -> name resolver; an unreadable database falls back to DNS only. """
+    if not ENRICH_ENDPOINTS:
+        return None
+    try:
+        return EndpointEnricher(ENRICH_DATABASE, ENRICH_DNS)
+    except OSError as e:
+        print("Uç nokta veritabanı okunamadı:", e)
+        return EndpointEnricher(None, ENRICH_DNS)
+
+# remote address -> name, resolved on background threads
+enricher = create_enricher()
+
+def endpoints_of(pids):
+    """ ' → name (ip), ip' for a row's remote addresses; misses are queued and named on a later tick. """
+    ips = []
+    for pid in pids:
+        for ip in sorted(pid_remotes.get(pid, ())):
+            if ip not in ips:
+                ips.append(ip)
+    ips = ips[:ENDPOINTS_PER_APP]
+    if not ips:
+        return ""
+    if enricher:
+        enricher.prefetch(ips)
+        return " → " + ", ".join(enricher.describe(ip) for ip in ips)
+    return " → " + ", ".join(ips)
+
+def detect_snapshot(snapshot, elapsed=TIME_WINDOW):
+    """ Score one tick worth of per-PID byte counts against the model (cache misses in one batch). """
+    conns = count_connections()
+    tick_rows = []
+    rows = []    # [name, features, up_txt, down_txt, endpoints, cache_key, score] in print order
+    misses = []  # rows of known apps without a cached score
+    for name, vals in aggregate(snapshot, resolver, conns):
+        up_kbps = vals['up'] / 1024.0 / elapsed
+        down_kbps = vals['down'] / 1024.0 / elapsed
+        if up_kbps < 0.01 and down_kbps < 0.01:
+            continue
+        # ±95% güven aralığı (yalnızca örnekleme açıkken sıfırdan farklı)
+        up_txt = format_rate(up_kbps, confidence_interval(vals.get('up_var', 0)) / 1024.0 / elapsed)
+        down_txt = format_rate(down_kbps, confidence_interval(vals.get('down_var', 0)) / 1024.0 / elapsed)
+        tick_rows.append((name, up_kbps, down_kbps, vals['connections']))
+        features = feature_engine.update(name, up_kbps, down_kbps, vals['connections'])
+        row = [name, features, up_txt, down_txt, endpoints_of(vals['pids']), None, None]
+        rows.append(row)
+        if f"process_name_{name}" in model_columns:
+            row[5] = prediction_cache.key(name, features)
+            row[6] = prediction_cache.get(row[5])
+            if row[6] is None:
+                misses.append(row)
+
+    if misses:
+        try:
+            scores, _ = timed_scores(model, model_manager.active.frame([(r[0], r[1]) for r in misses]))
+            for row, score in zip(misses, scores):
+                row[6] = score
+                prediction_cache.put(row[5], score)
+        except Exception as e:
+            print("Model tahmini sırasında hata:", e)
+
+    scored = []
+    for name, features, up_txt, down_txt, endpoints, cache_key, score in rows:
+        if cache_key is None:
+            if name not in seen_unknown:
+                print(f"🚨 Bilinmeyen uygulama tespit edildi: {name} (ilk görüldü){endpoints}")
+                seen_unknown.add(name)
+            else:
+                print(f"⚪️ Bilinmeyen (daha önce görüldü): {name} ↑{up_txt} KB/s ↓{down_txt} KB/s")
+            continue
+        if score is None:
+            continue  # scoring failed above
+        scored.append((name, features))
+        if thresholds.is_anomaly(name, score):
+            print(f"🚨 Davranışsal Anomali: {name} ↑{up_txt} KB/s ↓{down_txt} KB/s{endpoints}")
+        else:
+            print(f"OK: {name} ↑{up_txt} KB/s ↓{down_txt} KB/s")
+    # Every scored row of the tick, cached or not, as one batch for the candidate model
+    model_manager.shadow(scored)
+    resolver.retain(conns)
+    if agent:
+        agent.submit(time.time(), tick_rows)
+
+def state_sections():
+    """ seen_unknown, the connection map and the feature windows as snapshot sections (see state_snapshot.py). """
+    with lock:
+        entries = list(conn_map.items())
+    n = len(entries)
+    sections = feature_engine.to_sections()
+    sections.update({
+        'seen_unknown': sorted(seen_unknown),
+        'conn_src': [key[0] for key, _ in entries],
+        'conn_dst': [key[2] for key, _ in entries],
+        'conn_sport': np.fromiter((key[1] for key, _ in entries), dtype=np.uint16, count=n),
+        'conn_dport': np.fromiter((key[3] for key, _ in entries), dtype=np.uint16, count=n),
+        'conn_proto': np.fromiter((key[4] for key, _ in entries), dtype=np.uint8, count=n),
+        'conn_pid': np.fromiter((pid for _, pid in entries), dtype=np.int64, count=n),
+    })
+    return sections
+
+def save_state():
+    try:
+        with metrics.timer('state_snapshot'):
+            size = state_snapshot.save(STATE_SNAPSHOT_PATH, state_sections())
+        metrics.set_gauge('state_snapshot_bytes', size)
+    except OSError as e:
+        print("Durum kaydedilemedi:", e)
+
+def restore_state():
+    """ Already reported unknown apps are always restored, the connection map and feature windows only when fresh. """
+    global last_map_refresh, feature_engine
+    started = time.perf_counter()
+    snapshot = state_snapshot.load(STATE_SNAPSHOT_PATH)
+    if snapshot is None:
+        return
+    sections = snapshot.sections
+    try:
+        unknown = sections.get('seen_unknown', [])
+        restored = {}
+        if 'conn_pid' in sections and state_snapshot.is_fresh(snapshot, state_snapshot.PID_STATE_MAX_AGE):
+            columns = (sections['conn_src'], sections['conn_sport'].tolist(), sections['conn_dst'],
+                       sections['conn_dport'].tolist(), sections['conn_proto'].tolist())
+            restored = dict(zip(zip(*columns), sections['conn_pid'].tolist()))
+        engine = None
+        if 'feat_apps' in sections and 0 <= time.time() - snapshot.saved_at <= state_snapshot.PID_STATE_MAX_AGE:
+            engine = FeatureEngine.from_sections(sections)
+            if (engine.window, engine.alpha) != (feature_engine.window, feature_engine.alpha):
+                engine = None  # model trained with other settings: windows start cold
+    except (KeyError, ValueError) as e:
+        print("Durum dosyası yok sayıldı:", e)
+        return
+    seen_unknown.update(unknown)
+    if restored:
+        with lock:
+            conn_map.update(restored)
+        # the restored map serves the first MAP_REFRESH seconds instead of a blocking rebuild on the first packet
+        last_map_refresh = time.time()
+    if engine:
+        feature_engine = engine
+    metrics.observe('state_restore', time.perf_counter() - started)
+    print(f"Sıcak başlangıç: {len(seen_unknown)} bilinen bilinmeyen uygulama, {len(restored) // 2} bağlantı, "
+          f"{len(engine.apps) if engine else 0} özellik penceresi "
+          f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
 def run_detection():
-    t = threading.Thread(target=sniffer, daemon=True)
-    t.start()
+    global agent
+    if STATE_SNAPSHOT_PATH:
+        restore_state()
+    if AGGREGATOR_ADDRESS:
+        agent = FleetAgent(AGGREGATOR_ADDRESS).start()
+    capture = MultiCapture(packet_handler, INTERFACES, BPF_FILTER,
+                           sample_rate=SAMPLE_RATE, sample_mode=SAMPLE_MODE, cpu_budget=CPU_BUDGET).start()
+    print("Yakalanan arayüzler:", ", ".join(i or "varsayılan" for i in capture.interfaces))
+    if STATS_LOG_INTERVAL:
+        metrics.start_log_thread(STATS_LOG_INTERVAL)
+    if METRICS_PORT:
+        metrics.serve_prometheus(METRICS_PORT)
+    if MODEL_POLL_INTERVAL:
+        model_manager.start()
     print("Canlı tespit başladı. Ctrl+C ile durdurun.")
     try:
+        scheduler = TickScheduler(TIME_WINDOW, MAX_TIME_WINDOW)
+        last_snapshot = time.monotonic()
         while keep_running:
-            time.sleep(TIME_WINDOW)
+            elapsed = scheduler.wait()  # gerçek geçen süre (monotonic), KB/s bununla hesaplanır
             with lock:
                 snapshot = dict(pid_bytes)
                 pid_bytes.clear()
-            for pid, vals in snapshot.items():
-                up_kbps = vals['up'] / 1024.0 / TIME_WINDOW
-                down_kbps = vals['down'] / 1024.0 / TIME_WINDOW
-                if up_kbps < 0.01 and down_kbps < 0.01:
-                    continue
-                name = get_proc_name(pid)
-                colname = f"process_name_{name}"
-                if colname in model_columns:
-                    live_row = pd.DataFrame(0, index=[0], columns=model_columns)
-                    live_row['upload_kbps'] = up_kbps
-                    live_row['download_kbps'] = down_kbps
-                    live_row[colname] = 1
-                    try:
-                        pred = model.predict(live_row)[0]
-                        if pred == -1:
-                            print(f"🚨 Davranışsal Anomali: {name} ↑{up_kbps:.2f} KB/s ↓{down_kbps:.2f} KB/s")
-                        else:
-                            print(f"OK: {name} ↑{up_kbps:.2f} KB/s ↓{down_kbps:.2f} KB/s")
-                    except Exception as e:
-                        print("Model tahmini sırasında hata:", e)
-                else:
-                    if name not in seen_unknown:
-                        print(f"🚨 Bilinmeyen uygulama tespit edildi: {name} (ilk görüldü)")
-                        seen_unknown.add(name)
-                    else:
-                        print(f"⚪️ Bilinmeyen (daha önce görüldü): {name} ↑{up_kbps:.2f} KB/s ↓{down_kbps:.2f} KB/s")
+            metrics.set_gauge('pending_pids', len(snapshot))
+            metrics.set_gauge('sample_rate', capture.sample_rate)
+            metrics.set_gauge('tick_interval', round(scheduler.interval, 2))
+            metrics.set_gauge('ticks_skipped', scheduler.skipped)
+            capture.publish_metrics()
+            new_model = model_manager.poll()
+            if new_model:
+                apply_model(new_model)
+                print(f"Yeni model sürümü devreye alındı (v{new_model.version}).")
+            with metrics.timer('detect_tick'):
+                detect_snapshot(snapshot, elapsed)
+            if STATE_SNAPSHOT_PATH and time.monotonic() - last_snapshot >= STATE_SNAPSHOT_INTERVAL:
+                save_state()
+                last_snapshot = time.monotonic()
+            scheduler.done()
     except KeyboardInterrupt:
         pass
+    capture.stop()
+    model_manager.stop()
+    if model_manager.candidate:
+        print("Gölge model:", model_manager.describe())
+    if agent:
+        agent.stop()
+    if enricher:
+        enricher.close()
+    if STATE_SNAPSHOT_PATH:
+        save_state()
+    for iface, counters in capture.stats().items():
+        print(f"{iface}: {counters['packets']} paket, {counters['bytes'] / 1024 / 1024:.1f} MB, "
+              f"{counters['duplicates']} tekrar, {counters['errors']} hata")
 
 if __name__ == "__main__":
     run_detection()
@@ -0,0 +1,76 @@
+# score_thresholds.py
+# Per-app IsolationForest score thresholds.
+# train-app-model.py computes, in one vectorized pass over score_samples(), the score
+# quantiles of each app's own training rows and saves them next to the model.
+# Live detection is then one score_samples() call plus an O(1) dict lookup.
+# Lower scores are more anomalous: 'p99' flags the lowest 1% of an app's normal
+# behaviour, 'p999' only the lowest 0.1%.
+import os
+
+LEVELS = {'p99': 0.01, 'p999': 0.001}
+DEFAULT_LEVEL = 'p99'
+MIN_APP_SAMPLES = 20   # apps with fewer training rows use the global quantiles
+THRESHOLDS_FILE = 'app_thresholds.joblib'
+
+def compute_thresholds(scores, app_names, levels=LEVELS, min_samples=MIN_APP_SAMPLES):
+    """ scores/app_names: aligned sequences over the training rows. Returns the table saved by training. """
+    import pandas as pd
+    series = pd.Series(scores)
+    names = pd.Series(list(app_names), index=series.index)
+    quantiles = list(levels.values())
+    per_app = series.groupby(names).quantile(quantiles).unstack()
+    counts = names.value_counts()
+    global_q = series.quantile(quantiles)
+    level_names = list(levels.keys())
+    table = {
+        'levels': dict(levels),
+        'global': {name: float(global_q.iloc[i]) for i, name in enumerate(level_names)},
+        'apps': {},
+    }
+    for app, row in per_app.iterrows():
+        if counts.get(app, 0) < min_samples:
+            continue
+        table['apps'][app] = {name: float(row.iloc[i]) for i, name in enumerate(level_names)}
+        table['apps'][app]['count'] = int(counts[app])
+    return table
+
+class ThresholdTable:
+    """
+    Resolves one cutoff per app up front so is_anomaly() is a dict lookup.
+    Without a table (older models) every app uses the model's own global cutoff
+    (IsolationForest.offset_, i.e. what predict() would use).
+    """
+
+    def __init__(self, table=None, fallback=None, default_level=DEFAULT_LEVEL, sensitivity=None):
+        self.table = table
+        self.fallback = fallback
+        self.default_level = default_level
+        self.sensitivity = dict(sensitivity or {})  # app -> level name, e.g. {'Code.exe': 'p999'}
+        self.cutoffs = {}
+        self.default_cutoff = fallback
+        self._resolve()
+
+    def _resolve(self):
+        if not self.table:
+            return
+        self.default_cutoff = self.table['global'].get(self.default_level, self.fallback)
+        for app, levels in self.table['apps'].items():
+            level = self.sensitivity.get(app, self.default_level)
+            self.cutoffs[app] = levels.get(level, self.default_cutoff)
+        # Apps without their own quantiles but with a custom sensitivity use the global one
+        for app, level in self.sensitivity.items():
+            if app not in self.cutoffs:
+                self.cutoffs[app] = self.table['global'].get(level, self.default_cutoff)
+
+    @classmethod
+    def load(cls, model, directory='.', default_level=DEFAULT_LEVEL, sensitivity=None):
+        import joblib
+        path = os.path.join(directory, THRESHOLDS_FILE)
+        table = joblib.load(path) if os.path.exists(path) else None
+        return cls(table, getattr(model, 'offset_', 0.0), default_level, sensitivity)
+
+    def threshold(self, app):
+        return self.cutoffs.get(app, self.default_cutoff)
+
+    def is_anomaly(self, app, score):
+        return score < self.cutoffs.get(app, self.default_cutoff)
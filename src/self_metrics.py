@@ -0,0 +1,190 @@
+# self_metrics.py
+# Lightweight self-instrumentation for the monitor's own hot paths.
+# Counters, gauges and timers live in one process-wide Metrics object; readings are
+# exposed as a dict (stats API), a one-line log summary and Prometheus text format.
+# Hot-path updates go to per-thread shards and are merged when read.
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Shard:
+    """ One thread's counters and timers; only that thread writes to it. """
+    __slots__ = ('counters', 'timers')
+
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}  # name -> [count, total_s, max_s, last_s, perf_counter of last sample]
+
+class Metrics:
+    """
+    incr() and observe() run for every packet on several capture threads, so they write
+    to a per-thread shard without taking a lock; snapshot() merges the shards. A reading
+    may miss an update that is in flight, which is fine for monitoring.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # guards the shard list only
+        self._local = threading.local()
+        self._shards = []
+        self.started = time.time()
+        self.gauges = {}
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)  # kept after the thread exits: its counts still count
+        return shard
+
+    def incr(self, name, value=1):
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value  # last writer wins; a single dict store needs no lock
+
+    def observe(self, name, seconds):
+        """ Record one duration sample for a timer. """
+        timers = self._shard().timers
+        t = timers.get(name)
+        if t is None:
+            timers[name] = [1, seconds, seconds, seconds, time.perf_counter()]
+        else:
+            t[0] += 1
+            t[1] += seconds
+            t[3] = seconds
+            t[4] = time.perf_counter()
+            if seconds > t[2]:
+                t[2] = seconds
+
+    def _merged(self):
+        """ (counters, timers) summed over all shards; timers as [count, total_s, max_s, last_s]. """
+        with self._lock:
+            shards = list(self._shards)
+        counters = {}
+        timers = {}
+        for shard in shards:
+            for name, value in dict(shard.counters).items():
+                counters[name] = counters.get(name, 0) + value
+            for name, t in dict(shard.timers).items():
+                count, total, peak, last, at = list(t)
+                merged = timers.get(name)
+                if merged is None:
+                    timers[name] = [count, total, peak, last, at]
+                else:
+                    merged[0] += count
+                    merged[1] += total
+                    merged[2] = max(merged[2], peak)
+                    if at > merged[4]:
+                        merged[3], merged[4] = last, at
+        return counters, {name: t[:4] for name, t in timers.items()}
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """ Stats API: a plain dict copy of everything recorded so far. """
+        counters, timers = self._merged()
+        stats = {
+            'uptime_s': time.time() - self.started,
+            'counters': counters,
+            'gauges': dict(self.gauges),
+            'timers': {
+                name: {
+                    'count': count,
+                    'avg_ms': total / count * 1000 if count else 0.0,
+                    'max_ms': peak * 1000,
+                    'last_ms': last * 1000,
+                }
+                for name, (count, total, peak, last) in timers.items()
+            },
+        }
+        seen = counters.get('packets_seen', 0)
+        if seen:
+            stats['attributed_ratio'] = counters.get('packets_attributed', 0) / seen
+        lookups = counters.get('match_hit', 0) + counters.get('match_miss', 0)
+        if lookups:
+            stats['match_hit_rate'] = counters.get('match_hit', 0) / lookups
+        cached = counters.get('predict_cache_hit', 0) + counters.get('predict_cache_miss', 0)
+        if cached:
+            stats['predict_cache_hit_rate'] = counters.get('predict_cache_hit', 0) / cached
+        return stats
+
+    def log_line(self):
+        """ Compact single-line summary, suitable for periodic logging. """
+        stats = self.snapshot()
+        parts = []
+        c = stats['counters']
+        if 'packets_seen' in c:
+            parts.append(f"pkts seen={c.get('packets_seen', 0)} attributed={c.get('packets_attributed', 0)} "
+                         f"dropped={c.get('packets_dropped', 0)} skipped={c.get('packets_skipped', 0)}")
+        if 'match_hit_rate' in stats:
+            parts.append(f"match hit={stats['match_hit_rate'] * 100:.1f}%")
+        if 'predict_cache_hit_rate' in stats:
+            parts.append(f"predict cache hit={stats['predict_cache_hit_rate'] * 100:.1f}%")
+        for name, t in sorted(stats['timers'].items()):
+            parts.append(f"{name} avg={t['avg_ms']:.2f}ms max={t['max_ms']:.2f}ms")
+        for name, value in sorted(stats['gauges'].items()):
+            parts.append(f"{name}={value}")
+        return "[stats] " + " | ".join(parts)
+
+    def start_log_thread(self, interval=60, printer=print):
+        """ Print log_line() every interval seconds from a daemon thread. """
+        def loop():
+            while True:
+                time.sleep(interval)
+                printer(self.log_line())
+        t = threading.Thread(target=loop, daemon=True)
+        t.start()
+        return t
+
+    def prometheus_text(self, prefix="netmon"):
+        stats = self.snapshot()
+        lines = [f"# TYPE {prefix}_uptime_seconds gauge",
+                 f"{prefix}_uptime_seconds {stats['uptime_s']:.3f}"]
+        for name, value in sorted(stats['counters'].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in sorted(stats['gauges'].items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        for name, (count, total, peak, _last) in sorted(self._merged()[1].items()):
+            lines.append(f"# TYPE {prefix}_{name}_seconds summary")
+            lines.append(f"{prefix}_{name}_seconds_count {count}")
+            lines.append(f"{prefix}_{name}_seconds_sum {total:.6f}")
+            lines.append(f"# TYPE {prefix}_{name}_seconds_max gauge")
+            lines.append(f"{prefix}_{name}_seconds_max {peak:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """ Serve /metrics in Prometheus text format on localhost from a daemon thread. """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the console
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+# Process-wide instance shared by the sniffers and the dashboard
+metrics = Metrics()
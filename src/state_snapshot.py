@@ -0,0 +1,147 @@
+# state_snapshot.py
+# Crash-safe binary snapshots of monitor state, for a warm start after a restart.
+#
+#   magic b'AINSNAP1' | !d saved_at (wall clock) | !d boot_time | !H section count
+#   sections: !B name length + name | !B kind | body
+#       ARRAY    !B dtype length + numpy dtype string, !Q byte count, raw little-endian data
+#       STRINGS  !I count, !Q byte count, UTF-8 strings joined with '\0'
+#       FLOAT    !d value
+#   trailer: !I CRC-32 of everything before it
+#
+# A snapshot is written to a temporary file, fsync'ed and moved over the old one with
+# os.replace(), so a crash leaves either the previous or the new snapshot, never a torn
+# one. load() returns None for a missing, truncated or corrupted file, and the monitor
+# simply starts cold. Restoring is a few frombuffer() calls: milliseconds even for
+# tens of thousands of apps.
+#
+# Per-PID byte counters and connection maps are only meaningful within one boot and
+# for a short gap (PIDs and ports get reused), so callers check is_fresh() before
+# restoring those; learned state such as already reported unknown apps is kept longer.
+# The per-app feature windows only describe the last few ticks, so they get the same age
+# limit (without the same-boot condition: they are keyed by app name, not PID).
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b'AINSNAP1'
+SNAPSHOT_INTERVAL = 30   # seconds between periodic snapshots
+RESTART_ALLOWANCE = 60   # seconds a crashed monitor may take to come back up
+# per-PID counters / connection maps / feature windows older than this are not restored; the last
+# snapshot before a crash is up to SNAPSHOT_INTERVAL old, so the restart allowance comes on top
+PID_STATE_MAX_AGE = SNAPSHOT_INTERVAL + RESTART_ALLOWANCE
+SESSION_MAX_AGE = 3600   # session totals older than this start a new session instead
+
+ARRAY, STRINGS, FLOAT = 1, 2, 3
+
+_HEADER = struct.Struct('!ddH')
+_U8 = struct.Struct('!B')
+_U32 = struct.Struct('!I')
+_U64 = struct.Struct('!Q')
+_F64 = struct.Struct('!d')
+
+Snapshot = namedtuple('Snapshot', ['saved_at', 'boot_time', 'sections'])
+
+class SnapshotError(Exception):
+    pass
+
+def boot_time():
+    import psutil
+    return float(psutil.boot_time())
+
+def _encode_section(name, value):
+    key = name.encode('ascii')
+    parts = [_U8.pack(len(key)), key]
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value, dtype=value.dtype.newbyteorder('<'))
+        dtype = array.dtype.str.encode('ascii')
+        data = array.tobytes()
+        parts += [_U8.pack(ARRAY), _U8.pack(len(dtype)), dtype, _U64.pack(len(data)), data]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        data = '\0'.join(value).encode('utf-8')
+        parts += [_U8.pack(STRINGS), _U32.pack(len(value)), _U64.pack(len(data)), data]
+    else:
+        parts += [_U8.pack(FLOAT), _F64.pack(float(value))]
+    return b''.join(parts)
+
+def encode(sections, saved_at=None, boot=None):
+    """ sections: {name: ndarray | list of str | number} -> snapshot bytes. """
+    saved_at = time.time() if saved_at is None else saved_at
+    boot = boot_time() if boot is None else boot
+    body = [MAGIC, _HEADER.pack(saved_at, boot, len(sections))]
+    body += [_encode_section(name, value) for name, value in sections.items()]
+    blob = b''.join(body)
+    return blob + _U32.pack(zlib.crc32(blob))
+
+def decode(blob):
+    if len(blob) < len(MAGIC) + _HEADER.size + _U32.size or not blob.startswith(MAGIC):
+        raise SnapshotError("not a snapshot")
+    if zlib.crc32(blob[:-_U32.size]) != _U32.unpack_from(blob, len(blob) - _U32.size)[0]:
+        raise SnapshotError("checksum mismatch")
+    view = memoryview(blob)
+    saved_at, boot, count = _HEADER.unpack_from(view, len(MAGIC))
+    offset = len(MAGIC) + _HEADER.size
+    sections = {}
+    for _ in range(count):
+        length = view[offset]
+        name = bytes(view[offset + 1:offset + 1 + length]).decode('ascii')
+        offset += 1 + length
+        kind = view[offset]
+        offset += 1
+        if kind == ARRAY:
+            length = view[offset]
+            dtype = np.dtype(bytes(view[offset + 1:offset + 1 + length]).decode('ascii'))
+            offset += 1 + length
+            size, = _U64.unpack_from(view, offset)
+            offset += _U64.size
+            # copy: restored arrays are updated in place later
+            sections[name] = np.frombuffer(view[offset:offset + size], dtype=dtype).astype(dtype.newbyteorder('='))
+            offset += size
+        elif kind == STRINGS:
+            n, = _U32.unpack_from(view, offset)
+            size, = _U64.unpack_from(view, offset + _U32.size)
+            offset += _U32.size + _U64.size
+            text = bytes(view[offset:offset + size]).decode('utf-8')
+            sections[name] = text.split('\0') if n else []
+            offset += size
+        elif kind == FLOAT:
+            sections[name], = _F64.unpack_from(view, offset)
+            offset += _F64.size
+        else:
+            raise SnapshotError(f"unknown section kind {kind}")
+    return Snapshot(saved_at, boot, sections)
+
+def save(path, sections):
+    """ Atomically replace path with a snapshot of sections; returns its size in bytes. """
+    blob = encode(sections)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(blob)
+
+def load(path):
+    """ Snapshot or None (missing, unreadable or corrupted file). """
+    try:
+        with open(path, 'rb') as f:
+            return decode(f.read())
+    except (OSError, SnapshotError, ValueError, TypeError, struct.error, UnicodeDecodeError):
+        return None
+
+def is_fresh(snapshot, max_age, now=None):
+    """ Same boot and younger than max_age seconds. """
+    now = time.time() if now is None else now
+    try:
+        same_boot = abs(snapshot.boot_time - boot_time()) < 2
+    except Exception:
+        same_boot = False
+    return same_boot and 0 <= now - snapshot.saved_at <= max_age
+
+def monotonic_at(wall_time):
+    """ time.monotonic() value corresponding to an earlier wall-clock time. """
+    return time.monotonic() - max(0.0, time.time() - wall_time)
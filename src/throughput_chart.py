@@ -0,0 +1,129 @@
+# throughput_chart.py
+# Upload/download line chart on a Tk Canvas, fed from throughput_history.
+# A full redraw decimates the shown ring to the canvas width (one polyline per series),
+# so it costs the same after ten minutes or ten days. Between redraws each new point is
+# appended as one short segment and the existing lines are shifted left with a single
+# canvas.move(); a rising peak rescales them in place with canvas.scale(). After
+# REDRAW_EVERY_PX pixels of appended segments the chart is redrawn once, which keeps the
+# number of canvas items bounded by the width.
+from throughput_history import decimate
+
+MARGIN = 6
+REDRAW_EVERY_PX = 200   # appended width (pixels) before segments are merged by a full redraw
+
+def nice_ceiling(value):
+    """ Smallest 1/2/5 x 10^k that is >= value (y-axis maximum). """
+    if value <= 1:
+        return 1.0
+    scale = 10 ** (len(str(int(value))) - 1)
+    for step in (1, 2, 5, 10):
+        if step * scale >= value:
+            return float(step * scale)
+
+def format_rate(kbps):
+    return f"{kbps / 1024:.1f} MB/s" if kbps >= 1024 else f"{kbps:.0f} KB/s"
+
+class ThroughputChart:
+    def __init__(self, canvas, up_color, down_color, text_color, grid_color, decimation='minmax'):
+        self.canvas = canvas
+        self.colors = {'up': up_color, 'down': down_color}
+        self.text_color = text_color
+        self.grid_color = grid_color
+        self.decimation = decimation
+        self.history = None
+        self.level = 0
+        self.title = ""
+        self.y_max = 1.0
+        self.last = None         # (t, up, down) of the newest drawn point
+        self.appended_px = 0.0   # width drawn as incremental segments since the last redraw
+        canvas.bind("<Configure>", lambda event: self.redraw())
+
+    def size(self):
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        if width <= 1:  # not mapped yet
+            width = int(self.canvas.cget('width'))
+            height = int(self.canvas.cget('height'))
+        return width, height
+
+    def show(self, history, level, title):
+        """ Switch to another series or resolution (full redraw). """
+        self.history = history
+        self.level = level
+        self.title = title
+        self.redraw()
+
+    def _y(self, value, height):
+        return height - MARGIN - value / self.y_max * (height - 2 * MARGIN)
+
+    def redraw(self):
+        canvas = self.canvas
+        canvas.delete('all')
+        width, height = self.size()
+        self.last = None
+        self.appended_px = 0.0
+        self.y_max = 1.0
+        if self.history is not None and len(self.history.levels[self.level]):
+            t, up, down = self.history.series(self.level)
+            span = self.history.span(self.level)
+            visible = t >= t[-1] - span
+            t, up, down = t[visible], up[visible], down[visible]
+            self.y_max = nice_ceiling(max(up.max(), down.max()))
+            x_scale = (width - 2 * MARGIN) / span
+            for name, values in (('up', up), ('down', down)):
+                keep = decimate(t, values, width - 2 * MARGIN, self.decimation)
+                xs = width - MARGIN - (t[-1] - t[keep]) * x_scale
+                ys = self._y(values[keep], height)
+                coords = [c for point in zip(xs.tolist(), ys.tolist()) for c in point]
+                if len(coords) == 2:
+                    coords += coords  # a single point still needs a two-point line
+                canvas.create_line(*coords, fill=self.colors[name], tags=('data', name))
+            self.last = (t[-1], up[-1], down[-1])
+        self._draw_axis(width, height)
+
+    def _draw_axis(self, width, height):
+        canvas = self.canvas
+        canvas.delete('axis')
+        for fraction in (0.5, 1.0):
+            y = self._y(self.y_max * fraction, height)
+            canvas.create_line(MARGIN, y, width - MARGIN, y, fill=self.grid_color, dash=(2, 4), tags=('axis',))
+        canvas.create_text(MARGIN + 2, MARGIN, anchor='nw', fill=self.text_color, font=("Consolas", 8),
+                           text=format_rate(self.y_max), tags=('axis',))
+        canvas.create_text(width - MARGIN - 2, MARGIN, anchor='ne', fill=self.text_color, font=("Consolas", 8),
+                           text=f"{self.title}  ▲ upload  ▼ download", tags=('axis',))
+        canvas.tag_lower('axis')
+
+    def append(self):
+        """ Draw the shown level's newest point, if it is new since the last call. """
+        if self.history is None:
+            return
+        ring = self.history.levels[self.level]
+        if not len(ring):
+            return
+        if self.last is None:
+            self.redraw()
+            return
+        t, up, down = ring.last()
+        if t == self.last[0]:
+            return  # coarse level: bucket still open
+        canvas = self.canvas
+        width, height = self.size()
+        dx = (t - self.last[0]) / self.history.span(self.level) * (width - 2 * MARGIN)
+        self.appended_px += dx
+        if self.appended_px > REDRAW_EVERY_PX:
+            self.redraw()
+            return
+
+        peak = max(up, down)
+        if peak > self.y_max:
+            # Rescale what is drawn around the baseline instead of rebuilding it
+            new_max = nice_ceiling(peak)
+            canvas.scale('data', 0, height - MARGIN, 1, self.y_max / new_max)
+            self.y_max = new_max
+            self._draw_axis(width, height)
+        canvas.move('data', -dx, 0)
+        right = width - MARGIN
+        for name, previous, value in (('up', self.last[1], up), ('down', self.last[2], down)):
+            canvas.create_line(right - dx, self._y(previous, height), right, self._y(value, height),
+                               fill=self.colors[name], tags=('data', name))
+        self.last = (t, up, down)
@@ -0,0 +1,152 @@
+# throughput_history.py
+# Fixed-size, multi-resolution throughput history for the dashboard charts.
+# Every series keeps one ring buffer per resolution: raw ticks (~1 s timestamps), 1-minute
+# and 1-hour means. Coarser buckets are accumulated as ticks arrive, so memory is fixed
+# by the ring capacities however long the session runs, and a chart never reads more
+# than one ring. minmax_decimate() / lttb() then reduce a ring to at most one or two
+# points per pixel column before anything is drawn.
+from collections import OrderedDict
+
+import numpy as np
+
+# (label, bucket seconds, capacity): 30 min of ticks, 24 h of minutes, 30 days of hours
+RESOLUTIONS = (('1s', 1, 1800), ('1m', 60, 1440), ('1h', 3600, 720))
+MAX_APPS = 32   # per-app histories kept (least recently active are dropped)
+
+class RingBuffer:
+    """ (t, up, down) samples in fixed numpy arrays; the oldest sample is overwritten when full. """
+    __slots__ = ('capacity', 't', 'up', 'down', 'head', 'count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.t = np.zeros(capacity)
+        self.up = np.zeros(capacity)
+        self.down = np.zeros(capacity)
+        self.head = 0    # next write position
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, up, down):
+        i = self.head
+        self.t[i] = t
+        self.up[i] = up
+        self.down[i] = down
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def last(self):
+        i = (self.head - 1) % self.capacity
+        return self.t[i], self.up[i], self.down[i]
+
+    def ordered(self):
+        """ (t, up, down) arrays, oldest first. """
+        if self.count < self.capacity:
+            return self.t[:self.count], self.up[:self.count], self.down[:self.count]
+        order = np.r_[self.head:self.capacity, 0:self.head]
+        return self.t[order], self.up[order], self.down[order]
+
+class ThroughputHistory:
+    """ One series (an app or the total) at every resolution in RESOLUTIONS. """
+    __slots__ = ('steps', 'levels', 'buckets')
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.steps = [step for _, step, _ in resolutions]
+        self.levels = [RingBuffer(capacity) for _, _, capacity in resolutions]
+        self.buckets = [None] * len(resolutions)   # open bucket per coarse level: [start, sum_up, sum_down, n]
+
+    def add(self, t, up, down):
+        """ Record one tick; a coarse level gets a point when its bucket closes. """
+        self.levels[0].append(t, up, down)
+        for i in range(1, len(self.levels)):
+            step = self.steps[i]
+            start = t - t % step
+            bucket = self.buckets[i]
+            if bucket is not None and bucket[0] != start:
+                self.levels[i].append(bucket[0] + step / 2, bucket[1] / bucket[3], bucket[2] / bucket[3])
+                bucket = None
+            if bucket is None:
+                bucket = self.buckets[i] = [start, 0.0, 0.0, 0]
+            bucket[1] += up
+            bucket[2] += down
+            bucket[3] += 1
+
+    def series(self, level):
+        return self.levels[level].ordered()
+
+    def span(self, level):
+        """ Seconds shown for this level (the chart's x range). """
+        return self.steps[level] * self.levels[level].capacity
+
+class HistoryTable:
+    """ Per-app histories for the most recently active apps. """
+
+    def __init__(self, max_apps=MAX_APPS, resolutions=RESOLUTIONS):
+        self.max_apps = max_apps
+        self.resolutions = resolutions
+        self.apps = OrderedDict()   # name -> ThroughputHistory, least recently active first
+
+    def __contains__(self, name):
+        return name in self.apps
+
+    def get(self, name):
+        return self.apps.get(name)
+
+    def add_tick(self, t, rates):
+        """ rates: {app: (up_kbps, down_kbps)}; tracked apps missing from this tick get a zero sample. """
+        for name in rates:
+            if name in self.apps:
+                self.apps.move_to_end(name)
+            else:
+                self.apps[name] = ThroughputHistory(self.resolutions)
+        while len(self.apps) > self.max_apps:
+            self.apps.popitem(last=False)
+        for name, history in self.apps.items():
+            up, down = rates.get(name, (0.0, 0.0))
+            history.add(t, up, down)
+
+def minmax_decimate(t, y, buckets):
+    """ Indices keeping each bucket's min and max (in time order): spikes survive at any zoom. """
+    n = len(t)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    # Pad with the last value so every bucket has the same size, then reduce row-wise
+    padded = np.empty(size * buckets)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    rows = padded.reshape(buckets, size)
+    base = np.arange(buckets) * size
+    i_min = np.minimum(base + rows.argmin(axis=1), n - 1)
+    i_max = np.minimum(base + rows.argmax(axis=1), n - 1)
+    return np.unique(np.concatenate([i_min, i_max]))
+
+def lttb(t, y, threshold):
+    """ Largest-Triangle-Three-Buckets: indices of `threshold` points preserving the visual shape. """
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    # First and last points are fixed; the rest is split into threshold - 2 buckets
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    a = 0
+    for b in range(threshold - 2):
+        start, end = edges[b], edges[b + 1]
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        avg_t = t[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # Triangle area between the last kept point, each candidate and the next bucket's average
+        area = np.abs((t[a] - avg_t) * (y[start:end] - y[a]) - (t[a] - t[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+def decimate(t, y, width, method='minmax'):
+    """ Indices to draw for a chart `width` pixels wide. """
+    if method == 'lttb':
+        return lttb(t, y, max(3, width))
+    return minmax_decimate(t, y, max(1, width // 2))
@@ -0,0 +1,70 @@
+# tick_scheduler.py
+# Monotonic-clock tick scheduler for the aggregation loops.
+# Measures the real time between ticks (so KB/s math never assumes TIME_WINDOW),
+# merges ticks instead of queueing them when a tick overruns, and stretches the
+# interval while the per-tick work is heavy.
+import asyncio
+import time
+
+class TickScheduler:
+    def __init__(self, interval, max_interval=None, stretch_load=0.5):
+        self.base_interval = interval
+        self.interval = interval
+        self.max_interval = max_interval or interval * 4
+        self.stretch_load = stretch_load  # stretch when work takes more than this share of the interval
+        self.last_elapsed = 0.0
+        self.last_work = 0.0
+        self.skipped = 0     # ticks merged into a later one
+        self.overruns = 0    # ticks whose work took longer than the interval
+        self._last_tick = None
+        self._next_due = None
+
+    def wait(self):
+        """ Sleep until the next tick is due; return real seconds since the previous tick. """
+        delay = self._time_until_due()
+        if delay > 0:
+            time.sleep(delay)
+        return self._mark_tick()
+
+    async def wait_async(self):
+        """ asyncio variant of wait() for cooperative loops. """
+        delay = self._time_until_due()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._mark_tick()
+
+    def _time_until_due(self):
+        now = time.monotonic()
+        if self._last_tick is None:
+            self._last_tick = now
+            self._next_due = now + self.interval
+        delay = self._next_due - now
+        if delay <= 0:
+            # Behind schedule: don't try to catch up, the next window simply covers the gap
+            self.skipped += int(-delay // self.interval)
+        return delay
+
+    def _mark_tick(self):
+        now = time.monotonic()
+        self.last_elapsed = now - self._last_tick
+        self._last_tick = now
+        self._next_due = now + self.interval
+        return self.last_elapsed
+
+    def skip(self):
+        """ Drop the current tick (e.g. previous work still running); its time rolls into the next one. """
+        self.skipped += 1
+
+    def done(self, work=None):
+        """ Report the current tick's work duration and adapt the interval to it. """
+        if work is None:
+            work = time.monotonic() - self._last_tick
+        self.last_work = work
+        if work > self.interval:
+            self.overruns += 1
+        load = work / self.interval
+        if load > self.stretch_load:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        elif load < self.stretch_load / 2 and self.interval > self.base_interval:
+            self.interval = max(self.base_interval, self.interval / 1.5)
+        self._next_due = self._last_tick + self.interval
@@ -1,6 +1,8 @@
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 import joblib
+from app_features import compute_features_frame, WINDOW, ALPHA, FEATURE_COLUMNS
+from score_thresholds import compute_thresholds, THRESHOLDS_FILE
 
 print("Baseline veri seti yükleniyor...")
 try:
@@ -11,8 +13,16 @@ except FileNotFoundError:
 
 # --- Model için Veri Hazırlama ---
 print("Veri model için hazırlanıyor...")
+# Her uygulama için zamansal özellikler (EWMA, rolling max/std, up/down oranı, bağlantı sayısı)
+# Canlı tespitte aynı özellikler app_features.FeatureEngine ile tick başına O(1) hesaplanır
+if all(c in df.columns for c in FEATURE_COLUMNS):
+    # Rezervuar örneklemli baseline: satırlar ardışık değil, özellikler toplama sırasında hesaplanmış
+    print("Özellikler baseline dosyasından alınıyor (örneklemli toplama).")
+    features = df[['process_name'] + FEATURE_COLUMNS]
+else:
+    features = compute_features_frame(df, WINDOW, ALPHA)
 # 'process_name' sütununu sayısal bir formata (One-Hot Encoding) dönüştür
-features = pd.get_dummies(df, columns=['process_name'])
+features = pd.get_dummies(features, columns=['process_name'])
 
 print("Anomali tespit modeli eğitiliyor...")
 
@@ -24,8 +34,15 @@ model.fit(features)
 
 print("Model eğitimi tamamlandı.")
 
+# Uygulama başına skor eşikleri: tüm eğitim satırları tek seferde skorlanır, quantile'lar gruplanarak hesaplanır
+print("Uygulama bazlı skor eşikleri hesaplanıyor...")
+thresholds = compute_thresholds(model.score_samples(features), df['process_name'])
+print(f"{len(thresholds['apps'])} uygulama için ayrı eşik, diğerleri için genel eşik kullanılacak.")
+
 # Eğitilmiş modeli ve modelin öğrendiği sütunları kaydet
 joblib.dump(model, 'app_anomaly_model.joblib')
 joblib.dump(features.columns, 'model_columns.joblib')
+joblib.dump({'window': WINDOW, 'alpha': ALPHA}, 'feature_config.joblib')
+joblib.dump(thresholds, THRESHOLDS_FILE)
 
 print("Model ve sütun bilgileri başarıyla kaydedildi!")
\ No newline at end of file
@@ -0,0 +1,147 @@
+# unit_attribution.py
+# Attribute traffic to containers and systemd units instead of process names.
+# On servers `python` or `java` says little: the unit a PID runs in does. A PID's unit is
+# read once from /proc/<pid>/cgroup and cached for the PID's lifetime (callers prune the
+# cache with retain() as PIDs disappear from the connection map). Packets are still
+# counted per PID; aggregate() folds a tick's per-PID counters into per-unit rows in one
+# pass, and the unit label takes the place of the process name everywhere downstream
+# (baseline CSV, process_name_* model columns, thresholds, anomalies).
+#
+# Labels:  docker:<name or short id>, podman:<id>, containerd:<id>, crio:<id>, lxc:<name>,
+#          systemd:<unit>.service. PIDs in no such unit (desktop sessions, init.scope,
+#          non-Linux systems) keep their process name.
+import json
+import os
+import re
+
+from self_metrics import metrics
+
+ATTRIBUTION = 'process'   # 'process' = process names, 'unit' = container / systemd unit
+PROC_ROOT = '/proc'
+DOCKER_ROOT = '/var/lib/docker/containers'   # config.v2.json holds the container name
+
+_CONTAINER_PATTERNS = [
+    ('docker', re.compile(r'^docker[-/]?([0-9a-f]{12,64})(?:\.scope)?$')),
+    ('podman', re.compile(r'^libpod-([0-9a-f]{12,64})(?:\.scope)?$')),
+    ('containerd', re.compile(r'^cri-containerd-([0-9a-f]{12,64})(?:\.scope)?$')),
+    ('crio', re.compile(r'^crio-([0-9a-f]{12,64})(?:\.scope)?$')),
+    ('containerd', re.compile(r'^([0-9a-f]{64})$')),   # kubepods with the cgroupfs driver
+]
+_LXC = re.compile(r'^lxc(?:\.payload)?\.(.+)$')
+
+def cgroup_path(text):
+    """ Contents of /proc/<pid>/cgroup -> the unified (v2) or systemd (v1) hierarchy path. """
+    paths = {}
+    for line in text.splitlines():
+        parts = line.split(':', 2)
+        if len(parts) == 3:
+            paths[parts[1]] = parts[2]
+    for key in ('', 'name=systemd'):
+        if key in paths:
+            return paths[key]
+    return next(iter(paths.values()), None)
+
+def unit_from_path(path):
+    """ cgroup path -> (kind, identifier) for a container or systemd service, else None. """
+    if not path:
+        return None
+    parts = [p for p in path.split('/') if p]
+    # Containers first: a service running inside a container belongs to the container
+    for i, part in enumerate(parts):
+        if part in ('docker', 'lxc') and i + 1 < len(parts):
+            part = f"{part}-{parts[i + 1]}" if part == 'docker' else f"lxc.{parts[i + 1]}"
+        for kind, pattern in _CONTAINER_PATTERNS:
+            match = pattern.match(part)
+            if match:
+                return kind, match.group(1)
+        match = _LXC.match(part)
+        if match:
+            return 'lxc', match.group(1)
+    for part in reversed(parts):
+        if part.endswith('.service') and not part.startswith('user@'):
+            return 'systemd', part
+    return None
+
+class UnitResolver:
+    """ PID -> attribution label, cached for the PID's lifetime. """
+
+    def __init__(self, name_of, mode=ATTRIBUTION, proc_root=PROC_ROOT, docker_root=DOCKER_ROOT):
+        self.name_of = name_of      # pid -> process name (the fallback label)
+        self.mode = mode
+        self.proc_root = proc_root
+        self.docker_root = docker_root
+        self.cache = {}             # pid -> label
+        self.container_names = {}   # docker id -> name
+
+    def __len__(self):
+        return len(self.cache)
+
+    def label(self, pid):
+        label = self.cache.get(pid)
+        if label is None:
+            metrics.incr('unit_cache_miss')
+            label = (self.unit(pid) if self.mode == 'unit' else None) or self.name_of(pid)
+            self.cache[pid] = label
+        return label
+
+    def labels(self, pids):
+        return {pid: self.label(pid) for pid in pids}
+
+    def unit(self, pid):
+        """ Unit label of a PID, or None (host process, gone, or no /proc). """
+        try:
+            with open(os.path.join(self.proc_root, str(pid), 'cgroup')) as f:
+                unit = unit_from_path(cgroup_path(f.read()))
+        except OSError:
+            return None
+        if unit is None:
+            return None
+        kind, ident = unit
+        if kind == 'docker':
+            return f"docker:{self.docker_name(ident)}"
+        if kind in ('podman', 'containerd', 'crio'):
+            return f"{kind}:{ident[:12]}"
+        return f"{kind}:{ident}"
+
+    def docker_name(self, container_id):
+        """ Container name from Docker's state directory (needs root); short ID otherwise. """
+        name = self.container_names.get(container_id)
+        if name is None:
+            name = container_id[:12]
+            try:
+                with open(os.path.join(self.docker_root, container_id, 'config.v2.json')) as f:
+                    name = json.load(f).get('Name', '').lstrip('/') or name
+            except (OSError, ValueError):
+                pass
+            self.container_names[container_id] = name
+        return name
+
+    def retain(self, pids):
+        """ Forget PIDs that are gone, so a reused PID is looked up again. """
+        for pid in list(self.cache):  # list(): labels() may be filling the cache from an executor thread
+            if pid not in pids:
+                self.cache.pop(pid, None)
+        metrics.set_gauge('unit_cache_size', len(self.cache))
+
+def aggregate(snapshot, resolver, connections):
+    """
+    One tick of per-PID counters ({pid: {'up', 'down', 'up_var', 'down_var'}}) ->
+    [(label, {'up', 'down', 'up_var', 'down_var', 'connections', 'pids'})]: one row per
+    unit in 'unit' mode, one per PID in 'process' mode (the previous behaviour).
+    """
+    groups = {}
+    for pid, vals in snapshot.items():
+        label = resolver.label(pid)
+        key = label if resolver.mode == 'unit' else pid
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = (label, {'up': 0, 'down': 0, 'up_var': 0, 'down_var': 0,
+                                           'connections': 0, 'pids': []})
+        counters = group[1]
+        counters['up'] += vals['up']
+        counters['down'] += vals['down']
+        counters['up_var'] += vals.get('up_var', 0)
+        counters['down_var'] += vals.get('down_var', 0)
+        counters['connections'] += connections.get(pid, 0)
+        counters['pids'].append(pid)
+    return list(groups.values())
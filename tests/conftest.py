@@ -0,0 +1,5 @@
+# The modules live as flat files in src/ (the scripts import each other by name)
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,49 @@
+import os
+
+from anomaly_store import AnomalyStore
+
+def fill(store, n=30):
+    for i in range(n):
+        store.append(1000.0 + i, 'a' if i % 3 else 'b', 100 + i, 1.0, 2.0, -0.6, 'anomaly', ['10.0.0.1'])
+
+def test_query_in_memory_by_app_and_range():
+    store = AnomalyStore(capacity=100)
+    fill(store)
+    events = store.query('b', start=1003, end=1012)
+    assert [e.ts for e in events] == [1003.0, 1006.0, 1009.0, 1012.0]
+    assert [e.ts for e in store.query(limit=2)] == [1028.0, 1029.0]
+
+def test_query_reads_from_the_log_beyond_memory(tmp_path):
+    path = str(tmp_path / 'events.jsonl')
+    store = AnomalyStore(capacity=5, path=path)
+    fill(store)
+    assert len(store.events) == 5
+    events = store.query('b', start=1000, end=1010)
+    assert [e.ts for e in events] == [1000.0, 1003.0, 1006.0, 1009.0]
+    assert events[0].remotes == ['10.0.0.1']
+    store.close()
+    # The index is rebuilt from the log on restart
+    reopened = AnomalyStore(capacity=5, path=path)
+    assert [e.seq for e in reopened.query('b', start=1000, end=1010)] == [1, 4, 7, 10]
+    assert reopened.total == 30
+    reopened.close()
+
+def test_rotation_bounds_the_log_and_the_index(tmp_path):
+    path = str(tmp_path / 'events.jsonl')
+    store = AnomalyStore(capacity=5, path=path, segment_bytes=1000, max_segments=3)
+    fill(store, 200)
+    segments = [name for name in os.listdir(tmp_path) if name.startswith('events.jsonl')]
+    assert len(segments) <= 3
+    events = store.query()
+    assert len(events) < 200
+    assert events[-1].seq == 200
+    assert [e.seq for e in events] == list(range(events[0].seq, 201))  # oldest segments dropped whole
+    store.close()
+
+def test_timestamps_going_backwards_are_clamped(tmp_path):
+    store = AnomalyStore(capacity=10, path=str(tmp_path / 'events.jsonl'))
+    store.append(2000.0, 'a', 1, 0, 0, None, 'x')
+    store.append(1500.0, 'a', 1, 0, 0, None, 'x')  # wall clock stepped back
+    store.append(2001.0, 'a', 1, 0, 0, None, 'x')
+    assert [e.ts for e in store.query('a', start=2000)] == [2000.0, 2000.0, 2001.0]
+    store.close()
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app_features import FEATURE_COLUMNS, FeatureEngine, compute_features_frame
+
+def interleaved_frame(rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    apps = rng.choice(['firefox', 'curl', 'sshd', 'idle'], size=rows, p=[0.4, 0.3, 0.2, 0.1])
+    up = rng.exponential(50, rows) * (rng.random(rows) > 0.2)       # some exact zeros
+    down = rng.exponential(200, rows)
+    down[apps == 'idle'] = 0.01
+    return pd.DataFrame({'process_name': apps, 'upload_kbps': up, 'download_kbps': down,
+                         'connections': rng.integers(0, 20, rows)})
+
+@pytest.mark.parametrize('window, alpha', [(8, 0.3), (3, 0.7), (1, 1.0)])
+def test_live_and_vectorized_features_match(window, alpha):
+    df = interleaved_frame()
+    vectorized = compute_features_frame(df, window, alpha)
+    engine = FeatureEngine(window, alpha)
+    for i, row in enumerate(df.itertuples(index=False)):
+        live = engine.update(row.process_name, row.upload_kbps, row.download_kbps, row.connections)
+        expected = vectorized.iloc[i]
+        assert expected['process_name'] == row.process_name
+        for column in FEATURE_COLUMNS:
+            assert live[column] == pytest.approx(expected[column], rel=1e-6, abs=1e-6), (i, column)
+
+def test_missing_connections_column_defaults_to_zero():
+    df = interleaved_frame(20).drop(columns='connections')
+    assert (compute_features_frame(df)['connections'] == 0).all()
@@ -0,0 +1,11 @@
+import psutil
+
+import app_monitor
+
+def test_access_denied_ends_the_run_with_a_message(monkeypatch):
+    def denied(*args, **kwargs):
+        raise psutil.AccessDenied()
+
+    monkeypatch.setattr(app_monitor.psutil, 'net_connections', denied)
+    error = app_monitor.run(app_monitor.PlainRenderer(), interval=0.01)
+    assert error.startswith("Access denied while reading connections")
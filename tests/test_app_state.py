@@ -0,0 +1,30 @@
+import numpy as np
+
+from app_state import PidCounters
+
+def arrays(*values):
+    return [np.array(v, dtype=np.int64) for v in values]
+
+def test_diff_matches_pids_in_any_order():
+    previous = PidCounters.from_arrays(*arrays([30, 10, 20], [300, 100, 200], [3000, 1000, 2000]))
+    known, sent, recv = previous.diff(*arrays([20, 40, 10], [250, 999, 100], [2100, 999, 1500]))
+    assert known.tolist() == [True, False, True]
+    assert sent.tolist() == [50, 0, 0]
+    assert recv.tolist() == [100, 0, 500]
+
+def test_diff_clips_counter_resets_to_zero():
+    previous = PidCounters.from_arrays(*arrays([7], [5000], [5000]))
+    known, sent, recv = previous.diff(*arrays([7], [100], [6000]))  # PID reused: counters restarted
+    assert known.tolist() == [True]
+    assert sent.tolist() == [0]
+    assert recv.tolist() == [1000]
+
+def test_diff_against_empty_counters():
+    known, sent, recv = PidCounters().diff(*arrays([1, 2], [10, 20], [30, 40]))
+    assert not known.any()
+    assert sent.tolist() == recv.tolist() == [0, 0]
+
+def test_diff_pid_above_all_known():
+    previous = PidCounters.from_arrays(*arrays([1, 2], [10, 20], [10, 20]))
+    known, _, _ = previous.diff(*arrays([99], [1], [1]))
+    assert known.tolist() == [False]
@@ -0,0 +1,46 @@
+import time
+
+from baseline_sampler import BaselineSampler
+
+def at_hour(hour):
+    """ A timestamp at `hour` local time, so strata do not depend on the test machine's timezone. """
+    return time.mktime((2024, 3, 5, hour, 30, 0, 0, 0, -1))
+
+def fill(seed):
+    sampler = BaselineSampler(per_app=100, seed=seed)
+    for i in range(10000):
+        sampler.add({'process_name': 'chatty', 'i': i}, ts=at_hour(12))
+    for i in range(50):
+        sampler.add({'process_name': 'quiet', 'i': i}, ts=at_hour(12))
+    return sampler
+
+def test_reservoir_is_bounded_per_app_and_keeps_small_apps_whole():
+    sampler = fill(seed=1)
+    assert len(sampler) == 150
+    assert sampler.summary() == {'chatty': (10000, 100), 'quiet': (50, 50)}
+    kept = [row['i'] for row in sampler.rows() if row['process_name'] == 'chatty']
+    assert len(set(kept)) == 100
+    # A uniform sample spans the whole run, not just its start or end
+    assert min(kept) < 1000 and max(kept) > 9000
+    assert 3500 < sum(kept) / len(kept) < 6500
+
+def test_same_seed_gives_the_same_sample():
+    assert fill(seed=7).rows() == fill(seed=7).rows()
+    assert fill(seed=7).rows() != fill(seed=8).rows()
+
+def test_strata_keep_quiet_hours_represented():
+    sampler = BaselineSampler(per_app=100, strata=4, seed=3)
+    for i in range(5000):
+        sampler.add(('day', i), ts=at_hour(14), app='firefox')   # busy afternoon
+    for i in range(10):
+        sampler.add(('night', i), ts=at_hour(3), app='firefox')   # a few night-time rows
+    assert sampler.summary() == {'firefox': (5010, 35)}
+    assert [row for row in sampler.rows() if row[0] == 'night'] == [('night', i) for i in range(10)]
+
+def test_save_csv_writes_the_sample(tmp_path):
+    sampler = fill(seed=1)
+    path = str(tmp_path / 'baseline.csv')
+    assert sampler.save_csv(path, columns=['process_name', 'i']) == 150
+    assert not (tmp_path / 'baseline.csv.tmp').exists()
+    with open(path) as f:
+        assert f.readline().strip() == 'process_name,i'
@@ -0,0 +1,84 @@
+import ipaddress
+import random
+import threading
+
+import pytest
+
+from endpoint_enrichment import EndpointDatabase, EndpointEnricher
+
+DATABASE = """
+# hosts style and CIDR ranges, nested on purpose
+8.8.8.8          dns.google
+10.0.0.0/8,corp,Example Corp
+10.20.0.0/16,build-farm
+10.20.5.0/24,ci-runners
+10.20.5.128/25,ci-gpu
+10.30.0.0/16,lab
+2001:db8::/32,docs6
+2001:db8:1::/48,docs6-inner
+not-an-address   ignored
+"""
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / 'endpoints.txt'
+    path.write_text(DATABASE)
+    return EndpointDatabase(str(path))
+
+@pytest.mark.parametrize('ip, name', [
+    ('8.8.8.8', 'dns.google'),
+    ('10.20.5.200', 'ci-gpu'),
+    ('10.20.5.9', 'ci-runners'),
+    ('10.20.6.1', 'build-farm'),
+    ('10.30.0.1', 'lab'),
+    ('10.40.0.1', 'corp'),       # after two closed sibling blocks
+    ('10.255.255.255', 'corp'),
+    ('2001:db8:1::5', 'docs6-inner'),
+    ('2001:db8:2::5', 'docs6'),
+])
+def test_lookup_returns_the_most_specific_block(database, ip, name):
+    assert database.lookup(ip)[0] == name
+
+@pytest.mark.parametrize('ip', ['9.255.255.255', '11.0.0.0', '192.168.1.1', '2001:db9::1', 'garbage'])
+def test_lookup_misses(database, ip):
+    assert database.lookup(ip) is None
+
+def test_lookup_organisation(database):
+    assert database.lookup('10.1.2.3') == ('corp', 'Example Corp')
+
+def test_lookup_matches_a_linear_scan_on_random_nested_blocks(tmp_path):
+    rng = random.Random(3)
+    lines, networks = [], []
+    for i in range(300):
+        net = ipaddress.ip_network((rng.getrandbits(32) & 0x0FFFFFFF | 0x0A000000, rng.randint(8, 28)), strict=False)
+        lines.append(f"{net},n{i}")
+        networks.append((net, f"n{i}"))
+    path = tmp_path / 'random.txt'
+    path.write_text("\n".join(lines))
+    database = EndpointDatabase(str(path))
+    for _ in range(2000):
+        ip = ipaddress.ip_address(rng.getrandbits(32) & 0x0FFFFFFF | 0x0A000000)
+        covering = [(net.prefixlen, i, name) for i, (net, name) in enumerate(networks) if ip in net]
+        expected = max(covering)[2] if covering else None  # longest prefix, last line on a tie
+        found = database.lookup(str(ip))
+        assert (found[0] if found else None) == expected
+
+def test_enricher_without_database_file_raises(tmp_path):
+    with pytest.raises(OSError):
+        EndpointEnricher(str(tmp_path / 'missing.txt'), dns=False)
+
+def test_enricher_resolves_in_the_background(database):
+    resolved = threading.Event()
+    enricher = EndpointEnricher(database, resolver=lambda ip: 'host.example' if ip == '1.2.3.4' else None,
+                                on_resolved=lambda endpoint: resolved.set())
+    try:
+        assert enricher.get('1.2.3.4') is None  # a miss never blocks
+        assert resolved.wait(5)
+        assert enricher.get('1.2.3.4').host == 'host.example'
+        assert enricher.describe('1.2.3.4') == 'host.example (1.2.3.4)'
+        resolved.clear()
+        enricher.get('10.20.5.9')
+        assert resolved.wait(5)
+        assert enricher.peek('10.20.5.9').source == 'db'
+    finally:
+        enricher.close()
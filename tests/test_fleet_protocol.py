@@ -0,0 +1,88 @@
+import io
+import struct
+
+import pytest
+
+import fleet_protocol as proto
+from fleet_protocol import ProtocolError
+
+def split(frame):
+    length, kind = struct.unpack_from('!IB', frame)
+    assert len(frame) == 5 + length
+    return kind, frame[5:]
+
+def test_batch_roundtrip():
+    ticks = [(1000.5, [('firefox', 12.5, 300.25, 4), ('curl', 0.5, 0.0, 1)]),
+             (1002.5, [('firefox', 1.0, 2.0, 70000)])]
+    kind, payload = split(proto.encode_batch(ticks))
+    assert kind == proto.BATCH
+    assert proto.decode_batch(payload) == [
+        (1000.5, 'firefox', 12.5, 300.25, 4),
+        (1000.5, 'curl', 0.5, 0.0, 1),
+        (1002.5, 'firefox', 1.0, 2.0, 65535),  # connections saturate at 16 bits
+    ]
+
+def test_batch_sends_each_app_name_once():
+    one = proto.encode_batch([(0.0, [('a-rather-long-process-name', 1, 1, 1)])])
+    two = proto.encode_batch([(0.0, [('a-rather-long-process-name', 1, 1, 1)] * 2)])
+    assert len(two) - len(one) == 12
+
+def test_batch_with_bad_name_index_is_a_protocol_error():
+    _, payload = split(proto.encode_batch([(0.0, [('a', 1, 1, 1)])]))
+    # Rewrite the row's app index (first field after the name table and tick header) to 5
+    row = 2 + 1 + 1 + 2 + 10
+    bad = payload[:row] + struct.pack('!H', 5) + payload[row + 2:]
+    with pytest.raises(ProtocolError):
+        proto.decode_batch(bad)
+
+@pytest.mark.parametrize('keep', [0, 1, 4, 12, 16, 30, -1])
+def test_truncated_batch_is_a_protocol_error(keep):
+    # cuts inside the name table, the tick count, the tick header and the rows
+    _, payload = split(proto.encode_batch([(0.0, [('app', 1, 2, 3), ('other', 4, 5, 6)])]))
+    with pytest.raises(ProtocolError):
+        proto.decode_batch(payload[:keep])
+
+def test_hello_roundtrip_and_version_check():
+    _, payload = split(proto.encode_hello('web-01'))
+    assert proto.decode_hello(payload) == 'web-01'
+    with pytest.raises(ProtocolError):
+        proto.decode_hello(bytes([proto.PROTOCOL_VERSION + 1]) + payload[1:])
+
+def test_model_is_only_accepted_with_the_right_key():
+    key = b'k' * 32
+    _, payload = split(proto.encode_model(7, b'bundle-bytes', key))
+    assert proto.decode_model(payload, key) == (7, b'bundle-bytes')
+    with pytest.raises(ProtocolError):
+        proto.decode_model(payload, b'x' * 32)
+    with pytest.raises(ProtocolError):
+        proto.decode_model(payload, None)
+    tampered = payload[:-1] + b'!'
+    with pytest.raises(ProtocolError):
+        proto.decode_model(tampered, key)
+
+def test_up_to_date_model_needs_no_key():
+    _, payload = split(proto.encode_model(3))
+    assert proto.decode_model(payload, None) == (3, b'')
+    with pytest.raises(ProtocolError):
+        proto.encode_model(3, b'bundle', None)
+
+def test_load_key_hex_or_text(tmp_path, monkeypatch):
+    monkeypatch.delenv(proto.KEY_ENV, raising=False)
+    path = tmp_path / 'fleet.key'
+    assert proto.load_key(str(path)) is None
+    path.write_text('00ff10\n')
+    assert proto.load_key(str(path)) == b'\x00\xff\x10'
+    monkeypatch.setenv(proto.KEY_ENV, 'not hex')
+    assert proto.load_key(str(path)) == b'not hex'
+
+def test_read_frame_rejects_oversized_frames():
+    class Sock:
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def recv(self, size):
+            return self.data.read(size)
+
+    assert proto.read_frame(Sock(proto.encode_ack(42))) == (proto.ACK, struct.pack('!I', 42))
+    with pytest.raises(ProtocolError):
+        proto.read_frame(Sock(struct.pack('!IB', proto.MAX_FRAME + 1, proto.MODEL)))
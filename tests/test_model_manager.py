@@ -0,0 +1,120 @@
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+
+import model_manager
+from app_features import FEATURE_COLUMNS
+from model_manager import ModelManager, SETTLE_TIME
+from prediction_cache import PredictionCache
+from score_thresholds import THRESHOLDS_FILE
+
+COLUMNS = FEATURE_COLUMNS + ['process_name_app']
+
+def write_bundle(directory, cutoff, seed=0, mtime=None):
+    """ A tiny model bundle; every app uses `cutoff` (scores are in (-1, 0), so 0 flags everything). """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.random((64, len(COLUMNS))), columns=COLUMNS)
+    joblib.dump(IsolationForest(n_estimators=5, random_state=seed).fit(frame), os.path.join(directory, model_manager.MODEL_FILE))
+    joblib.dump(COLUMNS, os.path.join(directory, model_manager.COLUMNS_FILE))
+    joblib.dump({'window': 8, 'alpha': 0.3}, os.path.join(directory, model_manager.CONFIG_FILE))
+    joblib.dump({'levels': {'p99': 0.01}, 'global': {'p99': cutoff}, 'apps': {}},
+                os.path.join(directory, THRESHOLDS_FILE))
+    if mtime is not None:
+        for name in model_manager.MODEL_FILES:
+            os.utime(os.path.join(directory, name), ns=(mtime, mtime))
+
+def rows(n=20):
+    rng = np.random.default_rng(1)
+    return [('app', dict(zip(FEATURE_COLUMNS, rng.random(len(FEATURE_COLUMNS))))) for _ in range(n)]
+
+@pytest.fixture
+def dirs(tmp_path):
+    active, candidate = str(tmp_path / 'active'), str(tmp_path / 'candidate')
+    write_bundle(active, cutoff=-1.0, mtime=1_000_000_000)  # never anomalous
+    return active, candidate
+
+def test_half_written_bundle_waits_for_settle_time(dirs):
+    active, _ = dirs
+    manager = ModelManager(active)
+    first = manager.load()
+    # A writer replaces the files one by one: the model first, the rest a moment later
+    joblib.dump('not a model yet', os.path.join(active, model_manager.MODEL_FILE))
+    manager.check(now=100.0)
+    write_bundle(active, cutoff=-1.0, seed=2, mtime=2_000_000_000)
+    manager.check(now=101.0)                       # signature changed again: the clock restarts
+    manager.check(now=101.0 + SETTLE_TIME - 0.1)
+    assert manager.poll() is None
+    manager.check(now=101.0 + SETTLE_TIME)
+    reloaded = manager.poll()
+    assert reloaded is not None and reloaded is manager.active
+    assert reloaded.version > first.version
+
+def test_unloadable_bundle_keeps_the_running_model(dirs):
+    active, _ = dirs
+    manager = ModelManager(active)
+    first = manager.load()
+    with open(os.path.join(active, model_manager.MODEL_FILE), 'wb') as f:
+        f.write(b'truncated')
+    manager.check(now=0.0)
+    manager.check(now=SETTLE_TIME)
+    assert manager.poll() is None
+    assert manager.active is first
+
+def test_changed_candidate_goes_to_the_shadow_slot(dirs):
+    active, candidate = dirs
+    manager = ModelManager(active, candidate)
+    first = manager.load()
+    assert manager.candidate is None
+    write_bundle(candidate, cutoff=0.0, seed=3)
+    manager.check(now=0.0)
+    manager.check(now=SETTLE_TIME)
+    assert manager.poll() is None                  # the active model does not change
+    assert manager.active is first
+    assert manager.candidate is not None and manager.candidate.directory == candidate
+
+def test_low_agreement_keeps_the_old_model(dirs):
+    active, candidate = dirs
+    write_bundle(candidate, cutoff=0.0, seed=3)    # flags every row the active model passes
+    manager = ModelManager(active, candidate)
+    first = manager.load()
+    manager.shadow(rows())
+    deadline = time.monotonic() + 10
+    while manager.stats.rows < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    manager.stop()
+    report = manager.report()
+    assert report['rows'] == 20
+    assert report['agreement'] == 0.0
+    assert report['active_anomaly_rate'] == 0.0 and report['candidate_anomaly_rate'] == 1.0
+    manager.check(now=0.0)
+    manager.check(now=SETTLE_TIME)
+    assert manager.poll() is None and manager.active is first  # shadow results never switch models
+
+def test_promotion_swaps_models_and_invalidates_the_cache(dirs):
+    pytest.importorskip('tkinter')  # dashboard.py imports it at module level
+    import dashboard
+    active, candidate = dirs
+    write_bundle(candidate, cutoff=0.0, seed=3)
+    manager = ModelManager(active, candidate)
+    manager.load()
+    dash = dashboard.NetworkMonitorDashboard.__new__(dashboard.NetworkMonitorDashboard)
+    dash.feature_engine = dashboard.FeatureEngine()
+    dash.prediction_cache = PredictionCache()
+    dash.apply_model(manager.active)
+    dash.prediction_cache.put(dash.prediction_cache.key('app', rows(1)[0][1]), -0.4)
+
+    manager.promote()
+    assert manager.candidate is None
+    manager.check(now=0.0)
+    manager.check(now=SETTLE_TIME)
+    bundle = manager.poll()
+    assert bundle is manager.active and bundle.thresholds.threshold('app') == 0.0
+    dash.apply_model(bundle)
+    assert dash.thresholds is bundle.thresholds
+    assert len(dash.prediction_cache.entries) == 0
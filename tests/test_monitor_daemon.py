@@ -0,0 +1,58 @@
+import csv
+import json
+import threading
+
+from monitor_daemon import MonitorDaemon, DaemonSubscriber, PERSIST_COLUMNS
+
+def tick_line(*apps):
+    """ A tick as MonitorDaemon.broadcast() puts it on the wire. """
+    return json.dumps({'type': 'tick', 'ts': 1700000000.0, 'elapsed': 2.0, 'interfaces': {}, 'apps': [
+        {'pid': pid, 'pids': [pid], 'name': name, 'up_bytes': up, 'down_bytes': down,
+         'up_kbps': up / 2048.0, 'down_kbps': down / 2048.0, 'connections': conns, 'status': 'ok'}
+        for pid, name, up, down, conns in apps]}) + "\n"
+
+def subscriber(on_tick=None):
+    """ DaemonSubscriber without its connect thread. """
+    sub = DaemonSubscriber.__new__(DaemonSubscriber)
+    sub.on_tick = on_tick
+    sub.lock = threading.Lock()
+    sub.totals = {}
+    return sub
+
+def test_subscriber_accumulates_ticks_per_label():
+    received = []
+    sub = subscriber(received.append)
+    sub._apply(json.loads(tick_line((10, 'firefox', 1000, 5000, 3), (20, 'python', 10, 20, 1),
+                                    (21, 'python', 30, 40, 2))))
+    sub._apply(json.loads(tick_line((11, 'firefox', 500, 500, 1))))
+    stats = {row['name']: row for row in sub.io_stats().values()}
+    # Bytes are cumulative; connections are the latest tick's; keys are stable per label
+    assert stats['firefox'] == {'key': 1, 'pid': 11, 'name': 'firefox',
+                                'bytes_sent': 1500, 'bytes_recv': 5500, 'connections': 1}
+    assert stats['python'] == {'key': 2, 'pid': 21, 'name': 'python',
+                               'bytes_sent': 40, 'bytes_recv': 60, 'connections': 0}
+    assert len(received) == 2 and received[1]['apps'][0]['pid'] == 11
+
+def daemon(path):
+    d = MonitorDaemon.__new__(MonitorDaemon)
+    d.persist_path = str(path)
+    return d
+
+def read(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+def test_append_csv_writes_header_once(tmp_path):
+    d = daemon(tmp_path / 'baseline.csv')
+    d._append_csv([('firefox', 1.5, 2.5, 3)])
+    d._append_csv([('python', 0.5, 0.0, 1)])
+    assert read(d.persist_path) == [PERSIST_COLUMNS, ['firefox', '1.5', '2.5', '3'], ['python', '0.5', '0.0', '1']]
+
+def test_append_csv_upgrades_old_header(tmp_path):
+    path = tmp_path / 'baseline.csv'
+    path.write_text("process_name,upload_kbps,download_kbps\nfirefox,1.5,2.5\nsshd,0.1,0.2\n")
+    d = daemon(path)
+    d._append_csv([('python', 0.5, 0.0, 1)])
+    assert read(path) == [PERSIST_COLUMNS, ['firefox', '1.5', '2.5', '0'], ['sshd', '0.1', '0.2', '0'],
+                          ['python', '0.5', '0.0', '1']]
+    assert not (tmp_path / 'baseline.csv.tmp').exists()
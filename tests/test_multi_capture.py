@@ -0,0 +1,63 @@
+import os
+from collections import namedtuple
+
+import pytest
+
+import multi_capture
+from multi_capture import DuplicateFilter, MultiCapture, list_interfaces, resolve_interfaces
+
+scapy = pytest.importorskip('scapy.all')
+
+IfStats = namedtuple('IfStats', ['isup', 'flags'])
+
+def ip_packet(ident, dst='93.184.216.34'):
+    """ A packet as a capture delivers it: built, so len and chksum are set. """
+    return scapy.IP(bytes(scapy.IP(src='10.0.0.2', dst=dst, id=ident) / scapy.TCP(sport=40000, dport=443) / (b'x' * 10)))
+
+def test_packet_seen_on_two_interfaces_is_counted_once():
+    received = []
+    capture = MultiCapture(lambda pkt, weight: received.append(pkt[scapy.IP].id), ['eth-a', 'eth-b'])
+    a, b = capture.workers
+    for ident in range(5):
+        capture._on_packet(a, ip_packet(ident))
+        capture._on_packet(b, ip_packet(ident))  # same packet, captured again on the other interface
+    assert received == [0, 1, 2, 3, 4]
+    assert (a.packets, b.packets, b.duplicates) == (5, 5, 5)
+
+def test_repeats_on_the_same_interface_or_after_the_window_count():
+    dedup = DuplicateFilter(window=0.05)
+    fingerprint = multi_capture.packet_fingerprint(ip_packet(7))
+    assert not dedup.seen(fingerprint, 'eth-a', now=0.0)
+    assert not dedup.seen(fingerprint, 'eth-a', now=0.01)  # a retransmission, not a duplicate
+    assert dedup.seen(fingerprint, 'eth-b', now=0.02)
+    assert not dedup.seen(fingerprint, 'eth-b', now=1.0)   # remembered for `window` only
+    assert not dedup.seen(None, 'eth-b', now=1.0)          # non-IP frames are never deduplicated
+
+def test_single_interface_has_no_dedup():
+    assert MultiCapture(lambda pkt, weight: None, ['eth-a']).dedup is None
+
+def test_list_interfaces_skips_loopback_and_down(monkeypatch):
+    stats = {
+        'lo': IfStats(True, 'up,loopback,running'),
+        'eth0': IfStats(True, 'up,broadcast,running'),
+        'wlan0': IfStats(False, 'broadcast'),
+        'lo0': IfStats(True, ''),              # no flags (older psutil / Windows): by name
+        'Loopback Pseudo-Interface 1': IfStats(True, ''),
+        'tun0': IfStats(True, ''),
+    }
+    import psutil
+    monkeypatch.setattr(psutil, 'net_if_stats', lambda: stats)
+    assert list_interfaces() == ['eth0', 'tun0']
+    assert 'lo' in list_interfaces(include_loopback=True)
+
+def test_resolve_interfaces_drops_bridge_members_and_keeps_unknown_names(tmp_path):
+    sysfs = tmp_path / 'net'
+    for name in ('br0', 'eth0', 'eth1'):
+        (sysfs / name).mkdir(parents=True)
+    os.symlink(sysfs / 'br0', sysfs / 'eth0' / 'master')
+    names, covered = resolve_interfaces('br0, eth0,eth1,tun-later', str(sysfs))
+    # eth0 is covered by br0; an unknown name is kept so its worker can retry until it appears
+    assert names == ['br0', 'eth1', 'tun-later']
+    assert covered == {'eth0': 'br0'}
+    assert resolve_interfaces(['eth0'], str(sysfs)) == (['eth0'], {})  # master not captured
+    assert resolve_interfaces(None) == ([None], {})
@@ -0,0 +1,92 @@
+import pytest
+
+import notifications
+from notifications import NotificationDispatcher, TokenBucket
+from self_metrics import metrics
+
+class RecordingSink:
+    name = 'recording'
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, title, message, events):
+        self.sent.append((title, message, [e['app'] for e in events]))
+
+class FailingSink:
+    name = 'failing'
+
+    def send(self, title, message, events):
+        raise OSError("relay down")
+
+def event(app):
+    return {'ts': 0.0, 'app': app, 'message': 'anomaly'}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(notifications.time, 'monotonic', lambda: now[0])
+    return now
+
+def counter(name):
+    return metrics.snapshot()['counters'].get(name, 0)
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(rate=0.5, capacity=2, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [True, True, False]
+    assert not bucket.take(1.0)
+    assert bucket.take(2.0)            # one token back after 1 / rate seconds
+    assert bucket.take(100.0) and bucket.take(100.0) and not bucket.take(100.0)  # capped at capacity
+
+def test_burst_is_coalesced_into_one_digest(clock):
+    sink = RecordingSink()
+    dispatcher = NotificationDispatcher([sink], app_burst=5)
+    dispatcher._dispatch([event('a'), event('b'), event('a')])
+    assert len(sink.sent) == 1
+    assert sink.sent[0][1] == "3 anomalies from 2 apps: a, b"
+    dispatcher._dispatch([event('c')])
+    assert sink.sent[1][1] == "c - anomaly"
+
+def test_suppressed_events_are_reported_with_the_next_notification(clock):
+    sink = RecordingSink()
+    dispatcher = NotificationDispatcher([sink], app_rate=0.0, app_burst=1)
+    dispatcher._dispatch([event('a'), event('a'), event('a'), event('b')])
+    assert sink.sent == [("🚨 Network Anomaly Detected!", "2 anomalies from 2 apps: a, b (+2 suppressed from 1 apps)",
+                          ['a', 'b'])]
+    assert dispatcher.suppressed == {}
+
+def test_fully_suppressed_window_still_sends_a_digest(clock):
+    sink = RecordingSink()
+    dispatcher = NotificationDispatcher([sink], app_rate=0.0, app_burst=1)
+    dispatcher._dispatch([event('a')])
+    dispatcher._dispatch([event('a'), event('a')])   # every event rate-limited
+    assert len(sink.sent) == 2
+    assert sink.sent[1][1] == "2 anomalies suppressed by the rate limit from 1 apps: a (2)"
+    assert sink.sent[1][2] == []
+    dispatcher._dispatch([])                          # nothing new held back: stay quiet
+    assert len(sink.sent) == 2
+
+def test_failing_sink_does_not_stop_the_others(clock, capsys):
+    sink = RecordingSink()
+    errors = counter('notify_sink_errors')
+    dispatcher = NotificationDispatcher([FailingSink(), sink])
+    dispatcher._dispatch([event('a')])
+    assert len(sink.sent) == 1 and dispatcher.sent == 1
+    assert counter('notify_sink_errors') == errors + 1
+    assert "relay down" in capsys.readouterr().out
+
+def test_full_queue_drops_without_blocking():
+    dropped = counter('notify_dropped')
+    dispatcher = NotificationDispatcher([RecordingSink()], max_pending=2)  # worker not started
+    for _ in range(5):
+        dispatcher.notify('a', 'anomaly')
+    assert dispatcher.queue.qsize() == 2
+    assert counter('notify_dropped') == dropped + 3
+
+def test_worker_coalesces_and_flushes_on_stop():
+    sink = RecordingSink()
+    dispatcher = NotificationDispatcher([sink], coalesce_window=0.2, app_burst=10).start()
+    for app in ('a', 'b', 'c'):
+        dispatcher.notify(app, 'anomaly', pid=1)
+    dispatcher.stop()
+    assert [apps for _, _, apps in sink.sent] == [['a', 'b', 'c']]
@@ -0,0 +1,53 @@
+import random
+
+from packet_sampling import PacketSampler, confidence_interval, variance_term
+
+def test_rate_one_keeps_every_packet():
+    sampler = PacketSampler(1)
+    assert [sampler.sample() for _ in range(10)] == [1] * 10
+
+def test_count_mode_keeps_every_nth_with_weight_n():
+    sampler = PacketSampler(4, mode='count')
+    weights = [sampler.sample() for _ in range(12)]
+    assert weights == [0, 0, 0, 4] * 3
+
+def test_random_mode_estimate_is_unbiased():
+    sampler = PacketSampler(8, mode='random', seed=1)
+    rng = random.Random(2)
+    sizes = [rng.randint(60, 1500) for _ in range(200000)]
+    estimate = variance = 0
+    for size in sizes:
+        weight = sampler.sample()
+        if weight:
+            estimate += size * weight
+            variance += variance_term(size, weight)
+    true_total = sum(sizes)
+    assert abs(estimate - true_total) <= confidence_interval(variance) * 1.5
+    assert abs(estimate - true_total) / true_total < 0.03
+
+def test_unsampled_traffic_has_no_interval():
+    assert variance_term(1500, 1) == 0
+    assert confidence_interval(0) == 0.0
+
+def test_cpu_budget_reads_clocks_rarely_and_adapts(monkeypatch):
+    import packet_sampling
+    clock = {'wall': 0.0, 'cpu': 0.0, 'wall_reads': 0, 'cpu_reads': 0}
+
+    def monotonic():
+        clock['wall_reads'] += 1
+        return clock['wall']
+
+    def thread_time():
+        clock['cpu_reads'] += 1
+        return clock['cpu']
+
+    monkeypatch.setattr(packet_sampling.time, 'monotonic', monotonic)
+    monkeypatch.setattr(packet_sampling.time, 'thread_time', thread_time)
+    sampler = PacketSampler(1, cpu_budget=0.25, adjust_every=1.0)
+    for _ in range(15000):
+        clock['wall'] += 0.0001   # 10k packets/s
+        clock['cpu'] += 0.0001    # using a full core
+        sampler.sample()
+    assert clock['wall_reads'] <= 15000 // packet_sampling.CHECK_EVERY + 1
+    assert clock['cpu_reads'] <= 2
+    assert sampler.rate == 4      # load 1.0 against a 0.25 budget
@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+from prediction_cache import EPSILON, RELATIVE_ERROR, PredictionCache, quantize
+
+def bucket_width(value):
+    """ Span of values sharing value's bucket, measured by scanning. """
+    bucket = quantize(value)
+    step = value * 1e-4
+    lo = hi = value
+    while quantize(lo - step) == bucket:
+        lo -= step
+    while quantize(hi + step) == bucket:
+        hi += step
+    return hi - lo
+
+def test_zero_and_sign():
+    assert quantize(0.0) == 0
+    assert quantize(1e-9) == 0
+    assert quantize(-3.7) == -quantize(3.7)
+    assert quantize(3.7) > 0 > quantize(-3.7)
+
+@pytest.mark.parametrize('value', [0.1, 1.0, 100.0, 10000.0])
+def test_buckets_are_relative_above_epsilon(value):
+    # ~5% of the value at idle rates too (log1p(x) buckets would be ~55% wide at 0.1 KB/s)
+    width = bucket_width(value)
+    assert width / value == pytest.approx(RELATIVE_ERROR * (1 + EPSILON / value), rel=0.05)
+
+def test_bucket_edges():
+    # The edge between buckets k and k+1 sits at log1p(x / EPSILON) * SCALE = k + 0.5
+    k = quantize(1.0)
+    edge = EPSILON * math.expm1((k + 0.5) * math.log1p(RELATIVE_ERROR))
+    assert quantize(edge * (1 - 1e-9)) == k
+    assert quantize(edge * (1 + 1e-9)) == k + 1
+    assert quantize(1.0) != quantize(1.0 * (1 + 2 * RELATIVE_ERROR))
+
+def test_key_uses_only_the_configured_features():
+    cache = PredictionCache(('upload_kbps', 'connections'))
+    a = cache.key('app', {'upload_kbps': 50.0, 'connections': 3, 'down_std': 1.0})
+    b = cache.key('app', {'upload_kbps': 50.5, 'connections': 3, 'down_std': 9.0})
+    assert a == b
+    assert a != cache.key('other', {'upload_kbps': 50.0, 'connections': 3})
+    assert a != cache.key('app', {'upload_kbps': 50.0, 'connections': 4})
+
+def test_lru_eviction_at_maxsize():
+    cache = PredictionCache(maxsize=2)
+    cache.put('a', -0.1)
+    cache.put('b', -0.2)
+    assert cache.get('a') == -0.1   # 'a' is now the most recently used
+    cache.put('c', -0.3)
+    assert cache.get('b') is None
+    assert cache.get('a') == -0.1 and cache.get('c') == -0.3
+    assert len(cache.entries) == 2
+
+def test_invalidate_clears_and_switches_features():
+    cache = PredictionCache(('upload_kbps',))
+    key = cache.key('app', {'upload_kbps': 1.0, 'up_std': 2.0})
+    cache.put(key, -0.5)
+    cache.invalidate(['upload_kbps', 'up_std'])
+    assert cache.get(key) is None
+    assert cache.feature_names == ('upload_kbps', 'up_std')
+    assert len(cache.key('app', {'upload_kbps': 1.0, 'up_std': 2.0})) == 3
+
+def test_hit_rate():
+    cache = PredictionCache()
+    assert cache.hit_rate == 0.0
+    cache.put('k', -0.4)
+    cache.get('k')
+    cache.get('k')
+    cache.get('missing')
+    assert cache.hit_rate == pytest.approx(2 / 3)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from score_thresholds import ThresholdTable, compute_thresholds
+
+def table():
+    rng = np.random.default_rng(0)
+    scores = np.concatenate([rng.normal(-0.40, 0.02, 1000), rng.normal(-0.60, 0.05, 1000), [-0.5] * 5])
+    apps = ['steady'] * 1000 + ['noisy'] * 1000 + ['rare'] * 5
+    return compute_thresholds(scores, apps), scores
+
+def test_compute_thresholds_per_app_quantiles():
+    t, scores = table()
+    assert set(t['apps']) == {'steady', 'noisy'}  # 'rare' has fewer than MIN_APP_SAMPLES rows
+    assert t['apps']['steady']['p99'] == pytest.approx(np.quantile(scores[:1000], 0.01))
+    assert t['apps']['steady']['p999'] < t['apps']['steady']['p99']
+    assert t['apps']['noisy']['count'] == 1000
+    assert t['global']['p99'] == pytest.approx(np.quantile(scores, 0.01))
+
+def test_is_anomaly_uses_each_apps_cutoff():
+    t, _ = table()
+    thresholds = ThresholdTable(t, fallback=-0.5)
+    # -0.5 is far below normal for 'steady' but ordinary for 'noisy'
+    assert thresholds.is_anomaly('steady', -0.5)
+    assert not thresholds.is_anomaly('noisy', -0.5)
+    assert thresholds.threshold('rare') == t['global']['p99']
+
+def test_sensitivity_override():
+    t, _ = table()
+    thresholds = ThresholdTable(t, sensitivity={'noisy': 'p999', 'rare': 'p999'})
+    assert thresholds.threshold('noisy') == t['apps']['noisy']['p999']
+    assert thresholds.threshold('rare') == t['global']['p999']
+    assert thresholds.threshold('steady') == t['apps']['steady']['p99']
+
+def test_without_table_falls_back_to_model_cutoff():
+    thresholds = ThresholdTable(None, fallback=-0.5)
+    assert thresholds.threshold('anything') == -0.5
+    assert thresholds.is_anomaly('anything', -0.51)
+    assert not thresholds.is_anomaly('anything', -0.49)
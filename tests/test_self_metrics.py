@@ -0,0 +1,55 @@
+import threading
+
+from self_metrics import Metrics
+
+THREADS = 8
+PER_THREAD = 5000
+
+def run_threads(target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def test_counts_from_several_threads_are_merged():
+    m = Metrics()
+    def work(i):
+        for _ in range(PER_THREAD):
+            m.incr('packets_seen')
+        m.incr('packets_attributed', PER_THREAD // 2)
+        m.observe('parse', 0.001 * (i + 1))
+    run_threads(work)
+    m.incr('packets_seen')   # the reading thread's own shard counts too
+
+    stats = m.snapshot()
+    assert stats['counters'] == {'packets_seen': THREADS * PER_THREAD + 1,
+                                 'packets_attributed': THREADS * PER_THREAD // 2}
+    assert len(m._shards) == THREADS + 1   # shards of finished threads are kept
+    parse = stats['timers']['parse']
+    assert parse['count'] == THREADS
+    assert abs(parse['max_ms'] - THREADS) < 1e-9
+    assert abs(parse['avg_ms'] - (THREADS + 1) / 2) < 1e-9
+
+def test_prometheus_text():
+    m = Metrics()
+    run_threads(lambda i: [m.incr('packets_seen') for _ in range(PER_THREAD)])
+    m.set_gauge('clients', 2)
+    m.observe('tick', 0.25)
+    m.observe('tick', 0.5)
+    lines = m.prometheus_text().splitlines()
+
+    assert lines[0] == "# TYPE netmon_uptime_seconds gauge"
+    assert lines[1].startswith("netmon_uptime_seconds ")
+    assert lines[2:] == [
+        "# TYPE netmon_packets_seen_total counter",
+        f"netmon_packets_seen_total {THREADS * PER_THREAD}",
+        "# TYPE netmon_clients gauge",
+        "netmon_clients 2",
+        "# TYPE netmon_tick_seconds summary",
+        "netmon_tick_seconds_count 2",
+        "netmon_tick_seconds_sum 0.750000",
+        "# TYPE netmon_tick_seconds_max gauge",
+        "netmon_tick_seconds_max 0.500000",
+    ]
+    assert m.prometheus_text(prefix="x").startswith("# TYPE x_uptime_seconds gauge\n")
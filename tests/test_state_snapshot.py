@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import state_snapshot
+from app_features import FeatureEngine
+
+def sections():
+    return {
+        'seen_unknown': ['evil.exe', 'ünïcode'],
+        'empty': [],
+        'pid_pids': np.array([3, 1, 2], dtype=np.int64),
+        'ports': np.array([80, 443], dtype=np.uint16),
+        'total_upload_mb': 12.5,
+    }
+
+def test_roundtrip():
+    snapshot = state_snapshot.decode(state_snapshot.encode(sections(), saved_at=1000.0, boot=50.0))
+    assert snapshot.saved_at == 1000.0 and snapshot.boot_time == 50.0
+    s = snapshot.sections
+    assert s['seen_unknown'] == ['evil.exe', 'ünïcode']
+    assert s['empty'] == []
+    assert s['pid_pids'].tolist() == [3, 1, 2] and s['pid_pids'].dtype == np.int64
+    assert s['ports'].dtype == np.uint16
+    assert s['total_upload_mb'] == 12.5
+    s['pid_pids'][0] = 9  # restored arrays are writable copies
+
+def test_corruption_is_rejected(tmp_path):
+    blob = bytearray(state_snapshot.encode(sections(), boot=0.0))
+    blob[20] ^= 0xFF
+    with pytest.raises(state_snapshot.SnapshotError):
+        state_snapshot.decode(bytes(blob))
+    path = tmp_path / 'state.bin'
+    path.write_bytes(bytes(blob))
+    assert state_snapshot.load(str(path)) is None
+    path.write_bytes(state_snapshot.encode(sections(), boot=0.0)[:-7])  # torn write
+    assert state_snapshot.load(str(path)) is None
+    assert state_snapshot.load(str(tmp_path / 'missing.bin')) is None
+
+def test_save_replaces_atomically(tmp_path):
+    path = str(tmp_path / 'state.bin')
+    state_snapshot.save(path, {'a': 1.0})
+    state_snapshot.save(path, {'a': 2.0})
+    assert state_snapshot.load(path).sections == {'a': 2.0}
+    assert not (tmp_path / 'state.bin.tmp').exists()
+
+def test_is_fresh(monkeypatch):
+    monkeypatch.setattr(state_snapshot, 'boot_time', lambda: 500.0)
+    snapshot = state_snapshot.Snapshot(saved_at=1000.0, boot_time=500.0, sections={})
+    max_age = state_snapshot.PID_STATE_MAX_AGE
+    assert state_snapshot.is_fresh(snapshot, max_age, now=1000.0 + state_snapshot.SNAPSHOT_INTERVAL + 10)
+    assert not state_snapshot.is_fresh(snapshot, max_age, now=1000.0 + max_age + 1)
+    assert not state_snapshot.is_fresh(snapshot, max_age, now=999.0)  # clock went back
+    rebooted = snapshot._replace(boot_time=100.0)
+    assert not state_snapshot.is_fresh(rebooted, max_age, now=1001.0)
+
+def test_feature_windows_survive_a_snapshot():
+    engine = FeatureEngine(window=4, alpha=0.3)
+    for i in range(10):
+        engine.update('app', float(i), float(10 - i), 2)
+    restored = FeatureEngine.from_sections(
+        state_snapshot.decode(state_snapshot.encode(engine.to_sections(), boot=0.0)).sections)
+    assert (restored.window, restored.alpha) == (4, 0.3)
+    expected = engine.update('app', 3.0, 4.0, 1)
+    assert restored.update('app', 3.0, 4.0, 1) == pytest.approx(expected)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from throughput_history import decimate, lttb, minmax_decimate
+
+def series(n=10000):
+    t = np.arange(n, dtype=float)
+    y = np.sin(t / 500.0) * 10 + 20
+    if n > 7777:
+        y[1234] = 500.0   # one-sample spike
+        y[7777] = -300.0  # and dip
+    return t, y
+
+def test_minmax_keeps_spikes_in_time_order():
+    t, y = series()
+    keep = minmax_decimate(t, y, 100)
+    assert len(keep) <= 200
+    assert 1234 in keep and 7777 in keep
+    assert np.all(np.diff(keep) > 0)
+    assert y[keep].max() == y.max() and y[keep].min() == y.min()
+
+def test_minmax_short_series_unchanged():
+    t, y = series(50)
+    assert minmax_decimate(t, y, 100).tolist() == list(range(50))
+
+def test_minmax_uneven_bucket_sizes():
+    t, y = series(1001)
+    y[-1] = 99.0  # the padding repeats the last value; its index must stay in range
+    keep = minmax_decimate(t, y, 7)
+    assert keep.max() == 1000
+    assert len(keep) <= 14
+
+@pytest.mark.parametrize('threshold', [3, 10, 333])
+def test_lttb_picks_threshold_points_with_fixed_ends(threshold):
+    t, y = series()
+    keep = lttb(t, y, threshold)
+    assert len(keep) == threshold
+    assert keep[0] == 0 and keep[-1] == len(t) - 1
+    assert np.all(np.diff(keep) > 0)
+
+def test_lttb_keeps_a_lone_spike():
+    t, y = series()
+    assert 1234 in lttb(t, y, 200)
+
+def test_lttb_short_series_unchanged():
+    t, y = series(20)
+    assert lttb(t, y, 50).tolist() == list(range(20))
+
+def test_decimate_dispatch():
+    t, y = series()
+    assert len(decimate(t, y, 300, 'lttb')) == 300
+    assert len(decimate(t, y, 300)) <= 300
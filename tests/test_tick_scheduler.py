@@ -0,0 +1,49 @@
+import pytest
+
+import tick_scheduler
+from tick_scheduler import TickScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tick_scheduler.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(tick_scheduler.time, 'sleep', clock.sleep)
+    return clock
+
+def test_wait_returns_real_elapsed_time(clock):
+    scheduler = TickScheduler(2)
+    assert scheduler.wait() == pytest.approx(2)
+    clock.now += 0.5  # the tick's work
+    scheduler.done()
+    assert scheduler.wait() == pytest.approx(2)  # the work is part of the interval, not added to it
+    clock.now += 0.3
+    assert scheduler.wait() == pytest.approx(2)
+
+def test_overrun_merges_ticks_instead_of_queueing(clock):
+    scheduler = TickScheduler(2, max_interval=2)
+    scheduler.wait()
+    clock.now += 7  # tick work blocked for 3.5 intervals
+    scheduler.done()
+    assert scheduler.overruns == 1
+    assert scheduler.wait() == pytest.approx(7)  # one long window, no burst of catch-up ticks
+    assert scheduler.skipped == 2
+
+def test_interval_stretches_under_load_and_recovers(clock):
+    scheduler = TickScheduler(2, max_interval=8)
+    scheduler.wait()
+    for _ in range(10):
+        scheduler.done(work=5)
+    assert scheduler.interval == 8
+    for _ in range(10):
+        scheduler.done(work=0.01)
+    assert scheduler.interval == 2
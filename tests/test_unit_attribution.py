@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from self_metrics import metrics
+from unit_attribution import UnitResolver, aggregate, cgroup_path, unit_from_path
+
+CID = 'f' * 12 + '0123456789abcdef' * 3 + '0123'   # 64 hex digits
+
+@pytest.mark.parametrize('path, unit', [
+    ('/system.slice/nginx.service', ('systemd', 'nginx.service')),
+    ('/system.slice/docker-%s.scope' % CID, ('docker', CID)),        # v2, systemd driver
+    ('/docker/%s' % CID, ('docker', CID)),                            # v1, cgroupfs driver
+    ('/system.slice/docker-%s.scope/app.service' % CID, ('docker', CID)),  # container wins
+    ('/machine.slice/libpod-%s.scope/container' % CID, ('podman', CID)),
+    ('/kubepods.slice/kubepods-pod1.slice/cri-containerd-%s.scope' % CID, ('containerd', CID)),
+    ('/lxc.payload.web1', ('lxc', 'web1')),
+    ('/lxc/web1', ('lxc', 'web1')),
+    ('/user.slice/user-1000.slice/user@1000.service/app.slice/pipewire.service',
+     ('systemd', 'pipewire.service')),
+    ('/user.slice/user-1000.slice/user@1000.service/app.slice/app-firefox.scope', None),
+    ('/user.slice/user-1000.slice/session-2.scope', None),
+    ('/init.scope', None),
+    ('/', None),
+    (None, None),
+])
+def test_unit_from_path(path, unit):
+    assert unit_from_path(path) == unit
+
+def test_cgroup_path_prefers_unified_then_systemd_hierarchy():
+    v1 = '12:memory:/system.slice/a.service\n1:name=systemd:/system.slice/b.service\n'
+    assert cgroup_path(v1) == '/system.slice/b.service'
+    assert cgroup_path(v1 + '0::/system.slice/c.service\n') == '/system.slice/c.service'
+    assert cgroup_path('') is None
+
+def write_proc(root, pid, path):
+    (root / str(pid)).mkdir(parents=True, exist_ok=True)
+    (root / str(pid) / 'cgroup').write_text(f"0::{path}\n")
+
+def test_labels_use_docker_names_and_fall_back_to_process_names(tmp_path):
+    proc, docker = tmp_path / 'proc', tmp_path / 'docker'
+    write_proc(proc, 10, f'/system.slice/docker-{CID}.scope')
+    write_proc(proc, 11, '/system.slice/nginx.service')
+    write_proc(proc, 12, '/user.slice/user-1000.slice/session-2.scope')
+    (docker / CID).mkdir(parents=True)
+    (docker / CID / 'config.v2.json').write_text(json.dumps({'Name': '/web'}))
+    resolver = UnitResolver(lambda pid: f'proc{pid}', 'unit', str(proc), str(docker))
+    assert resolver.labels([10, 11, 12, 13]) == {
+        10: 'docker:web', 11: 'systemd:nginx.service', 12: 'proc12', 13: 'proc13'}
+    assert UnitResolver(lambda pid: f'proc{pid}', 'process', str(proc)).label(10) == 'proc10'
+
+def test_dead_pids_are_evicted_and_a_reused_pid_is_looked_up_again(tmp_path):
+    proc = tmp_path / 'proc'
+    write_proc(proc, 10, '/system.slice/nginx.service')
+    write_proc(proc, 11, '/system.slice/sshd.service')
+    resolver = UnitResolver(str, 'unit', str(proc))
+    resolver.labels([10, 11])
+    misses = metrics.snapshot()['counters'].get('unit_cache_miss', 0)
+    resolver.label(10)
+    assert metrics.snapshot()['counters'].get('unit_cache_miss', 0) == misses  # cached
+
+    resolver.retain({11})   # PID 10 exited ...
+    assert len(resolver) == 1 and 10 not in resolver.cache
+    assert metrics.snapshot()['gauges']['unit_cache_size'] == 1
+    write_proc(proc, 10, '/system.slice/postgresql.service')   # ... and was reused
+    assert resolver.label(10) == 'systemd:postgresql.service'
+    assert resolver.label(11) == 'systemd:sshd.service'
+
+def test_aggregate_folds_pids_into_units(tmp_path):
+    proc = tmp_path / 'proc'
+    for pid in (1, 2):
+        write_proc(proc, pid, '/system.slice/nginx.service')
+    snapshot = {1: {'up': 100, 'down': 10}, 2: {'up': 50, 'down': 5, 'up_var': 3}, 3: {'up': 1, 'down': 2}}
+    connections = {1: 2, 2: 1}
+    rows = dict(aggregate(snapshot, UnitResolver(lambda pid: 'python', 'unit', str(proc)), connections))
+    assert rows['systemd:nginx.service'] == {'up': 150, 'down': 15, 'up_var': 3, 'down_var': 0,
+                                             'connections': 3, 'pids': [1, 2]}
+    assert rows['python']['pids'] == [3]
+    # Process mode keeps one row per PID, even when names repeat
+    rows = aggregate(snapshot, UnitResolver(lambda pid: 'python', 'process', str(proc)), connections)
+    assert [(label, c['pids']) for label, c in rows] == [('python', [1]), ('python', [2]), ('python', [3])]